@@ -1,20 +1,214 @@
 #!/usr/bin/env python3
+import argparse
+import json
 import os
+import re
+import subprocess
 import sys
+import time
+
 import modal
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness.batch import run_batch  # noqa: E402
+from harness.compose import COMPOSE, print_health, wait_healthy  # noqa: E402
+from harness.dockerd import wait_for_dockerd  # noqa: E402
+from harness.imagecache import ImageCache, add_arguments  # noqa: E402
+from harness.output import OutputPump, run_logged  # noqa: E402
+from harness.redisbench import BENCH_IMAGE, print_report, run_suite  # noqa: E402
+from harness.timing import hydrate_image, span, start_run  # noqa: E402
+
 # Use the 2025.06 Modal Image Builder which avoids the need to install Modal client
 # dependencies into the container image.
 os.environ["MODAL_IMAGE_BUILDER_VERSION"] = "2025.06"
 
+RESULTS_DIR = os.path.expanduser("~/.cache/modal-snapshot-testing/bench")
+
+
+def compose_images(content):
+    """Return the ``image:`` references in a compose file, in order."""
+    return re.findall(r"^\s*image:\s*[\"']?([^\s\"'#]+)", content, re.MULTILINE)
+
+
+def create_sandbox(image_id, cache):
+    # Create Modal image from the provided image ID
+    dockerfile_image = modal.Image.from_registry(image_id)
+
+    print("Looking up modal.Sandbox app")
+    app = modal.App.lookup("docker-compose-demo", create_if_missing=True)
+    print("Creating sandbox")
+
+    with modal.enable_output():
+        hydrate_image(dockerfile_image, app)
+        with span("sandbox_create"):
+            return modal.Sandbox.create(
+                "/start-dockerd.sh",
+                timeout=60 * 60,
+                app=app,
+                image=dockerfile_image,
+                experimental_options={"enable_docker_in_gvisor": True},
+                **cache.sandbox_options(),
+            )
+
+
+def _local(name, argv):
+    # Same shape as the sandbox runner: the full output goes to the step log `name`
+    p = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace")
+    result = OutputPump(name, tail=20).drain(p)
+    return result.ok, "\n".join(result.tail), "\n".join(result.stderr_tail)
+
+
+def bench_local(args, project="redis-bench-local"):
+    """Run the suite against the compose file on the local docker daemon."""
+    compose = ["docker", "compose", "-f", args.docker_compose_file, "-p", project]
+    print(f"\n=== Local docker baseline ({project}) ===")
+    try:
+        ok, _, err = _local("up", [*compose, "up", "-d", "--wait"])
+    except FileNotFoundError:
+        print("   docker is not installed locally; skipping the baseline")
+        return []
+    try:
+        if not ok:
+            print(f"   local compose up failed: {err.strip()[-500:]}")
+            return []
+
+        def redis_cli(*cli):
+            return _local(f"redis-cli-{cli[0].lower()}", [*compose, "exec", "-T", args.service, "redis-cli", *cli])
+
+        with span("redis_bench", target="local"):
+            return run_suite(
+                _local,
+                redis_cli,
+                network=f"{project}_default",
+                **suite_options(args, "local"),
+            )
+    finally:
+        _local("down", [*compose, "down", "-v"])
+
+
+def bench_sandbox(args, cache, content, project="redis-bench"):
+    """Run the suite against the compose file inside a docker-in-gvisor sandbox."""
+    print("\n=== Modal sandbox ===")
+    sb = create_sandbox(args.image_id, cache)
+    try:
+        with sb.open("/docker-compose.yml", "w") as f:
+            f.write(content)
+        wait_for_dockerd(sb)
+        if cache.enabled:
+            cache.ensure(sb, sorted(set(compose_images(content) + [args.bench_image])))
+        health = wait_healthy(sb, "/docker-compose.yml", project)
+        print_health(health)
+        if not health["ok"]:
+            raise RuntimeError("compose stack did not become healthy: " + " / ".join(health["stderr_tail"]))
+        compose = [COMPOSE, "-f", "/docker-compose.yml", "-p", project]
+
+        def run(name, argv):
+            result = run_logged(sb, name, *argv, tail=20)
+            return result.ok, "\n".join(result.tail), "\n".join(result.stderr_tail)
+
+        def redis_cli(*cli):
+            return run(f"redis-cli-{cli[0].lower()}", [*compose, "exec", "-T", args.service, "redis-cli", *cli])
+
+        with span("redis_bench", target="sandbox"):
+            return run_suite(
+                run,
+                redis_cli,
+                network=f"{project}_default",
+                **suite_options(args, "sandbox"),
+            )
+    finally:
+        with span("terminate"):
+            sb.terminate()
+
+
+def suite_options(args, label):
+    return {
+        "service": args.service,
+        "port": args.port,
+        "payloads": args.payloads,
+        "pipeline": args.pipeline,
+        "requests": args.requests,
+        "clients": args.clients,
+        "image": args.bench_image,
+        "label": label,
+    }
+
+
+def bench_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="run-docker-compose.py bench",
+        description="redis-benchmark against the compose stack, in the sandbox and on local docker",
+    )
+    parser.add_argument("image_id", help="registry image for the sandbox")
+    parser.add_argument("docker_compose_file")
+    parser.add_argument("--service", default="redis", help="compose service running redis (default: redis)")
+    parser.add_argument("--port", type=int, default=6379, help="host port the service publishes (default: 6379)")
+    parser.add_argument(
+        "--payloads",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[64, 1024, 16384],
+        help="comma-separated value sizes in bytes (default: 64,1024,16384)",
+    )
+    parser.add_argument("--pipeline", type=int, default=16, help="pipeline depth of the pipelined runs (default: 16)")
+    parser.add_argument("--requests", type=int, default=100000, help="requests per test (default: 100000)")
+    parser.add_argument("--clients", type=int, default=50, help="parallel connections (default: 50)")
+    parser.add_argument(
+        "--bench-image", default=BENCH_IMAGE, help=f"image with redis-benchmark (default: {BENCH_IMAGE})"
+    )
+    parser.add_argument("--no-local", action="store_true", help="skip the local docker baseline")
+    parser.add_argument("--output", help="write results as JSON (default: under ~/.cache/modal-snapshot-testing/bench)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    cache = ImageCache.from_args(args)
+    if not os.path.exists(args.docker_compose_file):
+        parser.error(f"docker compose file not found: {args.docker_compose_file}")
+    with open(args.docker_compose_file) as f:
+        content = f.read()
+
+    start_run("run-docker-compose-bench")
+    rows = [] if args.no_local else bench_local(args)
+    try:
+        rows += bench_sandbox(args, cache, content)
+    except Exception as e:
+        print(f"   sandbox benchmark FAILED: {e}")
+
+    print()
+    print_report(rows)
+    cache.print_summary()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"redis-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"image_id": args.image_id, "compose_file": args.docker_compose_file, "rows": rows}, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 0 if any("rps" in row for row in rows) else 1
+
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python run-docker-compose.py <image_id> <docker-compose.yml>")
-        sys.exit(1)
+    if sys.argv[1:2] == ["bench"]:
+        sys.exit(bench_main(sys.argv[2:]))
+    parser = argparse.ArgumentParser(
+        description="Run docker-compose inside a docker-in-gvisor sandbox",
+        epilog="'run-docker-compose.py bench IMAGE FILE' benchmarks redis instead (see bench --help)",
+    )
+    parser.add_argument("image_id", help="registry image for the sandbox")
+    parser.add_argument("docker_compose_file")
+    parser.add_argument(
+        "--detach",
+        action="store_true",
+        help="run 'up -d', return once every service is healthy and leave the sandbox running",
+    )
+    parser.add_argument(
+        "--health-timeout", type=float, default=120.0, help="give up waiting for healthy services (default: 120s)"
+    )
+    # The registry mirror only applies if the image's /start-dockerd.sh honours DOCKER_REGISTRY_MIRROR
+    add_arguments(parser)
+    args = parser.parse_args()
+    cache = ImageCache.from_args(args)
 
-    image_id = sys.argv[1]
-    docker_compose_file = sys.argv[2]
+    start_run("run-docker-compose")
+    image_id = args.image_id
+    docker_compose_file = args.docker_compose_file
 
     if not os.path.exists(docker_compose_file):
         print(f"Error: Docker compose file not found: {docker_compose_file}")
@@ -24,60 +218,69 @@ def main():
     with open(docker_compose_file, "r") as f:
         docker_compose_content = f.read()
 
-    # Create Modal image from the provided image ID
-    dockerfile_image = modal.Image.from_registry(image_id)
+    sb = create_sandbox(image_id, cache)
 
-    print("Looking up modal.Sandbox app")
-    app = modal.App.lookup("docker-compose-demo", create_if_missing=True)
-    print("Creating sandbox")
+    with span("workload"):
+        # Copy docker-compose file into the sandbox
+        print("Copying docker-compose file to sandbox")
+        with sb.open("/docker-compose.yml", "w") as f:
+            f.write(docker_compose_content)
 
-    with modal.enable_output():
-        sb = modal.Sandbox.create(
-            "/start-dockerd.sh",
-            timeout=60 * 60,
-            app=app,
-            image=dockerfile_image,
-            experimental_options={"enable_docker_in_gvisor": True},
-        )
-
-    # Copy docker-compose file into the sandbox
-    print("Copying docker-compose file to sandbox")
-    with sb.open("/docker-compose.yml", "w") as f:
-        f.write(docker_compose_content)
-
-    # Output package versions
-    print("\n=== Package Versions ===")
-    packages = [
-        ("curl", "curl --version"),
-        ("wget", "wget --version"),
-        ("git", "git --version"),
-        ("gcc", "gcc --version"),
-        ("gnupg", "gpg --version"),
-        ("python3", "python3 --version"),
-        ("pip", "pip3 --version"),
-        ("docker", "docker --version"),
-        ("iptables", "iptables --version"),
-        ("ripgrep", "rg --version"),
-    ]
-
-    for name, cmd in packages:
-        print(f"\n{name}:")
-        p = sb.exec("sh", "-c", f"{cmd} | head -1")
-        print(p.stdout.read().strip())
-    print("========================\n")
-
-    # Run docker-compose up
-    print("Running docker-compose up")
-    p = sb.exec("docker-compose", "-p", "docker-compose-demo", "up")
-    for l in p.stdout:
-        print(l, end="")
-    p.wait()
-
-    if p.returncode != 0:
-        print("docker-compose up failed:")
-        print(p.stderr.read())
-        sb.terminate()
-        sys.exit(1)
+        # Output package versions
+        print("\n=== Package Versions ===")
+        packages = [
+            ("curl", "curl --version"),
+            ("wget", "wget --version"),
+            ("git", "git --version"),
+            ("gcc", "gcc --version"),
+            ("gnupg", "gpg --version"),
+            ("python3", "python3 --version"),
+            ("pip", "pip3 --version"),
+            ("docker", "docker --version"),
+            ("iptables", "iptables --version"),
+            ("ripgrep", "rg --version"),
+        ]
+
+        versions = run_batch(sb, [(name, f"{cmd} | head -1") for name, cmd in packages])
+        for name, result in versions["commands"].items():
+            print(f"\n{name}:")
+            print(result["stdout"].strip())
+        print(f"\n(collected in {versions['elapsed_s']:.2f}s)")
+        print("========================\n")
+
+        if cache.enabled or args.detach:
+            wait_for_dockerd(sb)
+
+        if cache.enabled:
+            # Loaded images are already present, so compose skips pulling them
+            print("Loading service images from the image cache")
+            cache.ensure(sb, compose_images(docker_compose_content))
+            cache.print_summary()
+
+        if args.detach:
+            print("Running docker-compose up -d and waiting for healthy services")
+            health = wait_healthy(sb, "/docker-compose.yml", "docker-compose-demo", timeout=args.health_timeout)
+            print_health(health)
+            if not health["ok"]:
+                print("\n".join(health["stderr_tail"]))
+                with span("terminate"):
+                    sb.terminate()
+                sys.exit(1)
+            print("\nSandbox ID:", sb.object_id)
+            print("Services are healthy; the sandbox stays up for 1 hour and can be handed off or snapshotted")
+            return
+
+        # Run docker-compose up
+        print("Running docker-compose up")
+        # Attached, so echo live; the full output goes to the step log
+        up = run_logged(sb, "docker-compose-up", "docker-compose", "-p", "docker-compose-demo", "up", live=True)
+        print(f"   (log: {up.log_path})")
+
+        if not up.ok:
+            print("docker-compose up failed:")
+            print("\n".join(up.stderr_tail))
+            sb.terminate()
+            sys.exit(1)
 
     print("--------------------------------")
     print("Docker Compose services started successfully")
@@ -92,7 +295,8 @@ def main():
         sb.wait()
     except KeyboardInterrupt:
         print("\nTerminating sandbox...")
-        sb.terminate()
+        with span("terminate"):
+            sb.terminate()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+"""Shared helpers for the Modal sandbox snapshot test scripts.
+
+The scenario scripts live in sibling directories and are run directly, so
+they put the repository root on ``sys.path`` before importing from here.
+"""
@@ -0,0 +1,157 @@
+"""Client for the long-lived in-sandbox command agent.
+
+Starting a ``bash -lc`` login shell and re-sending a script as a heredoc for
+every step costs a process spawn, a profile load and the script transfer
+each time. The agent (``harness/agent_server.py``) is started once over a
+single exec and then runs scripts on request; scripts are uploaded once and
+referred to by content hash afterwards.
+
+``SandboxAgent.start(sb)`` runs the agent in a Modal sandbox and
+``SandboxAgent.start_local()`` runs it as a local subprocess, which behaves
+the same way and is handy for exercising the protocol without Modal.
+"""
+
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+
+from harness import agent_server
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_server.py")
+
+
+class AgentError(Exception):
+    """Raised when the agent exits or answers with an error."""
+
+
+class _LocalStdin:
+    def __init__(self, pipe):
+        self._pipe = pipe
+
+    def write(self, data):
+        self._pipe.write(data.encode("utf-8") if isinstance(data, str) else data)
+
+    def drain(self):
+        self._pipe.flush()
+
+    def write_eof(self):
+        self._pipe.close()
+
+
+class LocalAgentProcess:
+    """A local subprocess exposing the parts of Modal's ContainerProcess the agent uses."""
+
+    def __init__(self, argv, env=None):
+        self._popen = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        self.stdin = _LocalStdin(self._popen.stdin)
+        self.stdout = (line.decode("utf-8", "replace") for line in self._popen.stdout)
+
+    @property
+    def returncode(self):
+        return self._popen.poll()
+
+    def wait(self):
+        return self._popen.wait()
+
+
+class SandboxAgent:
+    """Send scripts to a running agent and collect their results."""
+
+    def __init__(self, process):
+        self._process = process
+        self._stdout = iter(process.stdout)
+        self._buffer = ""
+        self._next_id = 1
+        self.uploaded = set()
+        self.stats = {"requests": 0, "uploads": 0, "cache_hits": 0}
+        ready = self._read_frame()
+        if not ready.get("ready"):
+            raise AgentError(f"Agent did not start: {ready}")
+
+    @classmethod
+    def start(cls, sb, script_dir=None):
+        """Start the agent in ``sb`` through one login shell exec."""
+        with open(SERVER_PATH, encoding="utf-8") as fh:
+            source = fh.read()
+        command = "exec python3 -u -c " + shlex.quote(source)
+        if script_dir:
+            command = f"SANDBOX_AGENT_DIR={shlex.quote(script_dir)} " + command
+        return cls(sb.exec("bash", "-lc", command, bufsize=1))
+
+    @classmethod
+    def start_local(cls, script_dir=None):
+        """Start the agent as a local subprocess (a stand-in for a sandbox)."""
+        env = dict(os.environ)
+        if script_dir:
+            env["SANDBOX_AGENT_DIR"] = script_dir
+        return cls(LocalAgentProcess([sys.executable, "-u", SERVER_PATH], env=env))
+
+    def _read_frame(self):
+        # Modal may hand back arbitrary chunks rather than lines, so reassemble.
+        while True:
+            while "\n" in self._buffer:
+                line, self._buffer = self._buffer.split("\n", 1)
+                if line.startswith(agent_server.FRAME_PREFIX):
+                    return json.loads(line[len(agent_server.FRAME_PREFIX):])
+            try:
+                chunk = next(self._stdout)
+            except StopIteration:
+                raise AgentError("Agent exited unexpectedly")
+            self._buffer += chunk.decode("utf-8", "replace") if isinstance(chunk, bytes) else chunk
+
+    def request(self, op, **fields):
+        """Send one request frame and return the matching response."""
+        request_id = self._next_id
+        self._next_id += 1
+        try:
+            self._process.stdin.write(json.dumps({"id": request_id, "op": op, **fields}) + "\n")
+            self._process.stdin.drain()
+        except BrokenPipeError:
+            raise AgentError("Agent exited unexpectedly")
+        self.stats["requests"] += 1
+        while True:
+            response = self._read_frame()
+            if response.get("id") == request_id:
+                return response
+
+    def upload(self, script):
+        """Upload ``script`` and return its content hash."""
+        digest = hashlib.sha256(script.encode("utf-8")).hexdigest()
+        response = self.request("put", hash=digest, script=script)
+        if not response.get("ok"):
+            raise AgentError(f"Upload failed: {response.get('error')}")
+        self.uploaded.add(digest)
+        self.stats["uploads"] += 1
+        return digest
+
+    def run_script(self, script, interpreter="python3", cwd=None, timeout=600):
+        """Run ``script`` with ``interpreter`` and return its result dict.
+
+        The script is only transferred if the agent does not already hold a
+        copy with the same hash.
+        """
+        digest = hashlib.sha256(script.encode("utf-8")).hexdigest()
+        if digest in self.uploaded:
+            self.stats["cache_hits"] += 1
+        else:
+            self.upload(script)
+        response = self.request("run", hash=digest, interpreter=interpreter, cwd=cwd, timeout=timeout)
+        if response.get("error") == "unknown_script":
+            # The agent's script directory was reset underneath us; upload again.
+            self.uploaded.discard(digest)
+            self.upload(script)
+            response = self.request("run", hash=digest, interpreter=interpreter, cwd=cwd, timeout=timeout)
+        if not response.get("ok"):
+            raise AgentError(f"Run failed: {response.get('error')}")
+        return response
+
+    def close(self):
+        """Ask the agent to exit and wait for it."""
+        try:
+            self.request("exit")
+        except AgentError:
+            pass
+        self._process.wait()
@@ -0,0 +1,112 @@
+"""In-sandbox command agent (stdlib only; shipped to the sandbox as source).
+
+Reads one request frame per stdin line and answers with one response frame
+per stdout line. Frames are JSON objects prefixed with ``FRAME_PREFIX`` so
+the client can skip anything else that ends up on stdout (login-profile
+noise and the like). Scripts are stored by content hash and only need to be
+uploaded once per sandbox filesystem.
+
+Requests::
+
+    {"id": 1, "op": "put", "hash": "<sha256>", "script": "..."}
+    {"id": 2, "op": "run", "hash": "<sha256>", "interpreter": "python3",
+     "cwd": "/workspace", "timeout": 600}
+    {"id": 3, "op": "ping"}
+    {"id": 4, "op": "exit"}
+
+Responses carry the request ``id`` and ``ok``; ``run`` adds ``returncode``,
+``stdout``, ``stderr`` and ``duration_s``. A ``run`` for a hash the agent
+has never seen fails with ``"error": "unknown_script"``.
+"""
+
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+FRAME_PREFIX = "@@agent "
+SCRIPT_DIR = os.environ.get("SANDBOX_AGENT_DIR", "/tmp/sandbox-agent")
+
+
+def script_path(digest):
+    return os.path.join(SCRIPT_DIR, digest)
+
+
+def handle(request):
+    op = request.get("op")
+    if op == "ping":
+        return {"ok": True, "pid": os.getpid()}
+    if op == "put":
+        script = request["script"]
+        digest = hashlib.sha256(script.encode("utf-8")).hexdigest()
+        if digest != request.get("hash"):
+            return {"ok": False, "error": "hash_mismatch", "hash": digest}
+        os.makedirs(SCRIPT_DIR, exist_ok=True)
+        tmp_path = script_path(digest) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            fh.write(script)
+        os.replace(tmp_path, script_path(digest))
+        return {"ok": True, "hash": digest}
+    if op == "run":
+        path = script_path(request["hash"])
+        if not os.path.exists(path):
+            return {"ok": False, "error": "unknown_script"}
+        argv = shlex.split(request.get("interpreter") or "python3") + [path]
+        start = time.monotonic()
+        try:
+            result = subprocess.run(
+                argv,
+                cwd=request.get("cwd"),
+                capture_output=True,
+                text=True,
+                errors="replace",
+                timeout=request.get("timeout"),
+                stdin=subprocess.DEVNULL,
+            )
+            returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+        except subprocess.TimeoutExpired as e:
+            returncode = -1
+            stdout = e.stdout.decode("utf-8", "replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+            stderr = f"timed out after {request.get('timeout')}s"
+        return {
+            "ok": True,
+            "returncode": returncode,
+            "stdout": stdout,
+            "stderr": stderr,
+            "duration_s": time.monotonic() - start,
+        }
+    return {"ok": False, "error": f"unknown_op:{op}"}
+
+
+def send(frame):
+    sys.stdout.write(FRAME_PREFIX + json.dumps(frame) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    send({"id": 0, "ok": True, "ready": True, "pid": os.getpid()})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            send({"id": None, "ok": False, "error": f"bad_frame:{e}"})
+            continue
+        if request.get("op") == "exit":
+            send({"id": request.get("id"), "ok": True})
+            return
+        try:
+            response = handle(request)
+        except Exception as e:  # keep serving after a failed request
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        response["id"] = request.get("id")
+        send(response)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Run several independent shell commands in one sandbox exec.
+
+Every ``sb.exec`` is a network round-trip, so probes that only print a
+version string or count files are batched: the commands run in parallel
+inside the sandbox and their output comes back in a single response.
+"""
+
+import base64
+import shlex
+import time
+
+
+def batch_script(commands):
+    """Return a sh script that runs ``commands`` (a list of shell strings) in parallel.
+
+    The script prints one tab-separated line per command:
+    ``index, exit code, duration in ms, base64 stdout, base64 stderr``.
+    """
+    lines = [
+        'd=$(mktemp -d)',
+        'now_ms() { echo $(( $(date +%s%N) / 1000000 )); }',
+        'run() {',
+        '    s=$(now_ms)',
+        '    sh -c "$2" >"$d/$1.out" 2>"$d/$1.err" </dev/null',
+        '    echo "$? $(( $(now_ms) - s ))" >"$d/$1.meta"',
+        '}',
+    ]
+    for index, command in enumerate(commands):
+        lines.append(f"run {index} {shlex.quote(command)} &")
+    lines.append("wait")
+    lines.append(f"for i in {' '.join(str(i) for i in range(len(commands)))}; do")
+    lines.append('    read rc ms <"$d/$i.meta"')
+    lines.append(
+        "    printf '%s\\t%s\\t%s\\t%s\\t%s\\n' \"$i\" \"$rc\" \"$ms\" "
+        "\"$(base64 <\"$d/$i.out\" | tr -d '\\n')\" \"$(base64 <\"$d/$i.err\" | tr -d '\\n')\""
+    )
+    lines.append("done")
+    lines.append('rm -rf "$d"')
+    return "\n".join(lines) + "\n"
+
+
+def _normalize(commands):
+    if isinstance(commands, dict):
+        return list(commands.items())
+    return list(commands)
+
+
+def parse_batch_output(names, stdout):
+    """Turn the batch script's output into ``{name: result}``."""
+    results = {}
+    for line in stdout.splitlines():
+        fields = line.split("\t")
+        if len(fields) != 5:
+            continue
+        index, returncode, duration_ms, out, err = fields
+        results[names[int(index)]] = {
+            "stdout": base64.b64decode(out).decode("utf-8", errors="replace"),
+            "stderr": base64.b64decode(err).decode("utf-8", errors="replace"),
+            "returncode": int(returncode),
+            "duration_s": int(duration_ms) / 1000,
+        }
+    for name in names:
+        if name not in results:
+            results[name] = {"stdout": "", "stderr": "no result from batch", "returncode": -1, "duration_s": 0.0}
+    return results
+
+
+def run_batch(sb, commands, timeout=600):
+    """Run named commands in parallel in one exec and return a JSON-serializable report.
+
+    ``commands`` is a ``{name: shell command}`` dict or a list of
+    ``(name, shell command)`` pairs. The report looks like::
+
+        {"elapsed_s": 0.41, "commands": {"git": {"stdout": ..., "stderr": ...,
+                                                  "returncode": 0, "duration_s": 0.02}}}
+    """
+    pairs = _normalize(commands)
+    names = [name for name, _ in pairs]
+    start = time.perf_counter()
+    p = sb.exec("sh", "-c", batch_script([command for _, command in pairs]), timeout=timeout)
+    stdout = p.stdout.read()
+    p.wait()
+    return {"elapsed_s": time.perf_counter() - start, "commands": parse_batch_output(names, stdout)}
+
+
+async def run_batch_async(sb, commands, timeout=600):
+    """Async variant of run_batch."""
+    pairs = _normalize(commands)
+    names = [name for name, _ in pairs]
+    start = time.perf_counter()
+    p = await sb.exec.aio("sh", "-c", batch_script([command for _, command in pairs]), timeout=timeout)
+    stdout = await p.stdout.read.aio()
+    await p.wait.aio()
+    return {"elapsed_s": time.perf_counter() - start, "commands": parse_batch_output(names, stdout)}
@@ -0,0 +1,371 @@
+"""Find the first bad image in an ordered list of digests, probing in parallel.
+
+The list is read from a file such as ``docker-compose/IMAGES``; every line
+holding an ``image@sha256:...`` reference is one candidate, and the text
+before the colon is its label. A label starting with ✅ or 🛑 records a known
+good or bad image. When such markers are present they set the direction: the
+list is flipped if needed so the ✅ end comes first. Both ends are then
+probed, and the run stops with an error if either disagrees with its marker.
+Without markers, candidates are ordered oldest first (``--newest-first``
+flips them), the oldest is assumed good and the newest bad.
+
+Each round probes ``--parallel`` evenly spaced candidates at once, one
+sandbox each, which cuts the open range to ``1 / (k + 1)`` of its size; a
+plain binary search is ``--parallel 1``. Verdicts are cached per probe and
+image in ``~/.cache/modal-snapshot-testing/bisect.json``, so a rerun only
+launches sandboxes for candidates it has never seen.
+
+Probe sandboxes come from a :class:`harness.pool.SandboxPool`. With
+``--prewarm`` the pool starts dockerd sandboxes for every candidate the next
+round could probe while the current round runs, so the next round's probes
+skip sandbox startup. That costs up to ``k * (k + 1)`` extra sandboxes per
+round, most of which are terminated unused.
+
+Probes:
+
+* ``compose`` starts dockerd on the candidate image and passes when
+  ``docker-compose up -d`` succeeds (the egress failure in IMAGES).
+* ``snapshot`` starts dockerd and passes when ``snapshot_filesystem``
+  succeeds.
+
+Usage::
+
+    python -m harness.bisect docker-compose/IMAGES --parallel 3
+"""
+
+import argparse
+import concurrent.futures
+import contextvars
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from harness.dockerd import wait_for_dockerd
+from harness.output import run_logged
+from harness.pool import SandboxPool, SandboxSpec
+from harness.timing import hydrate_image, span, start_run
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_COMPOSE_FILE = os.path.join(REPO_ROOT, "docker-compose", "docker-compose-redis.yml")
+CACHE_PATH = os.path.expanduser("~/.cache/modal-snapshot-testing/bisect.json")
+PROBES = ("compose", "snapshot")
+MARKERS = {"✅": True, "🛑": False}
+_DIGEST = re.compile(r"(\S+@sha256:[0-9a-f]{64})")
+
+
+def read_digests(path):
+    """Return ``[(label, image, expected)]`` in file order.
+
+    ``expected`` is True for a ✅ label, False for 🛑 and None otherwise.
+    """
+    candidates = []
+    with open(path) as f:
+        for line in f:
+            match = _DIGEST.search(line)
+            if not match:
+                continue
+            label = line[: match.start()].strip().lstrip("-").strip().rstrip(":").strip()
+            expected = MARKERS.get(label[:1])
+            candidates.append((label or match.group(1), match.group(1), expected))
+    return candidates
+
+
+def orient(candidates, newest_first=False):
+    """Return the candidates ordered good end first.
+
+    The ✅/🛑 markers decide the direction when present, and must not
+    interleave. Otherwise ``newest_first`` says whether to reverse.
+    """
+    marked = [expected for _, _, expected in candidates if expected is not None]
+    if not marked:
+        return list(reversed(candidates)) if newest_first else list(candidates)
+    if marked[0] is False:
+        candidates = list(reversed(candidates))
+        marked.reverse()
+    if marked != sorted(marked, reverse=True):
+        raise ValueError("the ✅ and 🛑 markers interleave, so the list is not ordered good to bad")
+    return list(candidates)
+
+
+class VerdictCache:
+    """Probe verdicts keyed by probe, probe inputs and image digest."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.entries = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        return None if entry is None else entry["good"]
+
+    def put(self, key, good, seconds):
+        with self._lock:
+            self.entries[key] = {"good": good, "seconds": round(seconds, 3), "recorded_at": time.time()}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def probe_key(probe, image_ref, compose_file=None):
+    inputs = ""
+    if probe == "compose":
+        with open(compose_file, "rb") as f:
+            inputs = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"{probe}:{inputs}:{image_ref}"
+
+
+def dockerd_spec(image_ref):
+    import modal
+
+    return SandboxSpec(
+        image_ref,
+        modal.Image.from_registry(image_ref),
+        timeout=30 * 60,
+        experimental_options={"enable_docker_in_gvisor": True},
+    )
+
+
+def _create_dockerd_sandbox(pool, image_ref):
+    spec = dockerd_spec(image_ref)
+    hydrate_image(spec.image, pool.app)
+    return pool.acquire(spec, replenish=False)
+
+
+def probe_compose(pool, image_ref, compose_file=DEFAULT_COMPOSE_FILE):
+    """Return True when ``docker-compose up -d`` succeeds on ``image_ref``."""
+    with open(compose_file) as f:
+        compose_content = f.read()
+    sb = _create_dockerd_sandbox(pool, image_ref)
+    try:
+        with span("workload", image=image_ref):
+            with sb.open("/docker-compose.yml", "w") as f:
+                f.write(compose_content)
+            name = "bisect-compose-up-" + image_ref.rsplit(":", 1)[-1][:12]
+            up = run_logged(sb, name, "docker-compose", "-f", "/docker-compose.yml", "-p", "bisect", "up", "-d")
+        return up.ok
+    finally:
+        with span("terminate"):
+            sb.terminate()
+
+
+def probe_snapshot(pool, image_ref, compose_file=None):
+    """Return True when ``snapshot_filesystem`` succeeds with dockerd running on ``image_ref``."""
+    sb = _create_dockerd_sandbox(pool, image_ref)
+    try:
+        with span("snapshot_filesystem", image=image_ref):
+            try:
+                sb.snapshot_filesystem()
+            except Exception as e:
+                print(f"   snapshot failed on {image_ref}: {e}")
+                return False
+        return True
+    finally:
+        with span("terminate"):
+            sb.terminate()
+
+
+def pick_points(good, bad, k):
+    """Return up to ``k`` indices strictly between ``good`` and ``bad``, evenly spaced."""
+    width = bad - good - 1
+    if width <= 0:
+        return []
+    if width <= k:
+        return list(range(good + 1, bad))
+    return sorted({good + round((bad - good) * (i + 1) / (k + 1)) for i in range(k)})
+
+
+def next_points(good, bad, points, k):
+    """Return every index the round after probing ``points`` could probe, whatever the verdicts."""
+    bounds = sorted({good, bad, *points})
+    return sorted({i for low, high in zip(bounds, bounds[1:]) for i in pick_points(low, high, k)})
+
+
+def _check_ends(candidates, verdicts):
+    """Raise unless the first candidate probed good and the last probed bad."""
+    problems = []
+    for index, want in ((0, True), (len(candidates) - 1, False)):
+        got = verdicts[index][0]
+        if got is not want:
+            state = "failed to probe" if got is None else f"probed {'good' if got else 'bad'}"
+            problems.append(f"[{index}] {candidates[index][0]} {state}, expected {'good' if want else 'bad'}")
+    if problems:
+        raise RuntimeError("; ".join(problems) + " (check the order and the ✅/🛑 markers)")
+
+
+def bisect(candidates, probe, parallel=1, cache=None, key=None, check_ends=False, prewarm=None):
+    """k-ary search for the first bad candidate; return ``(index, verdicts, rounds)``.
+
+    ``probe(image_ref)`` returns True for good. ``candidates[0]`` is assumed
+    good and ``candidates[-1]`` bad unless ``check_ends`` probes them too.
+    ``verdicts`` maps each index to ``(good, source)`` where source is
+    ``"probe"``, ``"cache"`` or ``"error"``. With ``check_ends`` a first
+    candidate that is not good or a last one that is not bad raises
+    RuntimeError. ``prewarm(image_refs)``, if given, is called before each
+    round with the uncached candidates the following round could probe.
+    """
+    good, bad = 0, len(candidates) - 1
+    verdicts = {}
+    rounds = 0
+
+    def run(index):
+        image_ref = candidates[index][1]
+        with span("bisect_probe", index=index, image=image_ref) as probe_span:
+            try:
+                result = probe(image_ref)
+            except Exception as e:
+                probe_span.set(error=f"{type(e).__name__}: {e}")
+                print(f"   [{index}] probe error: {e}")
+                return index, None, probe_span.duration_s
+            probe_span.set(good=result)
+        return index, result, probe_span.duration_s
+
+    def resolve(indices):
+        pending = []
+        for index in indices:
+            cached = cache.get(key(candidates[index][1])) if cache is not None else None
+            if cached is not None:
+                verdicts[index] = (cached, "cache")
+                print(f"   [{index}] {candidates[index][0]}: {'good' if cached else 'bad'} (cached)")
+            else:
+                pending.append(index)
+        if not pending:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, run, index) for index in pending]
+            for future in concurrent.futures.as_completed(futures):
+                index, result, seconds = future.result()
+                if result is None:
+                    verdicts[index] = (None, "error")
+                    continue
+                verdicts[index] = (result, "probe")
+                print(f"   [{index}] {candidates[index][0]}: {'good' if result else 'bad'} ({seconds:.1f}s)")
+                if cache is not None:
+                    cache.put(key(candidates[index][1]), result, seconds)
+
+    first = [good, bad] if check_ends else []
+    while True:
+        points = first + pick_points(good, bad, parallel)
+        first = []
+        if not points:
+            break
+        rounds += 1
+        print(f"Round {rounds}: probing {', '.join(f'[{i}]' for i in points)} between [{good}] and [{bad}]")
+        if prewarm is not None:
+            ahead = [
+                candidates[i][1]
+                for i in next_points(good, bad, points, parallel)
+                if cache is None or cache.get(key(candidates[i][1])) is None
+            ]
+            if ahead:
+                prewarm(ahead)
+        with span("bisect_round", round=rounds, points=points):
+            resolve(points)
+        if check_ends and rounds == 1:
+            _check_ends(candidates, verdicts)
+        decided = {i: verdicts[i][0] for i in points if verdicts[i][0] is not None}
+        if not decided:
+            raise RuntimeError(f"every probe in round {rounds} failed to run")
+        bad = min([i for i, ok in decided.items() if not ok and i > good] + [bad])
+        good = max([i for i, ok in decided.items() if ok and i < bad] + [good])
+    return bad, verdicts, rounds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the first bad image digest")
+    parser.add_argument("digests", nargs="?", default=os.path.join(REPO_ROOT, "docker-compose", "IMAGES"))
+    parser.add_argument("--newest-first", action="store_true", help="the file lists the newest image first")
+    parser.add_argument("--probe", choices=PROBES, default="compose", help="pass/fail check (default: compose)")
+    parser.add_argument("--parallel", type=int, default=3, help="sandboxes probed per round (default: 3)")
+    parser.add_argument("--check-ends", action="store_true", help="also probe the oldest and newest candidates")
+    parser.add_argument(
+        "--prewarm",
+        action="store_true",
+        help="start sandboxes for the next round's possible candidates while a round runs",
+    )
+    parser.add_argument("--compose-file", default=DEFAULT_COMPOSE_FILE, help="compose file for the compose probe")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and do not record cached verdicts")
+    parser.add_argument("--app", default="image-bisect", help="Modal app name")
+    parser.add_argument("--dry-run", action="store_true", help="print the ordered candidates and cached verdicts")
+    args = parser.parse_args(argv)
+    if args.parallel < 1:
+        parser.error("--parallel must be at least 1")
+
+    candidates = read_digests(args.digests)
+    marked = any(expected is not None for _, _, expected in candidates)
+    if marked and args.newest_first:
+        print("Ignoring --newest-first: the ✅/🛑 markers set the order")
+    try:
+        candidates = orient(candidates, args.newest_first)
+    except ValueError as e:
+        parser.error(f"{args.digests}: {e}")
+    if len(candidates) < 2:
+        parser.error(f"need at least two digests in {args.digests}")
+    # Known verdicts are only trusted once the ends have been re-probed
+    check_ends = args.check_ends or marked
+
+    cache = None if args.no_cache else VerdictCache()
+
+    def key(image_ref):
+        return probe_key(args.probe, image_ref, args.compose_file)
+
+    for index, (label, image_ref, _) in enumerate(candidates):
+        cached = cache.get(key(image_ref)) if cache is not None else None
+        state = "" if cached is None else (" (cached: good)" if cached else " (cached: bad)")
+        print(f"[{index}] {label}: {image_ref}{state}")
+    if args.dry_run:
+        return 0
+
+    import modal
+
+    start_run("bisect")
+    print("Looking up modal.Sandbox app")
+    app = modal.App.lookup(args.app, create_if_missing=True)
+    probe_fn = probe_compose if args.probe == "compose" else probe_snapshot
+    pool = SandboxPool(app, size=1, workers=args.parallel * (args.parallel + 1))
+
+    def prewarm(image_refs):
+        for image_ref in image_refs:
+            pool.fill(dockerd_spec(image_ref))
+
+    with span("bisect", probe=args.probe, parallel=args.parallel) as bisect_span:
+        try:
+            first_bad, verdicts, rounds = bisect(
+                candidates,
+                lambda image_ref: probe_fn(pool, image_ref, args.compose_file),
+                parallel=args.parallel,
+                cache=cache,
+                key=key,
+                check_ends=check_ends,
+                prewarm=prewarm if args.prewarm else None,
+            )
+        except RuntimeError as e:
+            bisect_span.set(error=str(e))
+            print(f"\nbisect: {e}", file=sys.stderr)
+            return 1
+        finally:
+            pool.close()
+    if args.prewarm:
+        print(pool.summary())
+    launched = sum(1 for _, source in verdicts.values() if source != "cache")
+    label, image_ref, _ = candidates[first_bad]
+    print(f"\nFirst bad: [{first_bad}] {label}: {image_ref}")
+    print(
+        f"{rounds} rounds, {launched} sandboxes launched, "
+        f"{len(verdicts) - launched} cached verdicts, {bisect_span.duration_s:.1f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
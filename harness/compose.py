@@ -0,0 +1,141 @@
+"""Start a compose project detached and wait for its services to become healthy.
+
+``up -d`` and the health polling run in a single sandbox exec. The script
+polls ``ps`` every ``interval`` seconds and prints one JSON line whenever a
+service's status changes. It exits as soon as every service is healthy:
+``healthy`` when the service declares a ``healthcheck``, else ``running``.
+It also exits when one is unhealthy or exited, or when the timeout passes.
+:func:`wait_healthy` turns those lines into per-service time-to-healthy,
+measured from just before ``up -d``.
+"""
+
+import json
+import shlex
+
+from harness.output import run_logged
+from harness.timing import span
+
+COMPOSE = "docker-compose"
+
+
+def health_script(compose_file, project, timeout=120.0, interval=0.25, compose=COMPOSE):
+    """Return a sh script that runs ``up -d`` and polls until every service is healthy.
+
+    Events are JSON lines with ``event`` (``up``, ``status``, ``healthy``,
+    ``failed``, ``timeout``) and ``ms`` since the script started; compose's
+    own output goes to stderr.
+    """
+    base = f"{compose} -f {shlex.quote(compose_file)} -p {shlex.quote(project)}"
+    return f"""
+timeout_ms={int(timeout * 1000)}
+now_ms() {{ echo $(( $(date +%s%N) / 1000000 )); }}
+event() {{ printf '{{"event": "%s", "ms": %s%s}}\\n' "$1" $(( $(now_ms) - start )) "$2"; }}
+start=$(now_ms)
+if ! {base} up -d >&2; then
+    event failed ', "reason": "up"'
+    exit 1
+fi
+event up ''
+seen=""
+while :; do
+    # One "service state health" line per container. Compose prints a JSON array
+    # before 2.21 and one object per line after; the images may lack a JSON parser.
+    ps=$({base} ps -a --format json 2>/dev/null |
+        grep -oE '"(Service|State|Health)": *"[^"]*"' |
+        awk -F'"' '{{ v[$2] = $4; n++ }} n == 3 {{ print v["Service"], v["State"], v["Health"]; n = 0; delete v }}')
+    pending=0
+    failed=0
+    while read -r svc state health; do
+        [ -n "$svc" ] || continue
+        case " $seen " in
+            *" $svc=$state/$health "*) ;;
+            *)
+                seen="$seen $svc=$state/$health"
+                event status ", \\"service\\": \\"$svc\\", \\"state\\": \\"$state\\", \\"health\\": \\"$health\\""
+                ;;
+        esac
+        if [ "$health" = unhealthy ] || [ "$state" = exited ] || [ "$state" = dead ]; then
+            failed=1
+        elif [ -n "$health" ] && [ "$health" != healthy ]; then
+            pending=1
+        elif [ "$state" != running ]; then
+            pending=1
+        fi
+    done <<EOF
+$ps
+EOF
+    if [ "$failed" = 1 ]; then
+        event failed ', "reason": "service"'
+        exit 1
+    fi
+    if [ -n "$ps" ] && [ "$pending" = 0 ]; then
+        event healthy ''
+        exit 0
+    fi
+    if [ $(( $(now_ms) - start )) -ge "$timeout_ms" ]; then
+        event timeout ''
+        exit 1
+    fi
+    sleep {interval}
+done
+"""
+
+
+def parse_events(lines):
+    """Return ``{ok, reason, up_s, elapsed_s, services}`` from the script's JSON lines.
+
+    ``services`` maps each service to ``{"ready_s", "states"}``, where
+    ``states`` lists ``(status, seconds)`` transitions and ``ready_s`` is the
+    first time it was healthy (or running, without a healthcheck).
+    """
+    result = {"ok": False, "reason": None, "up_s": None, "elapsed_s": None, "services": {}}
+    for line in lines:
+        line = line.strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        seconds = event["ms"] / 1000
+        kind = event["event"]
+        if kind == "up":
+            result["up_s"] = seconds
+        elif kind == "status":
+            service = result["services"].setdefault(event["service"], {"ready_s": None, "states": []})
+            health = event.get("health") or ""
+            service["states"].append((health or event["state"], seconds))
+            ready = health == "healthy" or (not health and event["state"] == "running")
+            if ready and service["ready_s"] is None:
+                service["ready_s"] = seconds
+        else:
+            result["ok"] = kind == "healthy"
+            result["reason"] = event.get("reason", kind)
+            result["elapsed_s"] = seconds
+    return result
+
+
+def wait_healthy(sb, compose_file, project, timeout=120.0, interval=0.25, compose=COMPOSE):
+    """Run ``up -d`` in ``sb`` and return :func:`parse_events` once every service is healthy."""
+    with span("compose_healthy", project=project) as health_span:
+        run = run_logged(
+            sb, f"{project}-up-healthy", "sh", "-c", health_script(compose_file, project, timeout, interval, compose),
+            tail=500,
+        )
+        result = parse_events(run.tail)
+        result["stderr_tail"] = run.stderr_tail
+        health_span.set(ok=result["ok"], reason=result["reason"])
+    return result
+
+
+def print_health(result):
+    print(f"{'service':<24} {'time to healthy':>16}  transitions")
+    for name, service in sorted(result["services"].items()):
+        ready = f"{service['ready_s']:.2f}s" if service["ready_s"] is not None else "-"
+        states = ", ".join(f"{status} @{seconds:.2f}s" for status, seconds in service["states"])
+        print(f"{name:<24} {ready:>16}  {states}")
+    if result["up_s"] is not None:
+        print(f"up -d returned after {result['up_s']:.2f}s")
+    if result["elapsed_s"] is not None:
+        state = "all healthy" if result["ok"] else f"stopped ({result['reason']})"
+        print(f"{state} after {result['elapsed_s']:.2f}s")
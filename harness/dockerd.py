@@ -0,0 +1,94 @@
+"""Wait for dockerd inside a sandbox instead of sleeping a fixed time."""
+
+import json
+import shlex
+
+from harness.timing import span
+
+DOCKER_SOCK = "/var/run/docker.sock"
+
+
+class DockerdNotReady(Exception):
+    """Raised when dockerd does not answer /_ping before the deadline."""
+
+
+def readiness_script(timeout=60.0, initial_delay=0.05, max_delay=1.0, sock=DOCKER_SOCK):
+    """Return a sh script that polls the docker socket with exponential backoff.
+
+    The script prints one JSON line with ``ready``, ``elapsed_ms`` and
+    ``attempts`` and exits non-zero if the deadline passes first.
+    """
+    timeout_ms = int(timeout * 1000)
+    delay_ms = max(1, int(initial_delay * 1000))
+    max_delay_ms = max(delay_ms, int(max_delay * 1000))
+    return f"""
+sock={shlex.quote(sock)}
+timeout_ms={timeout_ms}
+delay_ms={delay_ms}
+max_delay_ms={max_delay_ms}
+now_ms() {{ echo $(( $(date +%s%N) / 1000000 )); }}
+probe() {{
+    if command -v curl >/dev/null 2>&1; then
+        [ "$(curl -s --max-time 2 --unix-socket "$sock" http://localhost/_ping 2>/dev/null)" = "OK" ]
+    else
+        docker version >/dev/null 2>&1
+    fi
+}}
+start=$(now_ms)
+attempts=0
+while :; do
+    attempts=$((attempts + 1))
+    if [ -S "$sock" ] && probe; then
+        echo "{{\\"ready\\": true, \\"elapsed_ms\\": $(( $(now_ms) - start )), \\"attempts\\": $attempts}}"
+        exit 0
+    fi
+    elapsed=$(( $(now_ms) - start ))
+    if [ "$elapsed" -ge "$timeout_ms" ]; then
+        echo "{{\\"ready\\": false, \\"elapsed_ms\\": $elapsed, \\"attempts\\": $attempts}}"
+        exit 1
+    fi
+    sleep "$(printf '%d.%03d' $((delay_ms / 1000)) $((delay_ms % 1000)))"
+    delay_ms=$((delay_ms * 2))
+    if [ "$delay_ms" -gt "$max_delay_ms" ]; then
+        delay_ms=$max_delay_ms
+    fi
+done
+"""
+
+
+def _parse_result(stdout, returncode, timeout):
+    lines = [line for line in stdout.strip().splitlines() if line.strip()]
+    try:
+        result = json.loads(lines[-1])
+    except (IndexError, json.JSONDecodeError):
+        raise DockerdNotReady(f"Readiness probe produced no result (exit code {returncode}): {stdout!r}")
+    if returncode != 0 or not result.get("ready"):
+        raise DockerdNotReady(
+            f"dockerd not ready after {result.get('elapsed_ms', 0) / 1000:.2f}s "
+            f"({result.get('attempts')} attempts, timeout {timeout}s)"
+        )
+    return result["elapsed_ms"] / 1000
+
+
+def wait_for_dockerd(sb, timeout=60.0, initial_delay=0.05, max_delay=1.0):
+    """Block until dockerd answers on its socket; return time-to-ready in seconds.
+
+    All polling happens inside a single exec, so the wait costs one round-trip
+    regardless of how many probes it takes.
+    """
+    script = readiness_script(timeout, initial_delay, max_delay)
+    with span("dockerd_ready"):
+        p = sb.exec("sh", "-c", script, timeout=int(timeout) + 30)
+        stdout = p.stdout.read()
+        p.wait()
+        return _parse_result(stdout, p.returncode, timeout)
+
+
+async def wait_for_dockerd_async(sb, timeout=60.0, initial_delay=0.05, max_delay=1.0):
+    """Async variant of wait_for_dockerd for the async Modal API."""
+    script = readiness_script(timeout, initial_delay, max_delay)
+    with span("dockerd_ready"):
+        p = await sb.exec.aio("sh", "-c", script, timeout=int(timeout) + 30)
+        stdout = await p.stdout.read.aio()
+        await p.wait.aio()
+        return _parse_result(stdout, p.returncode, timeout)
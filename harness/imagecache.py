@@ -0,0 +1,191 @@
+"""Serve the small public images the scenarios use from a persistent cache.
+
+Every iteration of a scenario pulls ``hello-world``, ``alpine``,
+``python:3.11-slim`` or ``redis:7-alpine`` from Docker Hub again, paying its
+latency and rate limits. Two optional modes avoid that:
+
+* tarball cache: a Modal Volume mounted at :data:`CACHE_MOUNT` holds one
+  ``docker save`` tarball per image. :meth:`ImageCache.ensure` runs after dockerd
+  is ready and ``docker load``\\s each cached tarball, pulling and saving only
+  the misses, so a warm cache needs no network at all.
+* registry mirror: ``start-dockerd.sh`` passes ``DOCKER_REGISTRY_MIRROR`` to
+  dockerd as ``--registry-mirror`` (plain ``http://`` mirrors are also
+  marked insecure), e.g. a ``registry:2`` pull-through proxy.
+
+Both are off unless a script is run with ``--image-cache`` or
+``--registry-mirror``; mounting a volume changes the sandbox under test, so
+snapshot results should be compared with the cache off.
+"""
+
+import hashlib
+import json
+import re
+import shlex
+import threading
+
+from harness.output import run_logged, run_logged_async
+from harness.timing import span
+
+CACHE_VOLUME = "docker-image-cache"
+CACHE_MOUNT = "/image-cache"
+CACHE_DIR = f"{CACHE_MOUNT}/docker"
+
+
+def add_arguments(parser):
+    """Add the ``--image-cache`` / ``--registry-mirror`` flags to a script's parser."""
+    parser.add_argument(
+        "--image-cache",
+        action="store_true",
+        help=f"load pulled images from docker save tarballs on the {CACHE_VOLUME!r} volume",
+    )
+    parser.add_argument("--image-cache-refresh", action="store_true", help="re-pull and re-save cached images")
+    parser.add_argument("--registry-mirror", help="registry mirror URL passed to dockerd (DOCKER_REGISTRY_MIRROR)")
+
+
+def tarball_name(ref):
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", ref).strip("_")
+    return f"{safe}-{hashlib.sha256(ref.encode()).hexdigest()[:8]}.tar"
+
+
+def ensure_script(refs, cache_dir=CACHE_DIR, refresh=False):
+    """Return a sh script that loads or pulls each ref and prints one JSON line per ref.
+
+    Docker's own output goes to stderr so stdout only carries the results.
+    """
+    lines = [
+        f"dir={shlex.quote(cache_dir)}",
+        'mkdir -p "$dir"',
+        "now_ms() { echo $(( $(date +%s%N) / 1000000 )); }",
+        "ensure() {",
+        '    ref=$1; file="$dir/$2"; start=$(now_ms)',
+        f'    if [ {"1" if refresh else "0"} = 0 ] && [ -s "$file" ] && docker load -i "$file" >&2; then',
+        "        hit=true",
+        '    elif docker pull "$ref" >&2 && docker save -o "$file.tmp.$$" "$ref" && mv "$file.tmp.$$" "$file"; then',
+        "        hit=false",
+        "    else",
+        '        rm -f "$file.tmp.$$"',
+        '        printf \'{"ref": "%s", "error": true, "ms": %s}\\n\' "$ref" $(( $(now_ms) - start ))',
+        "        return",
+        "    fi",
+        '    printf \'{"ref": "%s", "hit": %s, "bytes": %s, "ms": %s}\\n\' '
+        '"$ref" "$hit" "$(stat -c %s "$file")" $(( $(now_ms) - start ))',
+        "}",
+    ]
+    lines += [f"ensure {shlex.quote(ref)} {shlex.quote(tarball_name(ref))}" for ref in refs]
+    # Flush tarballs to the volume before the sandbox goes away
+    lines.append('sync "$dir" 2>/dev/null || sync')
+    return "\n".join(lines) + "\n"
+
+
+def parse_results(stdout):
+    results = []
+    for line in stdout.splitlines():
+        line = line.strip()
+        if line.startswith("{"):
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return results
+
+
+class ImageCache:
+    """The cache options of one run, plus hits, misses and bytes served across its sandboxes."""
+
+    def __init__(self, enabled=False, refresh=False, registry_mirror=None, volume_name=CACHE_VOLUME):
+        self.enabled = enabled
+        self.refresh = refresh
+        self.registry_mirror = registry_mirror
+        self.volume_name = volume_name
+        self.results = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.image_cache, args.image_cache_refresh, args.registry_mirror)
+
+    def sandbox_options(self):
+        """Return extra ``Sandbox.create`` keyword arguments for the enabled modes."""
+        import modal
+
+        options = {}
+        if self.enabled:
+            options["volumes"] = {CACHE_MOUNT: modal.Volume.from_name(self.volume_name, create_if_missing=True)}
+        if self.registry_mirror:
+            options["secrets"] = [modal.Secret.from_dict({"DOCKER_REGISTRY_MIRROR": self.registry_mirror})]
+        return options
+
+    def add(self, results):
+        with self._lock:
+            self.results.extend(results)
+
+    def ensure(self, sb, refs, name="docker-pull"):
+        """Make ``refs`` available to dockerd: from the cache when enabled, else ``docker pull``."""
+        if not self.enabled:
+            for ref in refs:
+                pull = run_logged(sb, f"{name}-{ref}", "docker", "pull", ref, tail=5)
+                if not pull.ok:
+                    raise RuntimeError(f"docker pull {ref} failed: {' / '.join(pull.stderr_tail)}")
+            return []
+        with span("image_cache", refs=list(refs)) as cache_span:
+            # stdout carries only the JSON result lines; docker's output goes to the step log
+            result = run_logged(sb, f"{name}-cache", "sh", "-c", ensure_script(refs, refresh=self.refresh), tail=len(refs))
+            results = self._record(cache_span, result.tail)
+        _check(results, refs)
+        return results
+
+    async def ensure_async(self, sb, refs, name="docker-pull"):
+        if not self.enabled:
+            for ref in refs:
+                pull = await run_logged_async(sb, f"{name}-{ref}", "docker", "pull", ref, tail=5)
+                if not pull.ok:
+                    raise RuntimeError(f"docker pull {ref} failed: {' / '.join(pull.stderr_tail)}")
+            return []
+        with span("image_cache", refs=list(refs)) as cache_span:
+            result = await run_logged_async(
+                sb, f"{name}-cache", "sh", "-c", ensure_script(refs, refresh=self.refresh), tail=len(refs)
+            )
+            results = self._record(cache_span, result.tail)
+        _check(results, refs)
+        return results
+
+    def _record(self, cache_span, lines):
+        results = parse_results("\n".join(lines))
+        cache_span.set(hits=sum(1 for r in results if r.get("hit")))
+        self.add(results)
+        return results
+
+    @property
+    def hits(self):
+        return sum(1 for r in self.results if r.get("hit"))
+
+    @property
+    def misses(self):
+        return sum(1 for r in self.results if r.get("hit") is False)
+
+    @property
+    def errors(self):
+        return sum(1 for r in self.results if r.get("error"))
+
+    @property
+    def bytes_saved(self):
+        return sum(r["bytes"] for r in self.results if r.get("hit"))
+
+    def print_summary(self):
+        if not self.results:
+            return
+        load_ms = [r["ms"] for r in self.results if r.get("hit")]
+        pull_ms = [r["ms"] for r in self.results if r.get("hit") is False]
+        print(f"\nImage cache: {self.hits} hits, {self.misses} misses, {self.errors} errors")
+        print(f"  served from cache: {self.bytes_saved / 1e6:.1f} MB (uncompressed tarballs)")
+        if load_ms:
+            print(f"  docker load: mean {sum(load_ms) / len(load_ms) / 1000:.2f}s")
+        if pull_ms:
+            print(f"  pull + save: mean {sum(pull_ms) / len(pull_ms) / 1000:.2f}s")
+
+
+def _check(results, refs):
+    failed = [r["ref"] for r in results if r.get("error")]
+    missing = set(refs) - {r["ref"] for r in results}
+    if failed or missing:
+        raise RuntimeError(f"Could not load or pull: {', '.join(sorted(set(failed) | missing))}")
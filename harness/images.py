@@ -0,0 +1,265 @@
+"""Image definitions shared by every scenario, keyed by content hash.
+
+Each image is defined once here and looked up by name with
+:func:`get_image`. Nothing is built or written at import time. A definition's
+``content_hash`` covers its Dockerfile, every file the Dockerfile copies, the
+base image, extra commands and the Modal image builder version, so editing
+``start-dockerd.sh`` changes the hash of every image that copies it.
+
+``prebuild`` hydrates images concurrently and records ``hash -> image id`` in
+a local index; later lookups of an unchanged definition resolve straight to
+that id instead of re-evaluating the Dockerfile::
+
+    python -m harness.images list
+    python -m harness.images prebuild [NAME ...] [--workers N]
+"""
+
+import argparse
+import concurrent.futures
+import contextvars
+import hashlib
+import json
+import os
+import shlex
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUILDER_VERSION = "2025.06"
+INDEX_PATH = os.path.expanduser("~/.cache/modal-snapshot-testing/images.json")
+
+
+def _hash_path(digest, path):
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                _hash_path(digest, os.path.join(root, name))
+        return
+    digest.update(os.path.relpath(path, REPO_ROOT).encode() + b"\0")
+    with open(path, "rb") as fh:
+        digest.update(fh.read())
+
+
+def copied_files(dockerfile, context_dir):
+    """Return the local paths a Dockerfile's COPY/ADD instructions read from ``context_dir``."""
+    paths = []
+    with open(dockerfile) as fh:
+        for line in fh:
+            if line.split(None, 1)[:1] not in (["COPY"], ["ADD"]):
+                continue
+            parts = shlex.split(line, comments=True)
+            if len(parts) < 3:
+                continue
+            if any(part.startswith("--from") for part in parts):
+                continue
+            sources = [part for part in parts[1:-1] if not part.startswith("--")]
+            paths.extend(os.path.join(context_dir, source) for source in sources if "://" not in source)
+    return paths
+
+
+class ImageDef:
+    """One image: a Dockerfile, a registry ref, or another definition plus commands."""
+
+    def __init__(
+        self,
+        name,
+        dockerfile=None,
+        context_dir=REPO_ROOT,
+        registry=None,
+        add_python=None,
+        base=None,
+        commands=(),
+        description="",
+    ):
+        if sum(x is not None for x in (dockerfile, registry, base)) != 1:
+            raise ValueError(f"image {name!r} needs exactly one of dockerfile, registry or base")
+        self.name = name
+        self.dockerfile = dockerfile and os.path.join(REPO_ROOT, dockerfile)
+        self.context_dir = context_dir
+        self.registry = registry
+        self.add_python = add_python
+        self.base = base
+        self.commands = tuple(commands)
+        self.description = description
+
+    @property
+    def content_hash(self):
+        digest = hashlib.sha256()
+        digest.update(f"builder={BUILDER_VERSION}\0".encode())
+        if self.dockerfile:
+            _hash_path(digest, self.dockerfile)
+            for path in copied_files(self.dockerfile, self.context_dir):
+                _hash_path(digest, path)
+        elif self.registry:
+            digest.update(f"registry={self.registry}\0python={self.add_python}\0".encode())
+        else:
+            digest.update(f"base={IMAGES[self.base].content_hash}\0".encode())
+        for command in self.commands:
+            digest.update(f"run={command}\0".encode())
+        return digest.hexdigest()[:16]
+
+    def define(self, prebuilt=True):
+        """Return a lazy ``modal.Image`` for this definition; nothing is built yet.
+
+        A ``base`` image is resolved through :func:`get_image` with the same
+        ``prebuilt`` flag, so a prebuilt base is reused rather than rebuilt.
+        """
+        import modal
+
+        os.environ.setdefault("MODAL_IMAGE_BUILDER_VERSION", BUILDER_VERSION)
+        if self.dockerfile:
+            image = modal.Image.from_dockerfile(self.dockerfile, context_dir=self.context_dir)
+        elif self.registry:
+            image = modal.Image.from_registry(self.registry, add_python=self.add_python)
+        else:
+            image = get_image(self.base, prebuilt=prebuilt)
+        if self.commands:
+            image = image.run_commands(*self.commands)
+        return image
+
+
+IMAGES = {
+    image.name: image
+    for image in (
+        ImageDef(
+            "docker_in_gvisor",
+            dockerfile="Dockerfile.docker_in_gvisor",
+            description="Ubuntu 22.04 with docker, buildx, compose and /start-dockerd.sh",
+        ),
+        ImageDef(
+            "docker_in_gvisor_network",
+            base="docker_in_gvisor",
+            commands=("apt-get install -y wget curl iputils-ping dnsutils",),
+            description="docker_in_gvisor plus network debugging tools",
+        ),
+        ImageDef(
+            "pnpm",
+            dockerfile="pnpm-testing/Dockerfile.pnpm",
+            context_dir=os.path.join(REPO_ROOT, "pnpm-testing"),
+            description="node:22-slim with docker, pnpm and the Slidev monorepo",
+        ),
+        ImageDef(
+            "ubuntu_python",
+            registry="ubuntu:22.04",
+            add_python="3.11",
+            description="Plain Ubuntu 22.04 with Python 3.11",
+        ),
+    )
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_index(path=INDEX_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_index(index, path=INDEX_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def get_image(name, prebuilt=True):
+    """Return the ``modal.Image`` for ``name``, memoized per process.
+
+    With ``prebuilt`` an image whose content hash was recorded by ``prebuild``
+    resolves to that image id, and so does its base image; without it the
+    whole chain is defined from scratch.
+    """
+    definition = IMAGES[name]
+    key = (name, prebuilt)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    entry = load_index().get(definition.content_hash) if prebuilt else None
+    if entry:
+        import modal
+
+        image = modal.Image.from_id(entry["image_id"])
+    else:
+        image = definition.define(prebuilt)
+    with _cache_lock:
+        return _cache.setdefault(key, image)
+
+
+def prebuild(app, names=None, workers=4):
+    """Hydrate images concurrently and record their ids by content hash; return results."""
+    from harness.timing import hydrate_image
+
+    names = list(names or IMAGES)
+    results = {}
+
+    def build_one(name):
+        definition = IMAGES[name]
+        start = time.monotonic()
+        image = hydrate_image(definition.define(), app)
+        return {
+            "name": name,
+            "hash": definition.content_hash,
+            "image_id": image.object_id,
+            "seconds": time.monotonic() - start,
+        }
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, build_one, name): name for name in names}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+                print(f"{name:<26} {results[name]['hash']}  {results[name]['image_id']}  {results[name]['seconds']:.1f}s")
+            except Exception as e:
+                results[name] = {"name": name, "error": f"{type(e).__name__}: {e}"}
+                print(f"{name:<26} FAILED: {results[name]['error']}")
+
+    index = load_index()
+    for result in results.values():
+        if "image_id" in result:
+            index[result["hash"]] = {"name": result["name"], "image_id": result["image_id"], "built_at": time.time()}
+    _save_index(index)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared image definitions")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("list", help="show each image, its content hash and whether it is prebuilt")
+    prebuild_parser = sub.add_parser("prebuild", help="hydrate images concurrently")
+    prebuild_parser.add_argument("names", nargs="*", help="images to build (default: all)")
+    prebuild_parser.add_argument("--workers", type=int, default=4)
+    prebuild_parser.add_argument("--app", default="image-prebuild", help="Modal app to build under")
+    args = parser.parse_args(argv)
+
+    if args.command == "prebuild":
+        unknown = set(args.names) - set(IMAGES)
+        if unknown:
+            parser.error(f"unknown image(s): {', '.join(sorted(unknown))}")
+        import modal
+
+        from harness.timing import start_run
+
+        start_run("prebuild")
+        app = modal.App.lookup(args.app, create_if_missing=True)
+        with modal.enable_output():
+            results = prebuild(app, args.names, args.workers)
+        return 0 if all("image_id" in result for result in results.values()) else 1
+
+    index = load_index()
+    for name, definition in IMAGES.items():
+        entry = index.get(definition.content_hash)
+        state = entry["image_id"] if entry else "not prebuilt"
+        print(f"{name:<26} {definition.content_hash}  {state:<28} {definition.description}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
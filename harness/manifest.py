@@ -0,0 +1,490 @@
+"""Single-pass filesystem manifest for a directory tree (stdlib only).
+
+The tree is walked once with ``os.scandir`` and every entry is recorded with
+its path, type, size, mode, inode, link count and symlink target. Counts and
+samples are derived from that manifest instead of re-walking the tree with
+separate ``find`` invocations.
+
+Manifests are written either as compact JSON or in a compressed, columnar
+binary format meant for moving 100k-entry trees in and out of a sandbox
+with ``sb.open``. The binary file is a 4-byte magic plus a codec byte,
+followed by blocks of up to ``BLOCK_SIZE`` entries, each one
+``varint(compressed length) + compressed payload`` and terminated by a zero
+length. A payload stores its entries column by column: front-coded paths
+(length of the prefix shared with the previous path, then the new suffix),
+one type byte per entry, then varint sizes, modes, inodes and link counts,
+and finally the targets of the symlinks in the block. ``iter_binary`` reads
+one block at a time, so large manifests are never fully materialized, and
+raises ``ValueError`` for a truncated or corrupted file.
+
+The module is self-contained so its source can be sent into a sandbox and
+run as a script: with no arguments it manifests ``node_modules`` in the
+current directory, writes ``node_modules.manifest.bin`` and
+``node_modules_snapshot.json`` and prints the summary as one JSON line.
+``verify`` checks a saved manifest against the live tree.
+"""
+
+import argparse
+import json
+import os
+import stat
+import sys
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FIELDS = ["path", "type", "size", "mode", "inode", "nlink", "target"]
+MANIFEST_VERSION = 1
+BINARY_MAGIC = b"NMF1"
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+BLOCK_SIZE = 4096
+READ_CHUNK_SIZE = 1 << 20
+
+
+def _kind(mode):
+    if stat.S_ISREG(mode):
+        return "f"
+    if stat.S_ISDIR(mode):
+        return "d"
+    if stat.S_ISLNK(mode):
+        return "l"
+    if stat.S_ISSOCK(mode):
+        return "s"
+    return "o"
+
+
+def walk(root):
+    """Return the sorted manifest rows for everything below ``root``.
+
+    Rows follow ``FIELDS``; paths are ``root``-prefixed, like ``find root``
+    prints them, and symlinks are recorded but not followed. Directories that
+    cannot be read are returned separately as ``errors``.
+    """
+    rows = []
+    errors = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            iterator = os.scandir(directory)
+        except OSError as e:
+            errors.append([directory, e.strerror or str(e)])
+            continue
+        with iterator:
+            for entry in iterator:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError as e:
+                    errors.append([entry.path, e.strerror or str(e)])
+                    continue
+                kind = _kind(st.st_mode)
+                target = None
+                if kind == "l":
+                    try:
+                        target = os.readlink(entry.path)
+                    except OSError:
+                        target = ""
+                elif kind == "d":
+                    stack.append(entry.path)
+                rows.append([entry.path, kind, st.st_size, stat.S_IMODE(st.st_mode), st.st_ino, st.st_nlink, target])
+    rows.sort(key=lambda row: row[0])
+    return rows, errors
+
+
+def summarize(rows, root="node_modules", top_limit=25, package_limit=50):
+    """Derive the counts and samples the pnpm validation uses from ``rows``."""
+    prefix = root.rstrip("/") + "/"
+    pnpm_root = prefix + ".pnpm"
+    pnpm_prefix = pnpm_root + "/"
+    top_entries = []
+    pnpm_entries = []
+    sample_packages = []
+    package_json_count = 0
+    has_pnpm_dir = False
+    for path, kind, *_ in rows:
+        name = path.rsplit("/", 1)[-1]
+        if kind == "f" and name == "package.json":
+            package_json_count += 1
+        relative = path[len(prefix):]
+        if "/" not in relative:
+            top_entries.append(relative)
+            if relative == ".pnpm" and kind == "d":
+                has_pnpm_dir = True
+        elif path.startswith(pnpm_prefix):
+            pnpm_relative = path[len(pnpm_prefix):]
+            depth = pnpm_relative.count("/") + 1
+            if depth == 1:
+                pnpm_entries.append(pnpm_relative)
+            # Matches `find node_modules/.pnpm -maxdepth 3 -name package.json -type f`
+            if kind == "f" and name == "package.json" and depth <= 3:
+                sample_packages.append(path)
+    if not has_pnpm_dir:
+        pnpm_entries = []
+    return {
+        "entry_count": len(rows),
+        "package_json_count": package_json_count,
+        "top_entries": top_entries[:top_limit],
+        "top_entry_count": len(top_entries),
+        "pnpm_entries": pnpm_entries[:top_limit],
+        "pnpm_entry_count": len(pnpm_entries),
+        "sample_packages": sample_packages[:package_limit],
+    }
+
+
+def dump(rows, fh, root, errors=()):
+    """Write the manifest as compact JSON."""
+    json.dump(
+        {"version": MANIFEST_VERSION, "root": root, "fields": FIELDS, "entries": rows, "errors": list(errors)},
+        fh,
+        separators=(",", ":"),
+    )
+
+
+def load(fh):
+    """Read a manifest written by ``dump``; return its rows."""
+    data = json.load(fh)
+    if data.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version: {data.get('version')}")
+    return data["entries"]
+
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _encode_path(path):
+    return path.encode("utf-8", "surrogateescape")
+
+
+def _encode_block(rows):
+    out = bytearray()
+    _put_varint(out, len(rows))
+    previous = b""
+    for row in rows:
+        path = _encode_path(row[0])
+        shared = 0
+        limit = min(len(path), len(previous))
+        while shared < limit and path[shared] == previous[shared]:
+            shared += 1
+        _put_varint(out, shared)
+        _put_varint(out, len(path) - shared)
+        out += path[shared:]
+        previous = path
+    out += bytes(ord(row[1]) for row in rows)
+    for column in (2, 3, 4, 5):
+        for row in rows:
+            _put_varint(out, row[column])
+    for row in rows:
+        if row[1] == "l":
+            target = _encode_path(row[6] or "")
+            _put_varint(out, len(target))
+            out += target
+    return bytes(out)
+
+
+def _decode_block(data):
+    count, pos = _get_varint(data, 0)
+    paths = []
+    previous = b""
+    for _ in range(count):
+        shared, pos = _get_varint(data, pos)
+        length, pos = _get_varint(data, pos)
+        path = previous[:shared] + data[pos:pos + length]
+        pos += length
+        paths.append(path)
+        previous = path
+    kinds = [chr(byte) for byte in data[pos:pos + count]]
+    pos += count
+    columns = []
+    for _ in range(4):
+        column = []
+        for _ in range(count):
+            value, pos = _get_varint(data, pos)
+            column.append(value)
+        columns.append(column)
+    targets = []
+    for kind in kinds:
+        target = None
+        if kind == "l":
+            length, pos = _get_varint(data, pos)
+            target = data[pos:pos + length].decode("utf-8", "surrogateescape")
+            pos += length
+        targets.append(target)
+    if pos != len(data):
+        raise ValueError("Corrupt manifest block")
+    return [
+        [
+            paths[index].decode("utf-8", "surrogateescape"),
+            kinds[index],
+            columns[0][index],
+            columns[1][index],
+            columns[2][index],
+            columns[3][index],
+            targets[index],
+        ]
+        for index in range(count)
+    ]
+
+
+def _codec(codec):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Manifest is zstd-compressed but the zstandard module is not installed")
+        # zlib streams carry an adler32; zstd frames need the checksum asked for
+        compressor = zstandard.ZstdCompressor(level=10, write_checksum=True)
+        return compressor.compress, zstandard.ZstdDecompressor().decompress
+    if codec != CODEC_ZLIB:
+        raise ValueError(f"Unknown manifest codec: {codec}")
+    return (lambda data: zlib.compress(data, 9)), zlib.decompress
+
+
+def _corruption_errors():
+    errors = (zlib.error, IndexError)
+    return errors + (zstandard.ZstdError,) if zstandard is not None else errors
+
+
+def write_binary(rows, fh, compression=None, block_size=BLOCK_SIZE):
+    """Write ``rows`` (any iterable, sorted by path) to the binary file ``fh``.
+
+    ``compression`` is ``"zstd"`` or ``"zlib"``; by default zstd is used
+    when the ``zstandard`` module is importable and zlib otherwise.
+    """
+    if compression is None:
+        compression = "zstd" if zstandard is not None else "zlib"
+    codec = CODEC_ZSTD if compression == "zstd" else CODEC_ZLIB
+    compress, _ = _codec(codec)
+    fh.write(BINARY_MAGIC + bytes([codec]))
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) == block_size:
+            _write_block(fh, compress(_encode_block(block)))
+            block = []
+    if block:
+        _write_block(fh, compress(_encode_block(block)))
+    fh.write(b"\x00")
+
+
+def _write_block(fh, payload):
+    header = bytearray()
+    _put_varint(header, len(payload))
+    fh.write(bytes(header) + payload)
+
+
+class _ChunkReader:
+    """Buffer reads so a remote file (``sb.open``) is fetched in large chunks."""
+
+    def __init__(self, fh, chunk_size):
+        self._fh = fh
+        self._chunk_size = chunk_size
+        self._buffer = b""
+        self._pos = 0
+
+    def read_exact(self, size):
+        while len(self._buffer) - self._pos < size:
+            chunk = self._fh.read(self._chunk_size)
+            if not chunk:
+                raise ValueError("Truncated manifest")
+            self._buffer = self._buffer[self._pos:] + chunk
+            self._pos = 0
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += size
+        return data
+
+    def read_varint(self):
+        result = 0
+        shift = 0
+        while True:
+            byte = self.read_exact(1)[0]
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+
+def iter_binary(fh, chunk_size=READ_CHUNK_SIZE):
+    """Yield manifest rows from the binary file ``fh`` one block at a time."""
+    reader = _ChunkReader(fh, chunk_size)
+    header = reader.read_exact(len(BINARY_MAGIC) + 1)
+    if header[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+        raise ValueError("Not a binary manifest")
+    _, decompress = _codec(header[-1])
+    corruption = _corruption_errors()
+    while True:
+        length = reader.read_varint()
+        if length == 0:
+            return
+        try:
+            rows = _decode_block(decompress(reader.read_exact(length)))
+        except corruption as e:
+            raise ValueError(f"Corrupt manifest block: {e}") from e
+        yield from rows
+
+
+def iter_manifest(path):
+    """Yield rows from a manifest file in either format."""
+    with open(path, "rb") as fh:
+        is_binary = fh.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if is_binary:
+        with open(path, "rb") as fh:
+            yield from iter_binary(fh)
+    else:
+        with open(path, encoding="utf-8") as fh:
+            yield from load(fh)
+
+
+def verify(rows, root="node_modules", limit=50):
+    """Check manifest ``rows`` against the live tree and summarize what is gone.
+
+    Every entry is ``lstat``-ed; regular files must keep their size and
+    symlinks their target. The result uses the same keys as the pnpm
+    script's summary so it can be printed the same way.
+    """
+    prefix = root.rstrip("/") + "/"
+    pnpm_prefix = prefix + ".pnpm/"
+    missing = []
+    mismatched = []
+    tracked = {"top": 0, "pnpm": 0, "package": 0}
+    missing_by_group = {"top": [], "pnpm": [], "package": []}
+    checked = 0
+    for path, kind, size, _mode, _inode, _nlink, target in rows:
+        checked += 1
+        relative = path[len(prefix):]
+        groups = []
+        if "/" not in relative:
+            groups.append(("top", relative))
+        elif path.startswith(pnpm_prefix) and "/" not in path[len(pnpm_prefix):]:
+            groups.append(("pnpm", path[len(pnpm_prefix):]))
+        if kind == "f" and path.rsplit("/", 1)[-1] == "package.json":
+            groups.append(("package", path))
+        for group, _ in groups:
+            tracked[group] += 1
+        try:
+            st = os.lstat(path)
+        except OSError:
+            missing.append(path)
+            for group, name in groups:
+                missing_by_group[group].append(name)
+            continue
+        live_kind = _kind(st.st_mode)
+        if live_kind != kind:
+            mismatched.append({"path": path, "expected": kind, "found": live_kind})
+        elif kind == "f" and st.st_size != size:
+            mismatched.append({"path": path, "expected_size": size, "found_size": st.st_size})
+        elif kind == "l" and os.readlink(path) != target:
+            mismatched.append({"path": path, "expected_target": target, "found_target": os.readlink(path)})
+
+    def count_dir(path):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            return 0
+
+    return {
+        "checked_entries": checked,
+        "missing_count": len(missing),
+        "mismatch_count": len(mismatched),
+        "missing": missing[:limit],
+        "mismatched": mismatched[:limit],
+        "tracked_top_entries": tracked["top"],
+        "tracked_pnpm_entries": tracked["pnpm"],
+        "tracked_sample_packages": tracked["package"],
+        "present_top_entries": tracked["top"] - len(missing_by_group["top"]),
+        "present_pnpm_entries": tracked["pnpm"] - len(missing_by_group["pnpm"]),
+        "present_sample_packages": tracked["package"] - len(missing_by_group["package"]),
+        "missing_top_entries": missing_by_group["top"][:limit],
+        "missing_pnpm_entries": missing_by_group["pnpm"][:limit],
+        "missing_sample_packages": missing_by_group["package"][:limit],
+        "expected_top_entry_count": tracked["top"],
+        "expected_pnpm_entry_count": tracked["pnpm"],
+        "current_top_entry_count": count_dir(root),
+        "current_pnpm_entry_count": count_dir(prefix + ".pnpm"),
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] == "verify":
+        parser = argparse.ArgumentParser(description="Check a saved manifest against the live tree")
+        parser.add_argument("manifest")
+        parser.add_argument("root", nargs="?", default="node_modules")
+        parser.add_argument("--limit", type=int, default=50)
+        args = parser.parse_args(argv[1:])
+        start = time.monotonic()
+        try:
+            result = verify(iter_manifest(args.manifest), args.root, args.limit)
+        except ValueError as e:
+            print(json.dumps({"error": "manifest_unreadable", "detail": str(e)}))
+            return 1
+        result["seconds"] = round(time.monotonic() - start, 3)
+        print(json.dumps(result))
+        return 0 if result["missing_count"] == 0 and result["mismatch_count"] == 0 else 1
+
+    parser = argparse.ArgumentParser(description="Manifest a directory tree in one pass")
+    parser.add_argument("root", nargs="?", default="node_modules")
+    parser.add_argument("--format", choices=["binary", "json"], default="binary")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--summary-output", default="node_modules_snapshot.json")
+    args = parser.parse_args(argv)
+    if args.output is None:
+        args.output = "node_modules.manifest.bin" if args.format == "binary" else "node_modules_manifest.json"
+    if not os.path.isdir(args.root):
+        print(json.dumps({"error": f"{args.root}_missing"}))
+        return 1
+
+    start = time.monotonic()
+    rows, errors = walk(args.root)
+    walk_seconds = time.monotonic() - start
+    summary = summarize(rows, args.root)
+
+    if args.format == "binary":
+        with open(args.output, "wb") as fh:
+            write_binary(rows, fh)
+    else:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            dump(rows, fh, args.root, errors)
+    with open(args.summary_output, "w", encoding="utf-8") as fh:
+        json.dump(summary, fh)
+
+    print(
+        json.dumps(
+            {
+                "package_json_count": summary["package_json_count"],
+                "top_entries_sample": summary["top_entries"][:5],
+                "pnpm_entries_sample": summary["pnpm_entries"][:5],
+                "sample_package_paths": summary["sample_packages"][:5],
+                "top_entry_count": summary["top_entry_count"],
+                "pnpm_entry_count": summary["pnpm_entry_count"],
+                "entry_count": summary["entry_count"],
+                "walk_errors": len(errors),
+                "walk_seconds": round(walk_seconds, 3),
+                "manifest_path": args.output,
+                "manifest_bytes": os.path.getsize(args.output),
+            }
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,434 @@
+"""Run snapshot scenarios declared in a TOML file as one concurrent matrix.
+
+A spec declares named images, defaults, and a list of scenarios. Each
+scenario is one sandbox (init command, image, docker-in-gvisor flag) plus an
+ordered list of steps::
+
+    [[scenario]]
+    name = "kill_dockerd"
+    command = ["sleep", "infinity"]
+    steps = ["start_dockerd", "wait_dockerd", {step = "kill", processes = ["dockerd"]}, "snapshot"]
+    expect = "fail"
+
+A scenario passes when its ``snapshot`` step's outcome matches ``expect``.
+Every image is hydrated once before any scenario starts, and at most
+``workers`` sandboxes run at a time. The result is a single table, which
+``--readme`` also writes into the marked block of a markdown file. Modal is
+imported only once scenarios actually run, so ``--list`` returns immediately.
+
+Usage::
+
+    python -m harness.matrix scenarios/snapshot_matrix.toml [--workers N] [--only NAME] [--repeat N]
+"""
+
+import argparse
+import concurrent.futures
+import contextvars
+import json
+import os
+import re
+import sys
+import time
+import tomllib
+
+from harness.dockerd import wait_for_dockerd
+from harness.images import IMAGES, get_image
+from harness.output import run_logged
+from harness.sockets import inventory_sockets, remove_sockets, select_sockets
+from harness.timing import hydrate_image, span, start_run
+
+RESULTS_DIR = os.path.expanduser("~/.cache/modal-snapshot-testing/matrix")
+DEFAULT_SPEC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scenarios", "snapshot_matrix.toml")
+README_START = "<!-- matrix:start -->"
+README_END = "<!-- matrix:end -->"
+
+WHALESAY_DOCKERFILE = """
+FROM ubuntu
+RUN apt-get update
+RUN apt-get install -y cowsay curl
+RUN mkdir -p /usr/share/cowsay/cows/
+RUN curl -o /usr/share/cowsay/cows/docker.cow https://raw.githubusercontent.com/docker/whalesay/master/docker.cow
+ENTRYPOINT ["/usr/games/cowsay", "-f", "docker.cow"]
+"""
+
+
+class SpecError(Exception):
+    """Raised when a scenario spec is malformed."""
+
+
+class SnapshotFailed(Exception):
+    """Raised by the snapshot step; the scenario's observed outcome is ``fail``."""
+
+
+# Steps
+
+
+def _exec(run, sb, step, *args):
+    """Run a command with its output drained to a per-step log; raise on failure."""
+    result = run_logged(sb, f"{run.scenario['name']}-{run.attempt}-{step}", *args, tail=10)
+    if not result.ok:
+        raise RuntimeError(
+            f"{' '.join(args)[:80]} exited {result.returncode}: {' / '.join(result.stderr_tail)[-500:]} "
+            f"(log: {result.log_path})"
+        )
+    return result
+
+
+def step_sleep(run, seconds=5):
+    time.sleep(seconds)
+
+
+def step_start_dockerd(run, command="/start-dockerd.sh"):
+    # Long-lived; deliberately not waited on
+    run.sb.exec(command)
+
+
+def step_wait_dockerd(run, timeout=60):
+    run.notes.append(f"dockerd ready in {wait_for_dockerd(run.sb, timeout=timeout):.2f}s")
+
+
+def step_docker_build_run(run, tag="whalesay"):
+    with run.sb.open("/build/Dockerfile", "w") as f:
+        f.write(WHALESAY_DOCKERFILE)
+    _exec(run, run.sb, "docker-build", "docker", "build", "--network=host", "-t", tag, "/build")
+    _exec(run, run.sb, "docker-run", "docker", "run", "--rm", tag, "Hello!")
+
+
+def step_docker_pull_run(run, image="hello-world"):
+    _exec(run, run.sb, "docker-pull", "docker", "pull", image)
+    _exec(run, run.sb, "docker-run", "docker", "run", "--rm", image)
+
+
+def step_kill(run, processes=("dockerd", "containerd"), wait=2):
+    for name in processes:
+        run.sb.exec("sh", "-c", f"pkill {name} || true").wait()
+    time.sleep(wait)
+
+
+def step_clean_sockets(run, exclude=(), name_glob="*.sock"):
+    inventory = inventory_sockets(run.sb)
+    targets = select_sockets(inventory["sockets"], exclude=tuple(exclude), name_glob=name_glob)
+    remove_sockets(run.sb, targets)
+    run.notes.append(f"removed {len(targets)} sockets")
+
+
+def step_exec(run, command):
+    _exec(run, run.sb, "exec", "sh", "-c", command)
+
+
+def step_snapshot(run):
+    try:
+        with span("snapshot_filesystem"):
+            run.image = run.sb.snapshot_filesystem()
+    except Exception as e:
+        raise SnapshotFailed(f"{type(e).__name__}: {e}") from e
+
+
+def step_resume(run, command="true"):
+    import modal
+
+    if run.image is None:
+        raise RuntimeError("resume needs a successful snapshot first")
+    with span("resume"):
+        with span("sandbox_create", from_snapshot=True):
+            resumed = modal.Sandbox.create("sleep", "infinity", timeout=10 * 60, app=run.app, image=run.image)
+        try:
+            _exec(run, resumed, "resume", "sh", "-c", command)
+        finally:
+            resumed.terminate()
+
+
+STEPS = {
+    "sleep": step_sleep,
+    "start_dockerd": step_start_dockerd,
+    "wait_dockerd": step_wait_dockerd,
+    "docker_build_run": step_docker_build_run,
+    "docker_pull_run": step_docker_pull_run,
+    "kill": step_kill,
+    "clean_sockets": step_clean_sockets,
+    "exec": step_exec,
+    "snapshot": step_snapshot,
+    "resume": step_resume,
+}
+
+# Steps that record their own phase span; the rest are timed as workload
+_PHASE_STEPS = {"wait_dockerd", "snapshot", "resume"}
+
+
+# Spec loading
+
+
+def load_spec(path):
+    """Parse and validate a spec; return ``(images, scenarios)`` with defaults applied."""
+    with open(path, "rb") as f:
+        spec = tomllib.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    images = {}
+    for name, image in spec.get("images", {}).items():
+        image = dict(image)
+        for key in ("dockerfile", "context_dir"):
+            if key in image:
+                image[key] = os.path.normpath(os.path.join(base_dir, image[key]))
+        if sum(key in image for key in ("dockerfile", "registry", "shared")) != 1:
+            raise SpecError(f"image {name!r} needs exactly one of 'dockerfile', 'registry' or 'shared'")
+        if "shared" in image and image["shared"] not in IMAGES:
+            raise SpecError(f"image {name!r} refers to unknown shared image {image['shared']!r}")
+        images[name] = image
+
+    defaults = spec.get("defaults", {})
+    scenarios = []
+    for raw in spec.get("scenario", []):
+        scenario = {"repeat": 1, "description": "", **defaults, **raw}
+        name = scenario.get("name")
+        if not name:
+            raise SpecError(f"scenario without a name: {raw}")
+        if scenario.get("image") not in images:
+            raise SpecError(f"scenario {name!r} uses unknown image {scenario.get('image')!r}")
+        if scenario.get("expect") not in ("success", "fail"):
+            raise SpecError(f"scenario {name!r}: expect must be 'success' or 'fail'")
+        steps = []
+        for step in scenario.get("steps", []):
+            step = {"step": step} if isinstance(step, str) else dict(step)
+            if step.get("step") not in STEPS:
+                raise SpecError(f"scenario {name!r} uses unknown step {step.get('step')!r}")
+            steps.append(step)
+        scenario["steps"] = steps
+        scenarios.append(scenario)
+    if len({s["name"] for s in scenarios}) != len(scenarios):
+        raise SpecError("scenario names must be unique")
+    return images, scenarios
+
+
+def build_image(image):
+    import modal
+
+    if "shared" in image:
+        return get_image(image["shared"])
+    if "dockerfile" in image:
+        return modal.Image.from_dockerfile(image["dockerfile"], context_dir=image.get("context_dir"))
+    return modal.Image.from_registry(image["registry"], add_python=image.get("add_python"))
+
+
+def hydrate_images(app, images, names, workers):
+    """Build every image used by the matrix once, concurrently; return {name: image}."""
+    built = {name: build_image(images[name]) for name in names}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, hydrate_image, image, app): name
+            for name, image in built.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+            print(f"Image {futures[future]} ready: {built[futures[future]].object_id}")
+    return built
+
+
+# Running
+
+
+class ScenarioRun:
+    """State shared by the steps of one scenario run."""
+
+    def __init__(self, app, scenario, attempt):
+        self.app = app
+        self.scenario = scenario
+        self.attempt = attempt
+        self.sb = None
+        self.image = None
+        self.notes = []
+
+
+def run_scenario(app, scenario, image, attempt):
+    """Run one scenario in its own sandbox and return a result dict."""
+    import modal
+
+    run = ScenarioRun(app, scenario, attempt)
+    name = scenario["name"]
+    result = {"scenario": name, "attempt": attempt, "expect": scenario["expect"]}
+    with span("scenario", scenario=name, attempt=attempt) as scenario_span:
+        try:
+            options = {"experimental_options": {"enable_docker_in_gvisor": True}} if scenario["docker_in_gvisor"] else {}
+            with span("sandbox_create"):
+                run.sb = modal.Sandbox.create(*scenario["command"], timeout=60 * 60, app=app, image=image, **options)
+            for step in scenario["steps"]:
+                params = {key: value for key, value in step.items() if key != "step"}
+                if step["step"] in _PHASE_STEPS:
+                    STEPS[step["step"]](run, **params)
+                else:
+                    with span("workload", step=step["step"]):
+                        STEPS[step["step"]](run, **params)
+            result["observed"] = "success" if run.image is not None else "no snapshot"
+            if run.image is not None:
+                result["image_id"] = run.image.object_id
+        except SnapshotFailed as e:
+            result["observed"] = "fail"
+            result["error"] = str(e)
+        except Exception as e:
+            result["observed"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            if run.sb is not None:
+                with span("terminate"):
+                    try:
+                        run.sb.terminate()
+                    except Exception as e:
+                        run.notes.append(f"terminate failed: {e}")
+        result["passed"] = result["observed"] == scenario["expect"]
+        scenario_span.set(observed=result["observed"], passed=result["passed"])
+    result["timings"] = scenario_span.phase_durations()
+    result["timings"]["total"] = scenario_span.duration_s
+    result["notes"] = run.notes
+    label = "PASS" if result["passed"] else "UNEXPECTED"
+    print(f"[{name} #{attempt}] {label}: expected {scenario['expect']}, observed {result['observed']}"
+          + (f" ({result['error'][:120]})" if result.get("error") else ""))
+    return result
+
+
+def run_matrix(app, scenarios, images, workers):
+    """Run every (scenario, attempt) with at most ``workers`` live sandboxes."""
+    jobs = [(scenario, attempt) for scenario in scenarios for attempt in range(1, scenario["repeat"] + 1)]
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run, run_scenario, app, scenario, images[scenario["image"]], attempt
+            )
+            for scenario, attempt in jobs
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            results.append(future.result())
+    return results
+
+
+# Reporting
+
+_TABLE_PHASES = ("sandbox_create", "dockerd_ready", "workload", "snapshot_filesystem", "total")
+
+
+def aggregate(scenarios, results):
+    """One row per scenario: pass count, observed outcomes and median phase timings."""
+    rows = []
+    for scenario in scenarios:
+        runs = [r for r in results if r["scenario"] == scenario["name"]]
+        if not runs:
+            continue
+        outcomes = sorted({r["observed"] for r in runs})
+        row = {
+            "scenario": scenario["name"],
+            "script": scenario.get("script", ""),
+            "description": scenario["description"],
+            "expect": scenario["expect"],
+            "observed": "/".join(outcomes),
+            "passed": sum(r["passed"] for r in runs),
+            "runs": len(runs),
+        }
+        for phase in _TABLE_PHASES:
+            values = sorted(r["timings"][phase] for r in runs if phase in r["timings"])
+            row[phase] = values[len(values) // 2] if values else None
+        rows.append(row)
+    return rows
+
+
+def print_table(rows):
+    print("\nScenario matrix (median seconds):")
+    print(
+        f"{'scenario':<26} {'expect':>7} {'observed':>12} {'pass':>6} "
+        f"{'create':>7} {'dockerd':>8} {'workload':>9} {'snapshot':>9} {'total':>7}"
+    )
+    for row in rows:
+        cells = [f"{row[phase]:.1f}" if row[phase] is not None else "-" for phase in _TABLE_PHASES]
+        print(
+            f"{row['scenario']:<26} {row['expect']:>7} {row['observed']:>12} {row['passed']:>3}/{row['runs']:<2} "
+            f"{cells[0]:>7} {cells[1]:>8} {cells[2]:>9} {cells[3]:>9} {cells[4]:>7}"
+        )
+    unexpected = [row["scenario"] for row in rows if row["passed"] != row["runs"]]
+    print(f"\n{len(rows) - len(unexpected)}/{len(rows)} scenarios behaved as expected")
+    if unexpected:
+        print("Unexpected: " + ", ".join(unexpected))
+
+
+def render_markdown(rows):
+    lines = [
+        "| Script | Setup | Expected | Observed | Runs as expected | Snapshot (s) | Total (s) |",
+        "| --- | --- | --- | --- | --- | --- | --- |",
+    ]
+    for row in rows:
+        script = os.path.basename(row["script"]) or row["scenario"]
+        snapshot = f"{row['snapshot_filesystem']:.1f}" if row["snapshot_filesystem"] is not None else "-"
+        total = f"{row['total']:.1f}" if row["total"] is not None else "-"
+        lines.append(
+            f"| `{script}` | {row['description']} | {row['expect']} | {row['observed']} | "
+            f"{row['passed']}/{row['runs']} | {snapshot} | {total} |"
+        )
+    lines.append("")
+    lines.append(f"_Generated by `python -m harness.matrix` on {time.strftime('%Y-%m-%d')}._")
+    return "\n".join(lines)
+
+
+def update_readme(path, markdown):
+    with open(path) as f:
+        content = f.read()
+    pattern = re.compile(re.escape(README_START) + ".*?" + re.escape(README_END), re.DOTALL)
+    if not pattern.search(content):
+        raise SpecError(f"{path} has no {README_START} ... {README_END} block")
+    content = pattern.sub(lambda _: f"{README_START}\n{markdown}\n{README_END}", content)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a declarative snapshot scenario matrix")
+    parser.add_argument("spec", nargs="?", default=DEFAULT_SPEC)
+    parser.add_argument("--workers", type=int, default=4, help="concurrent sandboxes (default: 4)")
+    parser.add_argument("--only", action="append", help="run only this scenario (repeatable)")
+    parser.add_argument("--repeat", type=int, default=None, help="override every scenario's repeat count")
+    parser.add_argument("--app", default="snapshot-matrix", help="Modal app name")
+    parser.add_argument("--readme", help="rewrite the matrix block of this markdown file with the results")
+    parser.add_argument("--list", action="store_true", help="print the scenarios and exit")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    images, scenarios = load_spec(args.spec)
+    if args.only:
+        unknown = set(args.only) - {s["name"] for s in scenarios}
+        if unknown:
+            parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+        scenarios = [s for s in scenarios if s["name"] in args.only]
+    if args.repeat is not None:
+        for scenario in scenarios:
+            scenario["repeat"] = args.repeat
+
+    if args.list:
+        for scenario in scenarios:
+            steps = ", ".join(step["step"] for step in scenario["steps"])
+            print(f"{scenario['name']:<26} expect={scenario['expect']:<7} x{scenario['repeat']}  {steps}")
+        return 0
+
+    import modal
+
+    start_run("matrix")
+    print("Looking up modal.Sandbox app")
+    app = modal.App.lookup(args.app, create_if_missing=True)
+    with modal.enable_output():
+        built = hydrate_images(app, images, sorted({s["image"] for s in scenarios}), args.workers)
+
+    results = run_matrix(app, scenarios, built, args.workers)
+    rows = aggregate(scenarios, results)
+    print_table(rows)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"matrix-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump({"spec": os.path.abspath(args.spec), "rows": rows, "results": results}, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.readme:
+        update_readme(args.readme, render_markdown(rows))
+        print(f"Updated {args.readme}")
+    return 0 if all(row["passed"] == row["runs"] for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Merkle tree of a directory for exact before/after comparison (stdlib only).
+
+Each file hashes its contents, each symlink its target and each directory
+the sorted ``(name, kind, hash)`` list of its children, so two trees with
+equal root hashes are identical. ``diff`` walks both trees from the root and
+only descends into directories whose hashes differ, so the cost of a diff is
+proportional to what changed rather than to the size of the tree. A
+directory that disappeared entirely is reported once, with the number of
+files and bytes it held.
+
+Like ``harness.manifest`` this module runs unchanged inside a sandbox::
+
+    python3 merkle.py build node_modules --output /tmp/pre.merkle.json
+    python3 merkle.py check /tmp/pre.merkle.json node_modules
+    python3 merkle.py diff /tmp/pre.merkle.json /tmp/post.merkle.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import stat
+import sys
+import time
+
+TREE_VERSION = 1
+CHUNK_SIZE = 1 << 20
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build(root):
+    """Hash the tree under ``root``.
+
+    Returns ``{"version", "root", "hash", "dirs"}`` where ``dirs`` maps each
+    directory path relative to ``root`` ("" for the root itself) to its
+    sorted children ``[name, kind, hash, size, files]``. For directories
+    ``size`` and ``files`` cover the whole subtree.
+    """
+    dirs = {}
+    inode_hashes = {}
+    # Scan iteratively (deep node_modules trees exceed the recursion limit),
+    # then hash directories in reverse scan order so children come first.
+    order = []
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        order.append(relative)
+        path = os.path.join(root, relative) if relative else root
+        children = []
+        try:
+            with os.scandir(path) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError as e:
+            entries = []
+            children.append([".", "error", hashlib.sha256(str(e).encode()).hexdigest(), 0, 0])
+        for entry in entries:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                # Hash, size and file count are filled in once the subtree is done
+                children.append([entry.name, "d", None, 0, 0])
+                stack.append(f"{relative}/{entry.name}" if relative else entry.name)
+                continue
+            if stat.S_ISREG(st.st_mode):
+                key = (st.st_dev, st.st_ino)
+                if key not in inode_hashes:
+                    try:
+                        inode_hashes[key] = _hash_file(entry.path)
+                    except OSError as e:
+                        inode_hashes[key] = "unreadable:" + (e.strerror or str(e))
+                kind, digest = "f", inode_hashes[key]
+            elif stat.S_ISLNK(st.st_mode):
+                kind = "l"
+                digest = hashlib.sha256(os.readlink(entry.path).encode("utf-8", "surrogateescape")).hexdigest()
+            else:
+                kind, digest = "o", hashlib.sha256(oct(stat.S_IFMT(st.st_mode)).encode()).hexdigest()
+            children.append([entry.name, kind, digest, st.st_size, 1])
+        dirs[relative] = children
+
+    subtrees = {}
+    for relative in reversed(order):
+        children = dirs[relative]
+        total_size = 0
+        total_files = 0
+        for node in children:
+            if node[1] == "d":
+                node[2], node[3], node[4] = subtrees.pop(f"{relative}/{node[0]}" if relative else node[0])
+            total_size += node[3]
+            total_files += node[4]
+        listing = "".join(f"{name}\0{kind}\0{digest}\n" for name, kind, digest, _, _ in children)
+        subtrees[relative] = (
+            hashlib.sha256(listing.encode("utf-8", "surrogateescape")).hexdigest(), total_size, total_files
+        )
+
+    root_hash, size, files = subtrees[""]
+    return {"version": TREE_VERSION, "root": root, "hash": root_hash, "size": size, "files": files, "dirs": dirs}
+
+
+def diff(before, after, limit=None):
+    """Compare two trees, descending only into directories whose hashes differ.
+
+    Returns ``{"identical", "missing", "added", "changed", "visited_dirs"}``;
+    each change is ``{"path", "kind", "size", "files"}``.
+    """
+    result = {"identical": before["hash"] == after["hash"], "missing": [], "added": [], "changed": [], "visited_dirs": 0}
+    if result["identical"]:
+        return result
+
+    def record(bucket, path, node):
+        if limit is None or len(result[bucket]) < limit:
+            result[bucket].append({"path": path, "kind": node[1], "size": node[3], "files": node[4]})
+
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        result["visited_dirs"] += 1
+        old = {node[0]: node for node in before["dirs"].get(relative, [])}
+        new = {node[0]: node for node in after["dirs"].get(relative, [])}
+        for name in sorted(old.keys() | new.keys()):
+            path = f"{relative}/{name}" if relative else name
+            old_node, new_node = old.get(name), new.get(name)
+            if new_node is None:
+                record("missing", path, old_node)
+            elif old_node is None:
+                record("added", path, new_node)
+            elif old_node[2] != new_node[2]:
+                if old_node[1] == "d" and new_node[1] == "d":
+                    stack.append(path)
+                else:
+                    record("changed", path, new_node)
+    return result
+
+
+def load(path):
+    with open(path, encoding="utf-8") as fh:
+        tree = json.load(fh)
+    if tree.get("version") != TREE_VERSION:
+        raise ValueError(f"Unsupported Merkle tree version: {tree.get('version')}")
+    return tree
+
+
+def dump(tree, path):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(tree, fh, separators=(",", ":"))
+
+
+def _diff_summary(result, limit):
+    return {
+        "identical": result["identical"],
+        "missing_count": len(result["missing"]),
+        "added_count": len(result["added"]),
+        "changed_count": len(result["changed"]),
+        "missing_files": sum(node["files"] for node in result["missing"]),
+        "visited_dirs": result["visited_dirs"],
+        "missing": result["missing"][:limit],
+        "added": result["added"][:limit],
+        "changed": result["changed"][:limit],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and compare Merkle trees of a directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="hash a directory tree")
+    build_parser.add_argument("root")
+    build_parser.add_argument("--output", required=True)
+    check_parser = sub.add_parser("check", help="hash a directory and diff it against a saved tree")
+    check_parser.add_argument("before")
+    check_parser.add_argument("root")
+    check_parser.add_argument("--limit", type=int, default=50)
+    diff_parser = sub.add_parser("diff", help="diff two saved trees")
+    diff_parser.add_argument("before")
+    diff_parser.add_argument("after")
+    diff_parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+    if args.command == "build":
+        tree = build(args.root)
+        dump(tree, args.output)
+        print(
+            json.dumps(
+                {
+                    "root_hash": tree["hash"],
+                    "files": tree["files"],
+                    "size": tree["size"],
+                    "dirs": len(tree["dirs"]),
+                    "seconds": round(time.monotonic() - start, 3),
+                    "output": args.output,
+                }
+            )
+        )
+        return 0
+
+    before = load(args.before)
+    after = build(args.root) if args.command == "check" else load(args.after)
+    summary = _diff_summary(diff(before, after), args.limit)
+    summary["seconds"] = round(time.monotonic() - start, 3)
+    print(json.dumps(summary))
+    return 0 if summary["identical"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Local DNS, TCP connect and throughput measurements for one network path (stdlib only).
+
+``serve`` starts a threaded HTTP server whose ``/bytes/N`` endpoint streams
+``N`` bytes from memory, plus a minimal DNS responder that answers every A
+query with ``--answer``. Neither touches the internet, so a benchmark built
+on it measures only the network path between client and server.
+
+``client`` points the container's ``/etc/resolv.conf`` at ``--nameserver``
+(unless it is empty) and then measures:
+
+* ``dns_ms``: ``getaddrinfo`` of a fresh ``*.netbench.test`` name per sample,
+  so no layer can answer from a cache.
+* ``connect_ms``: ``socket.create_connection`` to the HTTP port.
+* ``throughput_mbps``: megabytes per second of one ``/bytes/N`` download.
+
+It prints one JSON line with every sample. ``--local`` serves on loopback
+in-process first, which is the only path a ``--network none`` container has.
+Like ``harness.synthtree`` the module runs unchanged inside a container::
+
+    python3 netbench.py serve --port 8089 --answer 10.0.0.2
+    python3 netbench.py client --host 10.0.0.2 --nameserver 10.0.0.2 --samples 50
+"""
+
+import argparse
+import http.client
+import http.server
+import json
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import uuid
+
+HTTP_PORT = 8089
+DNS_PORT = 53
+DNS_SUFFIX = "netbench.test"
+CHUNK_SIZE = 1 << 20
+_CHUNK = bytes(CHUNK_SIZE)
+
+
+class _BytesHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if not self.path.startswith("/bytes/"):
+            self.send_error(404)
+            return
+        try:
+            remaining = int(self.path[len("/bytes/") :])
+        except ValueError:
+            self.send_error(400)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(remaining))
+        self.end_headers()
+        while remaining > 0:
+            n = min(remaining, CHUNK_SIZE)
+            self.wfile.write(_CHUNK[:n])
+            remaining -= n
+
+    def log_message(self, format, *args):
+        pass
+
+
+def dns_answer(query, address):
+    """Return the response to one DNS ``query``: an A record for ``address``, or no answers."""
+    if len(query) < 12:
+        return None
+    (txid,) = struct.unpack("!H", query[:2])
+    end = 12
+    while end < len(query) and query[end] != 0:
+        end += query[end] + 1
+    if end + 5 > len(query):
+        return None
+    question = query[12 : end + 5]
+    qtype, _ = struct.unpack("!HH", question[-4:])
+    answers = b""
+    if qtype == 1:
+        # Name pointer to the question at offset 12, type A, class IN, TTL 0
+        answers = struct.pack("!HHHIH", 0xC00C, 1, 1, 0, 4) + socket.inet_aton(address)
+    header = struct.pack("!HHHHHH", txid, 0x8180, 1, 1 if answers else 0, 0, 0)
+    return header + question + answers
+
+
+class _DNSHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        query, sock = self.request
+        response = dns_answer(query, self.server.answer)
+        if response:
+            sock.sendto(response, self.client_address)
+
+
+def serve(bind="0.0.0.0", port=HTTP_PORT, dns_port=DNS_PORT, answer="127.0.0.1"):
+    """Start the HTTP server and DNS responder on daemon threads; return both servers."""
+    http.server.ThreadingHTTPServer.allow_reuse_address = True
+    http_server = http.server.ThreadingHTTPServer((bind, port), _BytesHandler)
+    dns_server = socketserver.ThreadingUDPServer((bind, dns_port), _DNSHandler)
+    dns_server.answer = answer
+    for server in (http_server, dns_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return http_server, dns_server
+
+
+def _timed(fn, samples, errors, key):
+    values = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        try:
+            fn()
+        except OSError as e:
+            errors.setdefault(key, f"{type(e).__name__}: {e}")
+            errors[f"{key}_count"] = errors.get(f"{key}_count", 0) + 1
+            continue
+        values.append((time.perf_counter() - start) * 1000)
+    return values
+
+
+def measure(host, port=HTTP_PORT, samples=50, transfers=5, payload_bytes=64 << 20, timeout=10.0):
+    """Return ``{dns_ms, connect_ms, throughput_mbps, errors}`` for ``host``."""
+    errors = {}
+    run_id = uuid.uuid4().hex[:8]
+    counter = iter(range(samples))
+
+    def resolve():
+        name = f"n{next(counter)}-{run_id}.{DNS_SUFFIX}"
+        socket.getaddrinfo(name, port, socket.AF_INET, socket.SOCK_STREAM)
+
+    def connect():
+        socket.create_connection((host, port), timeout=timeout).close()
+
+    buffer = bytearray(CHUNK_SIZE)
+    throughput = []
+
+    def download():
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        try:
+            start = time.perf_counter()
+            conn.request("GET", f"/bytes/{payload_bytes}")
+            response = conn.getresponse()
+            received = 0
+            while True:
+                n = response.readinto(buffer)
+                if not n:
+                    break
+                received += n
+            elapsed = time.perf_counter() - start
+        finally:
+            conn.close()
+        if received != payload_bytes:
+            raise OSError(f"short read: {received} of {payload_bytes} bytes")
+        throughput.append(received / elapsed / 1e6)
+
+    dns_ms = _timed(resolve, samples, errors, "dns")
+    connect_ms = _timed(connect, samples, errors, "connect")
+    _timed(download, transfers, errors, "throughput")
+    return {"dns_ms": dns_ms, "connect_ms": connect_ms, "throughput_mbps": throughput, "errors": errors}
+
+
+def set_nameserver(address, path="/etc/resolv.conf"):
+    with open(path, "w") as f:
+        f.write(f"nameserver {address}\noptions timeout:2 attempts:1\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local network path benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve", help="run the HTTP server and DNS responder until killed")
+    serve_parser.add_argument("--bind", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=HTTP_PORT)
+    serve_parser.add_argument("--dns-port", type=int, default=DNS_PORT)
+    serve_parser.add_argument("--answer", required=True, help="address returned for every A query")
+    client_parser = sub.add_parser("client", help="measure DNS, connect and throughput; print one JSON line")
+    client_parser.add_argument("--host", default="127.0.0.1", help="address of the serving sandbox")
+    client_parser.add_argument("--port", type=int, default=HTTP_PORT)
+    client_parser.add_argument("--nameserver", default="", help="rewrite /etc/resolv.conf to use this resolver")
+    client_parser.add_argument("--local", action="store_true", help="serve on loopback in-process first")
+    client_parser.add_argument("--samples", type=int, default=50, help="DNS and connect samples (default: 50)")
+    client_parser.add_argument("--transfers", type=int, default=5, help="downloads (default: 5)")
+    client_parser.add_argument("--payload-mb", type=int, default=64, help="size of each download (default: 64)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.bind, args.port, args.dns_port, args.answer)
+        print(json.dumps({"serving": True, "port": args.port, "dns_port": args.dns_port}), flush=True)
+        threading.Event().wait()
+        return 0
+
+    if args.local:
+        serve("127.0.0.1", args.port, DNS_PORT, "127.0.0.1")
+        args.host = args.nameserver = "127.0.0.1"
+    if args.nameserver:
+        set_nameserver(args.nameserver)
+    result = measure(args.host, args.port, args.samples, args.transfers, args.payload_mb << 20)
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
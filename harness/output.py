@@ -0,0 +1,205 @@
+"""Drain a sandbox process's stdout and stderr concurrently into compressed logs.
+
+Reading ``p.stdout`` to completion before touching ``p.stderr`` stalls a
+process that fills its stderr pipe first, and printing every line of a
+``docker build`` or ``pnpm install`` makes the terminal pace the harness.
+``OutputPump`` reads both streams at once, writes every line to a gzip log
+per step in batches, and keeps only a bounded tail in memory for display.
+
+Logs go to ``~/.cache/modal-snapshot-testing/logs/<run id>/<step>.log.gz``
+(``zcat`` to read them); stderr lines are prefixed with ``! ``. ``watch``
+substrings are matched as lines stream past, so callers can check for a
+marker without keeping the whole output. With ``live=True`` lines are also
+echoed through a bounded queue that drops lines rather than block the readers
+when the console falls behind.
+"""
+
+import asyncio
+import collections
+import gzip
+import os
+import queue
+import re
+import threading
+import time
+
+from harness.timing import current_run
+
+LOGS_DIR = os.path.expanduser("~/.cache/modal-snapshot-testing/logs")
+BATCH_LINES = 256
+STDERR_PREFIX = "! "
+
+
+class PumpResult:
+    """What a drained process left behind; the full output is in ``log_path``."""
+
+    def __init__(self, name, returncode, tail, stderr_tail, lines, stderr_lines, log_path, duration_s, dropped, matched):
+        self.name = name
+        self.returncode = returncode
+        self.tail = tail
+        self.stderr_tail = stderr_tail
+        self.lines = lines
+        self.stderr_lines = stderr_lines
+        self.log_path = log_path
+        self.duration_s = duration_s
+        self.dropped = dropped
+        self.matched = matched
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def print_tail(self, prefix="   "):
+        for line in self.tail:
+            print(f"{prefix}{line}")
+        print(f"{prefix}({self.lines} stdout / {self.stderr_lines} stderr lines in {self.duration_s:.2f}s, log: {self.log_path})")
+
+
+def default_log_dir():
+    run = current_run()
+    return os.path.join(LOGS_DIR, run.run_id if run else time.strftime("%Y%m%dT%H%M%S"))
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "step"
+
+
+class OutputPump:
+    """Drain one process; ``drain(p)`` returns a :class:`PumpResult`."""
+
+    def __init__(self, name, log_dir=None, tail=20, live=False, prefix="   ", live_queue=1000, watch=()):
+        self.name = name
+        self.log_dir = log_dir or default_log_dir()
+        self.tail_size = tail
+        self.live = live
+        self.prefix = prefix
+        self._tail = collections.deque(maxlen=tail)
+        self._stderr_tail = collections.deque(maxlen=tail)
+        self._counts = {"stdout": 0, "stderr": 0}
+        self._batch = []
+        self._lock = threading.Lock()
+        self._live_queue = queue.Queue(maxsize=live_queue) if live else None
+        self._dropped = 0
+        self._watch = tuple(watch)
+        self._matched = set()
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.log_path = self._unique_path(os.path.join(self.log_dir, _safe_name(name)))
+        self._log = None
+
+    @staticmethod
+    def _unique_path(base):
+        # Claim the name atomically; concurrent pumps may share a step name
+        index = 1
+        while True:
+            path = f"{base}.log.gz" if index == 1 else f"{base}.{index}.log.gz"
+            try:
+                with open(path, "xb"):
+                    return path
+            except FileExistsError:
+                index += 1
+
+    def _add(self, stream, line):
+        line = line.rstrip("\n")
+        with self._lock:
+            self._counts[stream] += 1
+            for marker in self._watch:
+                if marker in line:
+                    self._matched.add(marker)
+            if stream == "stderr":
+                self._stderr_tail.append(line)
+                self._batch.append(STDERR_PREFIX + line)
+            else:
+                self._tail.append(line)
+                self._batch.append(line)
+            if len(self._batch) >= BATCH_LINES:
+                self._flush_locked()
+        if self._live_queue is not None:
+            try:
+                self._live_queue.put_nowait(line if stream == "stdout" else STDERR_PREFIX + line)
+            except queue.Full:
+                self._dropped += 1
+
+    def _flush_locked(self):
+        if self._batch:
+            self._log.write(("\n".join(self._batch) + "\n").encode("utf-8", "replace"))
+            self._batch = []
+
+    def _printer(self, done):
+        while not (done.is_set() and self._live_queue.empty()):
+            try:
+                line = self._live_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            print(f"{self.prefix}{line}")
+
+    def _read(self, stream, source):
+        for line in source:
+            self._add(stream, line)
+
+    def _result(self, returncode, start):
+        return PumpResult(
+            self.name,
+            returncode,
+            list(self._tail),
+            list(self._stderr_tail),
+            self._counts["stdout"],
+            self._counts["stderr"],
+            self.log_path,
+            time.monotonic() - start,
+            self._dropped,
+            self._matched,
+        )
+
+    def drain(self, p):
+        """Read both streams of ``p`` on their own threads until EOF, then wait for it."""
+        start = time.monotonic()
+        done = threading.Event()
+        printer = None
+        if self._live_queue is not None:
+            printer = threading.Thread(target=self._printer, args=(done,), daemon=True)
+            printer.start()
+        with gzip.open(self.log_path, "wb", compresslevel=6) as self._log:
+            readers = [
+                threading.Thread(target=self._read, args=("stdout", p.stdout), daemon=True),
+                threading.Thread(target=self._read, args=("stderr", p.stderr), daemon=True),
+            ]
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+            with self._lock:
+                self._flush_locked()
+        p.wait()
+        done.set()
+        if printer is not None:
+            printer.join()
+        return self._result(p.returncode, start)
+
+    async def drain_async(self, p):
+        """Async variant of :meth:`drain` for processes from ``sb.exec.aio``."""
+        start = time.monotonic()
+
+        async def read(stream, source):
+            async for line in source:
+                self._add(stream, line)
+
+        with gzip.open(self.log_path, "wb", compresslevel=6) as self._log:
+            await asyncio.gather(read("stdout", p.stdout), read("stderr", p.stderr))
+            with self._lock:
+                self._flush_locked()
+        await p.wait.aio()
+        if self._live_queue is not None:
+            while not self._live_queue.empty():
+                print(f"{self.prefix}{self._live_queue.get_nowait()}")
+        return self._result(p.returncode, start)
+
+
+def run_logged(sb, name, *args, tail=20, live=False, watch=(), log_dir=None, **exec_kwargs):
+    """``sb.exec(*args)`` and drain it with an :class:`OutputPump`; return the result."""
+    p = sb.exec(*args, **exec_kwargs)
+    return OutputPump(name, log_dir=log_dir, tail=tail, live=live, watch=watch).drain(p)
+
+
+async def run_logged_async(sb, name, *args, tail=20, watch=(), log_dir=None, **exec_kwargs):
+    p = await sb.exec.aio(*args, **exec_kwargs)
+    return await OutputPump(name, log_dir=log_dir, tail=tail, watch=watch).drain_async(p)
@@ -0,0 +1,150 @@
+"""Keep the pnpm content store on a persistent mount and time cold vs warm installs.
+
+A store backend says where the store lives and what a sandbox needs to
+see it. ``VolumeStore`` mounts a Modal Volume at :data:`PNPM_STORE_MOUNT`;
+``LocalDirStore`` is a plain local directory, the stand-in tests use.
+Packages are copied rather than hard-linked into ``node_modules`` (a link
+cannot cross into the mount), so a snapshot holds a self-contained
+``node_modules`` and none of the store.
+
+The measuring helpers take ``run(command) -> (returncode, stdout)`` for a
+shell command, so the same code runs through ``sb.exec`` or locally.
+"""
+
+import json
+import os
+import shlex
+import subprocess
+import time
+
+PNPM_STORE_MOUNT = "/pnpm-store"
+HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".cache", "modal-snapshot-testing", "pnpm-store.json")
+WORKDIR = "/workspace/slidev"
+
+
+class VolumeStore:
+    """The store on a Modal Volume, mounted at :data:`PNPM_STORE_MOUNT`."""
+
+    def __init__(self, name):
+        self.name = name
+        self.path = PNPM_STORE_MOUNT
+
+    def sandbox_options(self):
+        import modal
+
+        return {"volumes": {self.path: modal.Volume.from_name(self.name, create_if_missing=True)}}
+
+
+class LocalDirStore:
+    """The store in a local directory, which persists across runs like the volume."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.name = f"local:{self.path}"
+        os.makedirs(self.path, exist_ok=True)
+
+    def sandbox_options(self):
+        return {}
+
+
+def sandbox_runner(sb):
+    def run(command):
+        p = sb.exec("sh", "-c", command)
+        stdout = p.stdout.read()
+        p.wait()
+        return p.returncode, stdout
+
+    return run
+
+
+def local_runner(command):
+    result = subprocess.run(["sh", "-c", command], capture_output=True, text=True)
+    return result.returncode, result.stdout
+
+
+def install_command(store_dir=None, offline=False, workdir=WORKDIR):
+    command = f"cd {shlex.quote(workdir)} && pnpm install"
+    if offline:
+        command += " --offline"
+    if store_dir:
+        command += f" --store-dir {shlex.quote(store_dir)} --package-import-method copy"
+    return command
+
+
+def store_stats(run, store_dir):
+    """Return ``(bytes, files)`` currently in the store."""
+    quoted = shlex.quote(store_dir)
+    _, stdout = run(
+        f"du -sb {quoted} 2>/dev/null | cut -f1; find {quoted} -type f 2>/dev/null | wc -l"
+    )
+    fields = stdout.split()
+    if len(fields) != 2:
+        return 0, 0
+    return int(fields[0]), int(fields[1])
+
+
+def reset_store(run, store_dir):
+    """Empty the store, for a cold measurement."""
+    returncode, _ = run(f"find {shlex.quote(store_dir)} -mindepth 1 -delete")
+    if returncode != 0:
+        raise RuntimeError(f"Could not empty the pnpm store at {store_dir}")
+
+
+def prepare(run, store, reset=False):
+    """Optionally empty the store; return ``(state, bytes, files)`` before the install."""
+    if reset:
+        reset_store(run, store.path)
+    store_bytes, store_files = store_stats(run, store.path)
+    return ("warm" if store_files else "cold"), store_bytes, store_files
+
+
+def install_entry(run, store, state, install_s, store_bytes_before, workdir=WORKDIR):
+    """Flush the store and return the history entry for one install."""
+    quoted = shlex.quote(workdir)
+    _, stdout = run(
+        f"sync {shlex.quote(store.path)} 2>/dev/null || sync; "
+        f"find {quoted} -name node_modules -type d -prune -exec du -sb {{}} + | awk '{{s += $1}} END {{print s + 0}}'"
+    )
+    store_bytes_after, store_files_after = store_stats(run, store.path)
+    return {
+        "volume": store.name,
+        "state": state,
+        "install_s": install_s,
+        "store_bytes_before": store_bytes_before,
+        "store_bytes_after": store_bytes_after,
+        "store_files_after": store_files_after,
+        "node_modules_bytes": int(stdout.strip() or 0),
+        "recorded_at": time.time(),
+    }
+
+
+def record_store_run(entry, path=HISTORY_PATH):
+    """Append one install measurement to the local history and return the history."""
+    try:
+        with open(path) as f:
+            history = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        history = []
+    history.append(entry)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(history[-100:], f, indent=2)
+    return history
+
+
+def print_store_comparison(history, volume):
+    runs = [entry for entry in history if entry["volume"] == volume]
+    latest = {entry["state"]: entry for entry in runs}
+    print(f"pnpm store ({volume}, {len(runs)} recorded installs):")
+    for state in ("cold", "warm"):
+        entry = latest.get(state)
+        if entry is None:
+            print(f"  {state}: no run recorded yet")
+            continue
+        print(
+            f"  {state}: install {entry['install_s']:.2f}s, store {entry['store_bytes_after'] / 1e6:.0f} MB, "
+            f"node_modules {entry['node_modules_bytes'] / 1e6:.0f} MB"
+        )
+    if "cold" in latest and "warm" in latest:
+        saved = latest["cold"]["install_s"] - latest["warm"]["install_s"]
+        print(f"  warm store saves {saved:.2f}s per install")
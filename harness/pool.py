@@ -0,0 +1,230 @@
+"""Keep pre-created, dockerd-ready sandboxes warm for repeated scenario runs.
+
+Creating a docker-in-gvisor sandbox and waiting for dockerd costs tens of
+seconds, and repeated iteration or bisection runs pay it every time. A
+``SandboxPool`` keeps up to ``size`` ready sandboxes per ``SandboxSpec``,
+hands them out with ``acquire`` and creates replacements in the background.
+Handed-out sandboxes belong to the caller, who terminates them as usual.
+
+``attach`` re-attaches to a named long-lived sandbox across CLI invocations
+by remembering its sandbox id in a small local state file.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import time
+
+from harness.dockerd import wait_for_dockerd
+from harness.timing import span
+
+DEFAULT_STATE_PATH = os.environ.get(
+    "SANDBOX_POOL_STATE", os.path.join(os.path.expanduser("~"), ".cache", "modal-snapshot-testing", "pool.json")
+)
+
+
+class SandboxSpec:
+    """Everything needed to create an interchangeable sandbox.
+
+    ``label`` names the image (Modal images have no stable id before they
+    are built), so two specs with the same label, command and options share
+    a pool.
+    """
+
+    def __init__(self, label, image, command=("/start-dockerd.sh",), dockerd=True, timeout=60 * 60, **options):
+        self.label = label
+        self.image = image
+        self.command = tuple(command)
+        self.dockerd = dockerd
+        self.timeout = timeout
+        self.options = options
+
+    @property
+    def key(self):
+        # Volumes and secrets count by type: their reprs can hold addresses that change every run
+        payload = json.dumps(
+            [self.label, self.command, self.dockerd, self.timeout, self.options],
+            sort_keys=True,
+            default=lambda value: type(value).__name__,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def create_ready_sandbox(app, spec):
+    """Create a sandbox for ``spec`` and wait for dockerd; return (sandbox, seconds spent)."""
+    import modal
+
+    start = time.perf_counter()
+    with span("sandbox_create", label=spec.label):
+        sb = modal.Sandbox.create(*spec.command, app=app, image=spec.image, timeout=spec.timeout, **spec.options)
+    if spec.dockerd:
+        try:
+            wait_for_dockerd(sb)
+        except Exception:
+            sb.terminate()
+            raise
+    return sb, time.perf_counter() - start
+
+
+def _is_running(sb):
+    try:
+        return sb.poll() is None
+    except Exception:
+        return False
+
+
+class SandboxPool:
+    """Ready sandboxes per spec; ``workers`` bounds concurrent background creation (default ``size``)."""
+
+    def __init__(self, app, size=2, state_path=DEFAULT_STATE_PATH, workers=None):
+        self.app = app
+        self.size = size
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._ready = collections.defaultdict(collections.deque)
+        self._pending = collections.defaultdict(int)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers or max(1, size), thread_name_prefix="pool"
+        )
+        self._closed = False
+        self.stats = {"hits": 0, "misses": 0, "time_saved_s": 0.0, "warm_failures": 0, "exited": 0}
+
+    def _warm_one(self, spec):
+        try:
+            sb, warmup = create_ready_sandbox(self.app, spec)
+        except Exception as e:
+            print(f"[pool] Warming sandbox for {spec.label} failed: {e}")
+            with self._lock:
+                self._pending[spec.key] -= 1
+                self.stats["warm_failures"] += 1
+            return
+        with self._lock:
+            self._pending[spec.key] -= 1
+            if self._closed:
+                sb.terminate()
+                return
+            self._ready[spec.key].append((sb, warmup))
+
+    def fill(self, spec):
+        """Start background creation until ``size`` sandboxes are ready or pending for ``spec``."""
+        with self._lock:
+            if self._closed:
+                return
+            missing = self.size - len(self._ready[spec.key]) - self._pending[spec.key]
+            self._pending[spec.key] += max(0, missing)
+        for _ in range(missing):
+            self._executor.submit(self._warm_one, spec)
+
+    def acquire(self, spec, replenish=True):
+        """Return a ready sandbox for ``spec``, creating one inline on a miss.
+
+        With ``replenish`` the pool starts a background replacement so the
+        next ``acquire`` is a hit as well. Pooled sandboxes that exited while
+        idle (timeout, crash) are discarded rather than handed out.
+        """
+        while True:
+            with self._lock:
+                ready = self._ready[spec.key]
+                entry = ready.popleft() if ready else None
+            if entry is None or _is_running(entry[0]):
+                break
+            print(f"[pool] Discarding exited sandbox for {spec.label}")
+            with self._lock:
+                self.stats["exited"] += 1
+            try:
+                entry[0].terminate()
+            except Exception:
+                pass
+        if entry is not None:
+            sb, warmup = entry
+            with self._lock:
+                self.stats["hits"] += 1
+                self.stats["time_saved_s"] += warmup
+        else:
+            with self._lock:
+                self.stats["misses"] += 1
+            sb, _ = create_ready_sandbox(self.app, spec)
+        if replenish:
+            self.fill(spec)
+        return sb
+
+    def attach(self, name, spec):
+        """Return the long-lived sandbox called ``name``, creating it if it is gone.
+
+        The sandbox id is stored in ``state_path`` so later CLI invocations
+        reuse the same sandbox instead of starting a new one.
+        """
+        import modal
+
+        state = self._load_state()
+        entry = state.get(name)
+        if entry and entry.get("key") == spec.key:
+            try:
+                sb = modal.Sandbox.from_id(entry["sandbox_id"])
+                if sb.poll() is None:
+                    with self._lock:
+                        self.stats["hits"] += 1
+                        self.stats["time_saved_s"] += entry.get("warmup_s", 0.0)
+                    return sb
+            except Exception as e:
+                print(f"[pool] Could not re-attach to {name}: {e}")
+        with self._lock:
+            self.stats["misses"] += 1
+        sb, warmup = create_ready_sandbox(self.app, spec)
+        state[name] = {"sandbox_id": sb.object_id, "key": spec.key, "warmup_s": warmup, "created_at": time.time()}
+        self._save_state(state)
+        return sb
+
+    def detach(self, name, terminate=True):
+        """Forget the named sandbox, terminating it unless told otherwise."""
+        state = self._load_state()
+        entry = state.pop(name, None)
+        self._save_state(state)
+        if entry and terminate:
+            import modal
+
+            try:
+                modal.Sandbox.from_id(entry["sandbox_id"]).terminate()
+            except Exception as e:
+                print(f"[pool] Could not terminate {name}: {e}")
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(state, fh, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def close(self):
+        """Terminate idle sandboxes; sandboxes still warming are terminated as they finish."""
+        with self._lock:
+            self._closed = True
+            idle = [sb for ready in self._ready.values() for sb, _ in ready]
+            self._ready.clear()
+        for sb in idle:
+            try:
+                sb.terminate()
+            except Exception as e:
+                print(f"[pool] Error terminating idle sandbox: {e}")
+        self._executor.shutdown(wait=True)
+
+    def summary(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / total * 100 if total else 0.0
+        line = (
+            f"Pool: {self.stats['hits']} hits, {self.stats['misses']} misses ({rate:.0f}% hit rate), "
+            f"{self.stats['time_saved_s']:.1f}s of startup saved"
+        )
+        if self.stats["exited"]:
+            line += f", {self.stats['exited']} exited while idle"
+        return line
@@ -0,0 +1,127 @@
+"""Run ``redis-benchmark`` against a compose stack's redis and tabulate the results.
+
+The suite runs GET and SET with each payload size, once without and once
+with pipelining. It runs from two clients:
+
+* ``host``: a host-network container hitting the published port, the path a
+  process on the sandbox itself takes (through the port proxy and bridge).
+* ``container``: a sibling container on the compose network, addressing the
+  service by name.
+
+Each pass runs with ``appendonly`` switched on and off via ``CONFIG SET``.
+Commands go through a ``run(name, argv) -> (ok, stdout, stderr)`` callable,
+so the same suite drives a sandbox and the local docker baseline.
+"""
+
+import csv
+import io
+
+BENCH_IMAGE = "redis:7-alpine"
+APPENDONLY = ("yes", "no")
+CLIENTS = ("host", "container")
+COLUMNS = ("rps", "avg_latency_ms", "p50_latency_ms", "p95_latency_ms", "p99_latency_ms", "max_latency_ms")
+
+
+def parse_csv(stdout):
+    """Return ``[{test, rps, ..._latency_ms}]`` from ``redis-benchmark --csv`` output."""
+    lines = [line for line in stdout.splitlines() if line.startswith('"')]
+    rows = []
+    for record in csv.DictReader(io.StringIO("\n".join(lines))):
+        row = {"test": record["test"]}
+        for column in COLUMNS:
+            if record.get(column) not in (None, ""):
+                row[column] = float(record[column])
+        rows.append(row)
+    return rows
+
+
+def benchmark_argv(client, network, service, port, payload, pipeline, requests, clients, image=BENCH_IMAGE):
+    """Return the ``docker run`` argv of one ``redis-benchmark`` invocation."""
+    if client == "host":
+        where = ["--network", "host"]
+        target = ["-h", "127.0.0.1", "-p", str(port)]
+    else:
+        where = ["--network", network]
+        target = ["-h", service, "-p", "6379"]
+    return [
+        "docker", "run", "--rm", *where, image,
+        "redis-benchmark", *target,
+        "-t", "set,get", "-n", str(requests), "-c", str(clients),
+        "-d", str(payload), "-P", str(pipeline), "--csv",
+    ]
+
+
+def _last_line(text):
+    lines = text.strip().splitlines()
+    return lines[-1] if lines else "no output"
+
+
+def run_suite(run, redis_cli, network, service="redis", port=6379, payloads=(64, 1024, 16384), pipeline=16,
+              requests=100000, clients=50, image=BENCH_IMAGE, label=""):
+    """Run every combination and return one row per test.
+
+    ``redis_cli(*args)`` runs ``redis-cli`` inside the service container and
+    returns ``(ok, stdout, stderr)``. A case whose ``CONFIG SET`` or
+    ``FLUSHALL`` fails is not benchmarked; it gets an error row instead.
+    """
+    rows = []
+    for appendonly in APPENDONLY:
+        ok, out, err = redis_cli("CONFIG", "SET", "appendonly", appendonly)
+        # redis-cli may exit 0 on an error reply, so require the OK as well
+        setup_error = None if ok and out.strip() == "OK" else f"CONFIG SET appendonly: {_last_line(err or out)}"
+        for client in CLIENTS:
+            for payload in payloads:
+                for depth in (1, pipeline):
+                    name = f"redis-bench-{label}-aof-{appendonly}-{client}-{payload}b-p{depth}"
+                    key = {"target": label, "appendonly": appendonly, "client": client, "payload": payload,
+                           "pipeline": depth}
+                    error = setup_error
+                    if error is None:
+                        ok, out, err = redis_cli("FLUSHALL")
+                        if not ok or out.strip() != "OK":
+                            error = f"FLUSHALL: {_last_line(err or out)}"
+                    results = []
+                    if error is None:
+                        argv = benchmark_argv(client, network, service, port, payload, depth, requests, clients, image)
+                        ok, out, err = run(name, argv)
+                        results = parse_csv(out) if ok else []
+                        if not results:
+                            error = _last_line(err)
+                    if error is not None:
+                        rows.append({**key, "test": "-", "error": [error]})
+                        print(f"   {name}: FAILED {error[-200:]}")
+                        continue
+                    for result in results:
+                        rows.append({**key, **result})
+                        print(
+                            f"   {name} {result['test']}: {result['rps']:,.0f} ops/s, "
+                            f"p50 {result.get('p50_latency_ms', 0):.3f}ms, p99 {result.get('p99_latency_ms', 0):.3f}ms"
+                        )
+    return rows
+
+
+def _key(row):
+    return (row["appendonly"], row["client"], row["payload"], row["pipeline"], row["test"])
+
+
+def print_report(rows, baseline="local"):
+    """Print each target's rows, with ops/sec relative to ``baseline`` where it ran the same test."""
+    reference = {_key(row): row for row in rows if row["target"] == baseline and "rps" in row}
+    print(
+        f"{'target':<8} {'aof':<4} {'client':<10} {'test':<5} {'payload':>8} {'pipe':>5} "
+        f"{'ops/s':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'vs ' + baseline:>9}"
+    )
+    for row in rows:
+        head = (
+            f"{row['target']:<8} {row['appendonly']:<4} {row['client']:<10} {row['test']:<5} "
+            f"{row['payload']:>8} {row['pipeline']:>5}"
+        )
+        if "rps" not in row:
+            print(f"{head} {'FAILED':>12}  {' '.join(row.get('error', []))}")
+            continue
+        ref = reference.get(_key(row))
+        ratio = f"{row['rps'] / ref['rps']:.2f}x" if ref and ref["rps"] and row["target"] != baseline else "-"
+        print(
+            f"{head} {row['rps']:>12,.0f} {row.get('p50_latency_ms', 0):>8.3f} "
+            f"{row.get('p95_latency_ms', 0):>8.3f} {row.get('p99_latency_ms', 0):>8.3f} {ratio:>9}"
+        )
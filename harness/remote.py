@@ -0,0 +1,37 @@
+"""Ship harness modules and files in and out of a sandbox."""
+
+COPY_CHUNK_SIZE = 1 << 20
+
+
+def module_script(module, *argv):
+    """Return ``module``'s source as a script that runs its CLI with ``argv``.
+
+    The result can be piped to ``python3 -`` or handed to the in-sandbox
+    agent; ``sys.argv`` is set before the module's ``__main__`` block runs.
+    """
+    with open(module.__file__, encoding="utf-8") as fh:
+        source = fh.read()
+    name = module.__name__.rsplit(".", 1)[-1]
+    return f"import sys\nsys.argv = {[name, *argv]!r}\n" + source
+
+
+def copy_from_sandbox(sb, remote_path, local_path, chunk_size=COPY_CHUNK_SIZE):
+    """Stream a file out of the sandbox in large chunks; return its size."""
+    size = 0
+    with sb.open(remote_path, "rb") as src, open(local_path, "wb") as dst:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                return size
+            dst.write(chunk)
+            size += len(chunk)
+
+
+def copy_to_sandbox(local_path, sb, remote_path, chunk_size=COPY_CHUNK_SIZE):
+    """Stream a local file into the sandbox in large chunks."""
+    with open(local_path, "rb") as src, sb.open(remote_path, "wb") as dst:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                return
+            dst.write(chunk)
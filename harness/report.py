@@ -0,0 +1,95 @@
+"""Summarize recorded runs from the timing JSONL files.
+
+Each row is one run: its script, wall clock and the per-phase totals that
+the run printed at exit. Records are grouped by their ``run_id``, since
+several runs may append to one file through ``MODAL_TIMING_PATH``. Runs can
+be narrowed by script name and the newest ``--last`` are shown, oldest
+first::
+
+    python -m harness.report [--script NAME] [--last N] [--json] [PATH ...]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+from harness.timing import PHASES, TIMINGS_DIR, phase_totals
+
+
+def load_runs(path):
+    """Return ``[{run_id, script, started_at, wall_s, phases, errors}]`` for the runs in one JSONL file."""
+    runs = {}
+    spans = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            run_id = record.get("run_id")
+            if run_id not in runs:
+                runs[run_id] = {
+                    "path": path, "run_id": run_id, "script": None, "started_at": None, "wall_s": None, "errors": 0
+                }
+                spans[run_id] = []
+            run = runs[run_id]
+            event = record.get("event")
+            if event == "run_start":
+                run.update(script=record["script"], started_at=record["started_at"])
+            elif event == "run_end":
+                run["wall_s"] = record["duration_s"]
+            elif "span_id" in record:
+                # Span ids restart at 1 in every run, so parents only resolve within one
+                spans[run_id].append((record["span_id"], record.get("parent_id"), record["name"], record["duration_s"]))
+                run["errors"] += record.get("status") == "error"
+    for run_id, run in runs.items():
+        run["phases"] = phase_totals(spans[run_id])
+    return list(runs.values())
+
+
+def find_runs(paths=None, script=None, last=10):
+    paths = paths or glob.glob(os.path.join(TIMINGS_DIR, "*.jsonl"))
+    runs = [run for path in paths for run in load_runs(path)]
+    if script:
+        runs = [run for run in runs if run["script"] == script]
+    runs.sort(key=lambda run: run["started_at"] or 0)
+    return runs[-last:] if last else runs
+
+
+def print_runs(runs):
+    phases = [name for name in PHASES if any(name in run["phases"] for run in runs)]
+    header = f"{'script':<44} {'run id':<23} {'wall_s':>8}"
+    print(header + "".join(f" {name[:12]:>12}" for name in phases) + f" {'errors':>6}")
+    for run in runs:
+        wall = f"{run['wall_s']:.2f}" if run["wall_s"] is not None else "running"
+        row = f"{run['script'] or '?':<44} {run['run_id'] or '?':<23} {wall:>8}"
+        for name in phases:
+            _, total = run["phases"].get(name, (0, 0.0))
+            row += f" {total:>12.2f}" if name in run["phases"] else f" {'-':>12}"
+        print(row + f" {run['errors']:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize recorded phase timings")
+    parser.add_argument("paths", nargs="*", help="timing JSONL files (default: all under the timings dir)")
+    parser.add_argument("--script", help="only runs of this script")
+    parser.add_argument("--last", type=int, default=10, help="newest N runs (0 for all, default: 10)")
+    parser.add_argument("--json", action="store_true", help="print the runs as JSON")
+    args = parser.parse_args(argv)
+
+    runs = find_runs(args.paths, args.script, args.last)
+    if not runs:
+        print(f"No recorded runs under {TIMINGS_DIR}")
+        return 1
+    if args.json:
+        json.dump(runs, sys.stdout, indent=2)
+        print()
+    else:
+        print_runs(runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Inventory Unix sockets in a sandbox without walking the whole filesystem.
+
+``find / -name '*.sock' -type s`` crawls all of the gvisor filesystem,
+including /proc and /var/lib/docker, every time it runs. The inventory reads
+bound sockets from ``/proc/net/unix``, maps their inodes to owning pids via
+``/proc/<pid>/fd``, and adds socket files found in a short list of runtime
+directories (which catches stale sockets with no listener). Everything is
+collected in one sh exec; the sandbox images do not all ship Python.
+
+Stale socket files outside ``RUNTIME_DIRS`` are not found; pass extra
+``dirs`` if a scenario leaves sockets elsewhere.
+"""
+
+import fnmatch
+import shlex
+import time
+
+RUNTIME_DIRS = ("/run", "/var/run", "/tmp", "/dev/shm")
+
+
+def inventory_script(dirs=RUNTIME_DIRS, max_depth=4):
+    quoted_dirs = " ".join(shlex.quote(d) for d in dirs)
+    return f"""
+now_ms() {{ echo $(( $(date +%s%N) / 1000000 )); }}
+start=$(now_ms)
+if [ -r /proc/net/unix ]; then
+    awk 'NR > 1 && $8 != "" {{ printf "S\\t%s\\t%s\\n", $7, $8 }}' /proc/net/unix
+fi
+find /proc/[0-9]*/fd -maxdepth 1 -type l -lname 'socket:*' -printf '%h\\t%l\\n' 2>/dev/null |
+    sed -n 's#^/proc/\\([0-9]*\\)/fd\\tsocket:\\[\\([0-9]*\\)\\]$#P\\t\\2\\t\\1#p'
+for d in {quoted_dirs}; do
+    [ -d "$d" ] && find "$d" -xdev -maxdepth {max_depth} -type s -printf 'F\\t%i\\t%p\\n' 2>/dev/null
+done
+printf 'T\\t%s\\n' $(( $(now_ms) - start ))
+"""
+
+
+def parse_inventory(stdout):
+    """Turn the inventory script's output into ``(records, elapsed_ms)``."""
+    by_path = {}
+    pids = {}
+    elapsed_ms = None
+    for line in stdout.splitlines():
+        fields = line.split("\t")
+        tag = fields[0]
+        if tag == "S" and len(fields) == 3:
+            inode, path = int(fields[1]), fields[2]
+            record = by_path.setdefault(path, {"path": path, "inode": inode, "pids": [], "source": "proc"})
+            record["inode"] = inode
+        elif tag == "P" and len(fields) == 3:
+            pids.setdefault(int(fields[1]), set()).add(int(fields[2]))
+        elif tag == "F" and len(fields) == 3:
+            inode, path = int(fields[1]), fields[2]
+            if path in by_path:
+                by_path[path]["source"] = "proc+fs"
+            else:
+                by_path[path] = {"path": path, "inode": inode, "pids": [], "source": "fs"}
+        elif tag == "T" and len(fields) == 2:
+            elapsed_ms = int(fields[1])
+    for record in by_path.values():
+        record["pids"] = sorted(pids.get(record["inode"], ()))
+    return sorted(by_path.values(), key=lambda record: record["path"]), elapsed_ms
+
+
+def inventory_sockets(sb, dirs=RUNTIME_DIRS):
+    """Return ``{"sockets": [...], "elapsed_s": ..., "round_trip_s": ...}``.
+
+    Each socket is ``{"path", "inode", "pids", "source"}``. Abstract sockets
+    have paths starting with ``@``. ``elapsed_s`` is the time spent inside
+    the sandbox and ``round_trip_s`` includes the exec.
+    """
+    start = time.perf_counter()
+    p = sb.exec("sh", "-c", inventory_script(dirs))
+    stdout = p.stdout.read()
+    p.wait()
+    sockets, elapsed_ms = parse_inventory(stdout)
+    return {
+        "sockets": sockets,
+        "elapsed_s": (elapsed_ms or 0) / 1000,
+        "round_trip_s": time.perf_counter() - start,
+    }
+
+
+def select_sockets(sockets, include=(), exclude=(), name_glob=None, abstract=False, present_only=False):
+    """Filter socket records.
+
+    ``include``/``exclude`` are substrings matched against the path (a
+    socket must match one of ``include`` if given, and none of
+    ``exclude``); ``name_glob`` is matched against the basename, e.g.
+    ``"*.sock"``. Abstract sockets are skipped unless ``abstract`` is set.
+
+    A listener keeps its ``/proc/net/unix`` entry after its file is
+    deleted, so ``present_only`` keeps just the sockets whose file was
+    found on disk (``source`` ``fs`` or ``proc+fs``); use it when checking
+    what a removal left behind.
+    """
+    selected = []
+    for record in sockets:
+        path = record["path"]
+        if path.startswith("@") and not abstract:
+            continue
+        if present_only and record["source"] not in ("fs", "proc+fs"):
+            continue
+        if include and not any(pattern in path for pattern in include):
+            continue
+        if any(pattern in path for pattern in exclude):
+            continue
+        if name_glob and not fnmatch.fnmatch(path.rsplit("/", 1)[-1], name_glob):
+            continue
+        selected.append(record)
+    return selected
+
+
+def remove_sockets(sb, sockets):
+    """Delete the socket files in ``sockets`` with a single exec; return its exit code."""
+    paths = [record["path"] for record in sockets if not record["path"].startswith("@")]
+    if not paths:
+        return 0
+    p = sb.exec("rm", "-f", "--", *paths)
+    p.wait()
+    return p.returncode
+
+
+def print_sockets(sockets, limit=None, indent="  - "):
+    for record in sockets[:limit]:
+        owners = ",".join(str(pid) for pid in record["pids"]) or "-"
+        print(f"{indent}{record['path']} (inode {record['inode']}, pids {owners}, {record['source']})")
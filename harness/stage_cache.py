@@ -0,0 +1,195 @@
+"""Memoize expensive workload stages as snapshot images keyed by their inputs.
+
+A stage (for example ``pnpm install`` plus the pre-snapshot bookkeeping) is
+identified by the hashes of everything that determines its result: the
+Dockerfile, the lockfile and the stage scripts. After a successful run the
+snapshot image is stored under that key in a local JSON index, and the next
+run with identical inputs can skip straight to the resume phase.
+
+Eviction policy: entries older than ``max_age_s`` are dropped on lookup,
+the least recently used entries beyond ``max_entries`` are dropped on store,
+and ``invalidate``/``clear`` remove entries explicitly. Backends decide what
+an artifact is: ``ModalImageBackend`` stores Modal image ids and
+``LocalDirBackend`` copies directories, as a local stand-in for tests.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "STAGE_CACHE_INDEX",
+    os.path.join(os.path.expanduser("~"), ".cache", "modal-snapshot-testing", "stage-cache.json"),
+)
+
+
+def hash_bytes(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_files(*paths):
+    """Hash the contents of ``paths`` in order."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as fh:
+            digest.update(hash_bytes(fh.read()).encode())
+    return digest.hexdigest()
+
+
+def stage_key(stage, **input_hashes):
+    """Combine a stage name and named input hashes into a cache key."""
+    payload = json.dumps({"stage": stage, "inputs": input_hashes}, sort_keys=True)
+    return hash_bytes(payload)[:32]
+
+
+class ModalImageBackend:
+    """Artifacts are Modal images, referenced by image id."""
+
+    def save(self, image):
+        return image.object_id
+
+    def load(self, ref):
+        import modal
+
+        return modal.Image.from_id(ref)
+
+    def exists(self, ref):
+        # from_id is lazy; only hydrating asks the server whether the image is still there
+        import modal
+
+        try:
+            self.load(ref).hydrate()
+        except modal.exception.NotFoundError:
+            return False
+        return True
+
+    def delete(self, ref):
+        # Modal has no client API to delete an image; dropping the index entry is enough.
+        pass
+
+
+class LocalDirBackend:
+    """Artifacts are directory trees copied under ``root``."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def save(self, src_dir):
+        ref = uuid.uuid4().hex
+        shutil.copytree(src_dir, os.path.join(self.root, ref), symlinks=True)
+        return ref
+
+    def load(self, ref):
+        return os.path.join(self.root, ref)
+
+    def exists(self, ref):
+        return os.path.isdir(os.path.join(self.root, ref))
+
+    def delete(self, ref):
+        shutil.rmtree(os.path.join(self.root, ref), ignore_errors=True)
+
+
+class StageCache:
+    def __init__(self, backend, index_path=DEFAULT_INDEX_PATH, max_entries=20, max_age_s=7 * 24 * 3600):
+        self.backend = backend
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self.max_age_s = max_age_s
+
+    def _load(self):
+        try:
+            with open(self.index_path) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, index):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(index, fh, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def lookup(self, key):
+        """Return ``(artifact, metadata)`` for ``key`` or None on a miss."""
+        index = self._load()
+        entry = index.get(key)
+        if entry is None:
+            return None
+        expired = self.max_age_s is not None and time.time() - entry["created_at"] > self.max_age_s
+        if expired or not self.backend.exists(entry["ref"]):
+            self.backend.delete(entry["ref"])
+            del index[key]
+            self._save(index)
+            return None
+        entry["last_used_at"] = time.time()
+        entry["hits"] = entry.get("hits", 0) + 1
+        self._save(index)
+        return self.backend.load(entry["ref"]), entry.get("metadata", {})
+
+    def store(self, key, artifact, metadata=None):
+        """Save ``artifact`` under ``key`` and evict least recently used entries."""
+        index = self._load()
+        if key in index:
+            self.backend.delete(index[key]["ref"])
+        now = time.time()
+        index[key] = {
+            "ref": self.backend.save(artifact),
+            "created_at": now,
+            "last_used_at": now,
+            "hits": 0,
+            "metadata": metadata or {},
+        }
+        if self.max_entries is not None and len(index) > self.max_entries:
+            by_age = sorted(index, key=lambda k: index[k]["last_used_at"])
+            for stale_key in by_age[: len(index) - self.max_entries]:
+                self.backend.delete(index.pop(stale_key)["ref"])
+        self._save(index)
+        return index[key]["ref"]
+
+    def invalidate(self, key):
+        """Drop ``key``; return True if it was present."""
+        index = self._load()
+        entry = index.pop(key, None)
+        if entry is None:
+            return False
+        self.backend.delete(entry["ref"])
+        self._save(index)
+        return True
+
+    def clear(self):
+        index = self._load()
+        for entry in index.values():
+            self.backend.delete(entry["ref"])
+        self._save({})
+        return len(index)
+
+    def entries(self):
+        return self._load()
+
+
+def main():
+    usage = "Usage: python -m harness.stage_cache [list | clear | invalidate <key>]"
+    cache = StageCache(ModalImageBackend())
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        for key, entry in sorted(cache.entries().items(), key=lambda item: item[1]["last_used_at"]):
+            age_h = (time.time() - entry["created_at"]) / 3600
+            print(f"{key}  {entry['ref']}  age={age_h:.1f}h  hits={entry.get('hits', 0)}")
+    elif command == "clear":
+        print(f"Removed {cache.clear()} entries")
+    elif command == "invalidate" and len(sys.argv) == 3:
+        print("Removed" if cache.invalidate(sys.argv[2]) else "Not found")
+    else:
+        print(usage)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Small statistics helpers for benchmark and iteration reports."""
+
+import math
+import statistics
+
+
+def percentile(values, q):
+    """Return the ``q``-th percentile (0-100) with linear interpolation between ranks."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values, quantiles=(50, 95, 99)):
+    """Return ``n``, ``mean``, ``min``, ``max`` and ``p<q>`` for each quantile."""
+    values = [value for value in values if value is not None]
+    summary = {"n": len(values)}
+    if not values:
+        return summary
+    summary["mean"] = sum(values) / len(values)
+    summary["min"] = min(values)
+    summary["max"] = max(values)
+    for q in quantiles:
+        summary[f"p{q}"] = percentile(values, q)
+    return summary
+
+
+def _z(confidence):
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def wilson_interval(k, n, confidence=0.95):
+    """Wilson score interval for ``k`` events in ``n`` trials; ``(0, 1)`` when ``n`` is 0."""
+    if n == 0:
+        return 0.0, 1.0
+    z = _z(confidence)
+    p = k / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def _binomial_cdf(k, n, p):
+    """P(X <= k) for X ~ Binomial(n, p)."""
+    if k < 0:
+        return 0.0
+    if k >= n:
+        return 1.0
+    if p <= 0.0:
+        return 1.0
+    if p >= 1.0:
+        return 0.0
+    log_p, log_q = math.log(p), math.log1p(-p)
+    return min(1.0, sum(
+        math.exp(math.lgamma(n + 1) - math.lgamma(i + 1) - math.lgamma(n - i + 1) + i * log_p + (n - i) * log_q)
+        for i in range(k + 1)
+    ))
+
+
+def _solve_decreasing(f, target):
+    """Return p in [0, 1] where the decreasing function ``f(p)`` crosses ``target``."""
+    low, high = 0.0, 1.0
+    for _ in range(60):
+        mid = (low + high) / 2
+        if f(mid) > target:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def clopper_pearson_interval(k, n, confidence=0.95):
+    """Exact (Clopper-Pearson) interval for ``k`` events in ``n`` trials."""
+    if n == 0:
+        return 0.0, 1.0
+    alpha = 1 - confidence
+    # P(X >= k) grows with p, so 1 - P(X <= k - 1) = alpha / 2 gives the lower bound
+    lower = 0.0 if k == 0 else _solve_decreasing(lambda p: _binomial_cdf(k - 1, n, p), 1 - alpha / 2)
+    upper = 1.0 if k == n else _solve_decreasing(lambda p: _binomial_cdf(k, n, p), alpha / 2)
+    return lower, upper
+
+
+class SPRT:
+    """Wald's sequential probability ratio test on a Bernoulli rate.
+
+    Tests ``p <= p0`` against ``p >= p1`` one observation at a time.
+    ``decision`` stays ``None`` while more data is needed, then becomes
+    ``"below"`` (accept ``p0``) or ``"above"`` (accept ``p1``), with error
+    rates of at most ``alpha`` and ``beta`` respectively.
+    """
+
+    def __init__(self, p0, p1, alpha=0.05, beta=0.05):
+        if not 0 < p0 < p1 < 1:
+            raise ValueError(f"need 0 < p0 < p1 < 1, got p0={p0}, p1={p1}")
+        self.p0 = p0
+        self.p1 = p1
+        self.alpha = alpha
+        self.beta = beta
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.n = 0
+        self.k = 0
+        self.llr = 0.0
+        self.decision = None
+        self.decided_at = None
+
+    @classmethod
+    def around(cls, target, delta, alpha=0.05, beta=0.05):
+        """Indifference region ``target ± delta``, clamped inside (0, 1)."""
+        return cls(max(target - delta, 0.001), min(target + delta, 0.999), alpha, beta)
+
+    def update(self, event):
+        """Record one trial (``event`` true or false) and return the current decision."""
+        self.n += 1
+        if event:
+            self.k += 1
+            self.llr += math.log(self.p1 / self.p0)
+        else:
+            self.llr += math.log((1 - self.p1) / (1 - self.p0))
+        if self.decision is None:
+            if self.llr >= self.upper:
+                self.decision = "above"
+            elif self.llr <= self.lower:
+                self.decision = "below"
+            if self.decision is not None:
+                self.decided_at = self.n
+        return self.decision
+
+
+def rate_summary(k, n, confidence=0.95):
+    """Return ``k``, ``n``, the rate and its Wilson and Clopper-Pearson intervals."""
+    return {
+        "k": k,
+        "n": n,
+        "rate": k / n if n else None,
+        "confidence": confidence,
+        "wilson": wilson_interval(k, n, confidence),
+        "clopper_pearson": clopper_pearson_interval(k, n, confidence),
+    }
@@ -0,0 +1,115 @@
+"""Generate synthetic directory trees for filesystem benchmarks (stdlib only).
+
+A tree has ``files`` entries spread round-robin over ``leaves`` leaf
+directories, each ``depth`` directories below the root. A ``symlinks`` and a
+``hardlinks`` fraction of the entries are links to earlier regular files, and
+the rest are regular files of ``size`` bytes. Contents are random by default,
+so neither the snapshot nor the transport can deduplicate or compress them.
+
+Like ``harness.manifest`` this module runs unchanged inside a sandbox::
+
+    python3 synthtree.py /tmp/tree --files 10000 --size 4096 --depth 4 --symlinks 0.25
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import time
+
+
+def leaf_dirs(root, leaves, depth):
+    """Return ``leaves`` leaf directory paths, each ``depth`` levels below ``root``."""
+    depth = max(1, depth)
+    return [
+        os.path.join(root, f"d{leaf:05d}", *(f"n{level}" for level in range(depth - 1)))
+        for leaf in range(max(1, leaves))
+    ]
+
+
+def generate(root, files, size, depth=1, leaves=None, symlinks=0.0, hardlinks=0.0, content="random", seed=0):
+    """Create the tree under ``root`` (replacing it) and return a summary dict."""
+    if symlinks < 0 or hardlinks < 0 or symlinks + hardlinks > 1:
+        raise ValueError("symlink and hardlink ratios must be non-negative and sum to at most 1")
+    start = time.monotonic()
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+
+    leaves = leaves if leaves is not None else max(1, files // 100)
+    dirs = leaf_dirs(root, leaves, depth)
+    for path in dirs:
+        os.makedirs(path, exist_ok=True)
+
+    rng = random.Random(seed)
+    n_symlinks = int(files * symlinks)
+    n_hardlinks = int(files * hardlinks)
+    n_regular = files - n_symlinks - n_hardlinks
+    if n_regular == 0 and files:
+        # Links need at least one target
+        n_regular = 1
+        n_symlinks = min(n_symlinks, files - 1)
+        n_hardlinks = files - 1 - n_symlinks
+    zero = b"\0" * size
+
+    regular = []
+    for i in range(n_regular):
+        path = os.path.join(dirs[i % len(dirs)], f"f{i:07d}.bin")
+        with open(path, "wb") as fh:
+            fh.write(os.urandom(size) if content == "random" else zero)
+        regular.append(path)
+
+    for i in range(n_symlinks):
+        index = n_regular + i
+        path = os.path.join(dirs[index % len(dirs)], f"s{index:07d}.lnk")
+        target = regular[rng.randrange(len(regular))]
+        os.symlink(os.path.relpath(target, os.path.dirname(path)), path)
+
+    for i in range(n_hardlinks):
+        index = n_regular + n_symlinks + i
+        path = os.path.join(dirs[index % len(dirs)], f"h{index:07d}.bin")
+        os.link(regular[rng.randrange(len(regular))], path)
+
+    return {
+        "root": root,
+        "files": n_regular,
+        "symlinks": n_symlinks,
+        "hardlinks": n_hardlinks,
+        "dirs": len(dirs) * max(1, depth),
+        "depth": max(1, depth),
+        "bytes": n_regular * size,
+        "seconds": round(time.monotonic() - start, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic directory tree")
+    parser.add_argument("root")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=4096, help="bytes per regular file")
+    parser.add_argument("--depth", type=int, default=1, help="directory levels between the root and each file")
+    parser.add_argument("--leaves", type=int, default=None, help="leaf directories (default: files / 100)")
+    parser.add_argument("--symlinks", type=float, default=0.0, help="fraction of entries that are symlinks")
+    parser.add_argument("--hardlinks", type=float, default=0.0, help="fraction of entries that are hardlinks")
+    parser.add_argument("--content", choices=("random", "zero"), default="random")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    summary = generate(
+        args.root,
+        args.files,
+        args.size,
+        depth=args.depth,
+        leaves=args.leaves,
+        symlinks=args.symlinks,
+        hardlinks=args.hardlinks,
+        content=args.content,
+        seed=args.seed,
+    )
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Nested phase spans written as JSONL.
+
+Every script opens a run with :func:`start_run` and wraps its phases in
+:func:`span`. Each finished span is appended to the run's JSONL file as one
+object::
+
+    {"run_id": ..., "span_id": 3, "parent_id": 1, "depth": 1,
+     "name": "snapshot_filesystem", "start_s": 12.31, "duration_s": 41.8,
+     "status": "ok", "attrs": {"iteration": 2}}
+
+``start_s`` is measured on the monotonic clock relative to the start of the
+run, so spans from concurrent sandboxes can be laid out on one timeline.
+Nesting follows a context variable, which asyncio copies into every task, so
+spans opened inside ``asyncio.gather`` children get the right parent.
+
+The standard phase names are listed in :data:`PHASES`; scripts may add their
+own (pnpm steps, compose checks) as long as they nest them under one of
+these.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+PHASES = (
+    "image_hydrate",
+    "sandbox_create",
+    "dockerd_ready",
+    "workload",
+    "snapshot_filesystem",
+    "terminate",
+    "resume",
+)
+
+TIMINGS_DIR = os.path.expanduser("~/.cache/modal-snapshot-testing/timings")
+
+_current = contextvars.ContextVar("harness_timing_span", default=None)
+_run = None
+
+
+class Span:
+    """One timed phase. ``duration_s`` is set when the span closes."""
+
+    def __init__(self, recorder, name, parent, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.span_id = next(recorder._ids)
+        self.parent = parent
+        self.parent_id = parent.span_id if parent else None
+        self.depth = parent.depth + 1 if parent else 0
+        self.attrs = dict(attrs)
+        self.start = time.monotonic()
+        self.duration_s = None
+        self.status = "ok"
+        self.error = None
+        self.children = []
+
+    def set(self, **attrs):
+        """Attach attributes that are only known once the phase has run."""
+        self.attrs.update(attrs)
+
+    def phase_durations(self):
+        """Return ``{name: seconds}`` summed over the closed direct children."""
+        durations = {}
+        for child in self.children:
+            durations[child.name] = durations.get(child.name, 0.0) + child.duration_s
+        return durations
+
+    def close(self):
+        self.duration_s = time.monotonic() - self.start
+        if self.parent is not None:
+            self.parent.children.append(self)
+
+    def record(self):
+        record = {
+            "run_id": self.recorder.run_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "depth": self.depth,
+            "name": self.name,
+            "start_s": round(self.start - self.recorder.start, 6),
+            "duration_s": round(self.duration_s, 6),
+            "status": self.status,
+        }
+        if self.error:
+            record["error"] = self.error
+        if self.attrs:
+            record["attrs"] = self.attrs
+        return record
+
+
+def phase_totals(spans):
+    """Return ``{name: (count, total_s)}`` over the top-level phases of each tree.
+
+    ``spans`` yields ``(span_id, parent_id, name, duration_s)``. A phase nested
+    under another phase of the same name is not counted twice, so ``resume``
+    wrapping a ``sandbox_create`` still reports both.
+    """
+    spans = list(spans)
+    by_id = {span_id: (parent_id, name) for span_id, parent_id, name, _ in spans}
+    totals = {}
+    for span_id, parent_id, name, duration_s in spans:
+        parent = by_id.get(parent_id)
+        while parent is not None and parent[1] != name:
+            parent = by_id.get(parent[0])
+        if parent is not None:
+            continue
+        count, total = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, total + duration_s)
+    return totals
+
+
+class Recorder:
+    """Append spans for one run to a JSONL file."""
+
+    def __init__(self, script, path=None, run_id=None):
+        self.script = script
+        self.run_id = run_id or f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.path = path or os.path.join(TIMINGS_DIR, f"{script}-{self.run_id}.jsonl")
+        self.start = time.monotonic()
+        self.started_at = time.time()
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "a")
+        self._write({
+            "run_id": self.run_id,
+            "event": "run_start",
+            "script": script,
+            "started_at": self.started_at,
+            "argv": sys.argv[1:],
+        })
+
+    def _write(self, record):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        span = Span(self, name, _current.get(), attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"[:500]
+            raise
+        finally:
+            span.close()
+            _current.reset(token)
+            with self._lock:
+                self.spans.append(span)
+            self._write(span.record())
+
+    def totals(self):
+        return phase_totals((span.span_id, span.parent_id, span.name, span.duration_s) for span in self.spans)
+
+    def close(self):
+        wall = time.monotonic() - self.start
+        self._write({
+            "run_id": self.run_id,
+            "event": "run_end",
+            "duration_s": round(wall, 6),
+            "spans": len(self.spans),
+        })
+        with self._lock:
+            self._file.close()
+        return wall
+
+    def print_summary(self, wall=None):
+        totals = self.totals()
+        if not totals:
+            return
+        wall = wall if wall is not None else time.monotonic() - self.start
+        ordered = [name for name in PHASES if name in totals]
+        ordered += sorted(name for name in totals if name not in PHASES)
+        width = max(len(name) for name in ordered)
+        print(f"\nPhase timings ({self.path}):")
+        print(f"  {'phase':<{width}}  {'count':>5}  {'total_s':>9}  {'% wall':>6}")
+        for name in ordered:
+            count, total = totals[name]
+            share = 100 * total / wall if wall else 0.0
+            print(f"  {name:<{width}}  {count:>5}  {total:>9.2f}  {share:>5.1f}%")
+        print(f"  {'wall clock':<{width}}  {'':>5}  {wall:>9.2f}")
+
+
+def start_run(script, path=None):
+    """Open the JSONL file for this process and print a summary at exit.
+
+    ``script`` names the output file; ``path`` (or ``MODAL_TIMING_PATH``)
+    overrides it, which lets several scripts append to one file.
+    """
+    global _run
+    if _run is not None:
+        return _run
+    _run = Recorder(script, path=path or os.environ.get("MODAL_TIMING_PATH"))
+    atexit.register(_finish_run)
+    return _run
+
+
+def _finish_run():
+    global _run
+    if _run is None:
+        return
+    recorder, _run = _run, None
+    wall = recorder.close()
+    recorder.print_summary(wall)
+
+
+def current_run():
+    return _run
+
+
+def span(name, **attrs):
+    """Time a phase under the current run, or only measure it if no run is open."""
+    if _run is None:
+        return _detached_span(name, attrs)
+    return _run.span(name, **attrs)
+
+
+@contextlib.contextmanager
+def _detached_span(name, attrs):
+    span = Span(_DETACHED, name, _current.get(), attrs)
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        span.close()
+        _current.reset(token)
+
+
+class _Detached:
+    run_id = None
+    start = time.monotonic()
+    _ids = itertools.count(1)
+
+
+_DETACHED = _Detached()
+
+
+def hydrate_image(image, app):
+    """Build ``image`` up front so its cost shows up as ``image_hydrate``.
+
+    Without this the build or pull is folded into the first
+    ``Sandbox.create`` and cannot be told apart from sandbox start-up.
+    """
+    with span("image_hydrate") as s:
+        image.build(app)
+        s.set(image_id=image.object_id)
+    return image
+
+
+async def hydrate_image_async(image, app):
+    with span("image_hydrate") as s:
+        await image.build.aio(app)
+        s.set(image_id=image.object_id)
+    return image
@@ -1,6 +1,110 @@
-def main():
-    print("Hello from modal-docker-snapshotting!")
+"""Single entry point for the scenario scripts and harness tools.
+
+    python main.py run --list
+    python main.py run modal_docker_example_snapshot_iterations 5
+    python main.py matrix scenarios/snapshot_matrix.toml --workers 4
+    python main.py bench --list
+    python main.py bench snapshot_scaling --scale 0.1
+    python main.py bisect docker-compose/IMAGES
+    python main.py report --last 5
+    python main.py prebuild
+
+Commands map to module names and scripts are found by file name, so nothing
+is imported until a command runs. ``--help``, ``--list`` and ``--dry-run``
+never load the Modal client.
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIRS = ("snapshotting_fails", "snapshotting_succeeds", "network", "pnpm-testing", "docker-compose")
+
+# name -> (module with main(argv), fixed leading argv, help)
+COMMANDS = {
+    "run": (None, (), "run one scenario script by name"),
+    "matrix": ("harness.matrix", (), "run the scenario matrix from a TOML spec"),
+    "bench": (None, (), "run one benchmark script by name"),
+    "bisect": ("harness.bisect", (), "find the first bad image digest"),
+    "report": ("harness.report", (), "summarize recorded phase timings"),
+    "prebuild": ("harness.images", ("prebuild",), "hydrate the shared images concurrently"),
+}
+
+
+def discover_scripts():
+    """Return ``{name: path}`` for every scenario script, without importing any."""
+    scripts = {}
+    for directory in SCRIPT_DIRS:
+        for entry in sorted(os.listdir(os.path.join(REPO_ROOT, directory))):
+            if entry.endswith(".py"):
+                name = entry[: -len(".py")]
+                scripts[name.removeprefix("modal_")] = os.path.join(REPO_ROOT, directory, entry)
+    return scripts
+
+
+def _is_bench(name):
+    return name.endswith("_bench")
+
+
+def run_script(command, argv):
+    scripts = {
+        name.removesuffix("_bench") if command == "bench" else name: path
+        for name, path in discover_scripts().items()
+        if _is_bench(name) == (command == "bench")
+    }
+    dry_run = "--dry-run" in argv[:1]
+    if dry_run:
+        argv = argv[1:]
+    if not argv or argv[0] in ("--list", "-h", "--help"):
+        print(f"usage: main.py {command} [--dry-run] NAME [ARGS ...]\n")
+        for name, path in scripts.items():
+            print(f"  {name:<40} {os.path.relpath(path, REPO_ROOT)}")
+        return 0 if argv else 2
+    name, args = argv[0], argv[1:]
+    path = scripts.get(name) or scripts.get(name.removeprefix("modal_"))
+    if path is None:
+        print(f"main.py {command}: unknown script {name!r} (try --list)", file=sys.stderr)
+        return 2
+    if dry_run:
+        print(" ".join([sys.executable, path, *args]))
+        return 0
+
+    import runpy
+
+    sys.argv = [path, *args]
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return 0
+
+
+def usage():
+    lines = ["usage: main.py COMMAND [ARGS ...]", "", "commands:"]
+    lines += [f"  {name:<10} {help_text}" for name, (_, _, help_text) in COMMANDS.items()]
+    lines += ["", "Run 'main.py COMMAND --help' for the options of one command."]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    command, args = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"main.py: unknown command {command!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module_name, leading, _ = COMMANDS[command]
+    if module_name is None:
+        return run_script(command, args)
+
+    import importlib
+
+    sys.path.insert(0, REPO_ROOT)
+    module = importlib.import_module(module_name)
+    return module.main([*leading, *args])
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
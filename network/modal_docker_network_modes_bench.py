@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""DNS latency, TCP connect time and throughput per Docker network mode.
+
+One python:3.11-slim container on the sandbox's host network runs
+``harness.netbench serve``: an HTTP server plus a DNS responder that answers
+every name with the sandbox's address. A client container per mode then
+measures the path to it, so nothing here needs the internet and the numbers
+isolate what each mode's networking costs inside gvisor:
+
+* ``bridge`` / ``host``: ``docker run`` on the default bridge or host network.
+* ``none``: the client serves on its own loopback, the floor for the others.
+* ``compose-bridge``: a compose network, so DNS goes through Docker's
+  embedded resolver (``dns:`` points it at the local responder).
+* ``compose-host``: compose with ``network_mode: host``.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import modal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness import netbench  # noqa: E402
+from harness.dockerd import wait_for_dockerd  # noqa: E402
+from harness.imagecache import ImageCache, add_arguments  # noqa: E402
+from harness.images import get_image  # noqa: E402
+from harness.output import run_logged  # noqa: E402
+from harness.remote import module_script  # noqa: E402
+from harness.stats import summarize  # noqa: E402
+from harness.timing import hydrate_image, span, start_run  # noqa: E402
+
+os.environ["MODAL_IMAGE_BUILDER_VERSION"] = "2025.06"
+
+RESULTS_DIR = os.path.expanduser("~/.cache/modal-snapshot-testing/bench")
+CLIENT_IMAGE = "python:3.11-slim"
+SERVER_NAME = "netbench-server"
+MODES = ("host", "bridge", "none", "compose-bridge", "compose-host")
+METRICS = (
+    ("dns_ms", "DNS resolution (ms)"),
+    ("connect_ms", "TCP connect (ms)"),
+    ("throughput_mbps", "Throughput (MB/s)"),
+)
+SANDBOX_ADDR_SCRIPT = (
+    "dev=$(ip route show default | awk '/default/ {print $5}'); "
+    "ip addr show dev \"$dev\" | grep -w inet | awk '{print $2}' | cut -d/ -f1 | head -n 1"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark DNS, connect and throughput per Docker network mode")
+    parser.add_argument("--mode", action="append", choices=MODES, help="mode to run (repeatable, default: all)")
+    parser.add_argument("--samples", type=int, default=50, help="DNS and connect samples per mode (default: 50)")
+    parser.add_argument("--transfers", type=int, default=5, help="downloads per mode (default: 5)")
+    parser.add_argument("--payload-mb", type=int, default=64, help="size of each download (default: 64)")
+    parser.add_argument("--output", help="write results as JSON (default: under ~/.cache/modal-snapshot-testing/bench)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.samples < 1 or args.transfers < 1:
+        parser.error("--samples and --transfers must be at least 1")
+    return args
+
+
+def client_args(args, *extra):
+    return [
+        "client",
+        "--samples", str(args.samples),
+        "--transfers", str(args.transfers),
+        "--payload-mb", str(args.payload_mb),
+        *extra,
+    ]
+
+
+def start_server(sb, addr):
+    script = module_script(netbench, "serve", "--answer", addr)
+    run = run_logged(
+        sb, "netbench-server", "docker", "run", "-d", "--rm", "--network", "host", "--name", SERVER_NAME,
+        CLIENT_IMAGE, "python3", "-c", script, tail=5,
+    )
+    if not run.ok:
+        raise RuntimeError(f"Starting the server failed: {' / '.join(run.stderr_tail)}")
+    ready = run_logged(
+        sb, "netbench-server-ready", "sh", "-c",
+        f"for i in $(seq 100); do docker logs {SERVER_NAME} 2>&1 | grep -q serving && exit 0; sleep 0.1; done; "
+        f"docker logs {SERVER_NAME}; exit 1",
+        tail=20,
+    )
+    if not ready.ok:
+        raise RuntimeError("Server did not start:\n" + "\n".join(ready.tail + ready.stderr_tail))
+
+
+def compose_file(mode, addr, command):
+    """Return a compose file (as JSON, which compose reads as YAML) running ``command`` once."""
+    service = {"image": CLIENT_IMAGE, "command": command}
+    config = {"services": {"client": service}}
+    if mode == "compose-host":
+        service["network_mode"] = "host"
+    else:
+        service["networks"] = ["netbench"]
+        service["dns"] = [addr]
+        config["networks"] = {"netbench": {"driver": "bridge"}}
+    return json.dumps(config, indent=2)
+
+
+def run_client(sb, mode, addr, args):
+    """Run the client for ``mode`` and return its parsed JSON result."""
+    nameserver = ["--host", addr, "--nameserver", addr]
+    if mode in ("bridge", "host", "none"):
+        if mode == "none":
+            script = module_script(netbench, *client_args(args, "--local"))
+        else:
+            script = module_script(netbench, *client_args(args, *nameserver))
+        network = [] if mode == "bridge" else ["--network", mode]
+        cmd = ["docker", "run", "--rm", *network, "--name", f"netbench-{mode}", CLIENT_IMAGE, "python3", "-c", script]
+        run = run_logged(sb, f"netbench-{mode}", *cmd, tail=5)
+    else:
+        # compose-bridge resolves through Docker's embedded DNS, which forwards to dns:
+        extra = ["--host", addr] if mode == "compose-bridge" else nameserver
+        command = ["python3", "-c", module_script(netbench, *client_args(args, *extra))]
+        path = f"/tmp/netbench-{mode}.json"
+        with sb.open(path, "w") as f:
+            f.write(compose_file(mode, addr, command))
+        project = ["docker", "compose", "-f", path, "-p", f"netbench-{mode}"]
+        run = run_logged(sb, f"netbench-{mode}", *project, "run", "--rm", "client", tail=5)
+        sb.exec(*project, "down", "-v").wait()
+    for line in reversed(run.tail):
+        if line.strip().startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"{mode}: no result (exit ok={run.ok}): {' / '.join(run.stderr_tail)}")
+
+
+def print_report(results, modes):
+    for key, label in METRICS:
+        print(f"\n{label}:")
+        print(f"  {'mode':<16} {'n':>4} {'err':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'mean':>9} {'p50/host':>9}")
+        host = summarize(results.get("host", {}).get(key, []))
+        for mode in modes:
+            result = results[mode]
+            summary = summarize(result.get(key, []))
+            errors = result.get("errors", {}).get(f"{key.split('_')[0]}_count", 0)
+            if "error" in result or not summary["n"]:
+                print(f"  {mode:<16} {0:>4} {errors:>4}  {result.get('error', '')}")
+                continue
+            ratio = f"{summary['p50'] / host['p50']:.2f}x" if host["n"] and host["p50"] else "-"
+            print(
+                f"  {mode:<16} {summary['n']:>4} {errors:>4} {summary['p50']:>9.2f} {summary['p95']:>9.2f} "
+                f"{summary['p99']:>9.2f} {summary['mean']:>9.2f} {ratio:>9}"
+            )
+    for mode in modes:
+        for key, message in results[mode].get("errors", {}).items():
+            if not key.endswith("_count"):
+                print(f"  {mode} {key}: {message}")
+
+
+def main():
+    args = parse_args()
+    modes = args.mode or list(MODES)
+    cache = ImageCache.from_args(args)
+    start_run("modal_docker_network_modes_bench")
+
+    print("Looking up modal.Sandbox app")
+    app = modal.App.lookup("docker-network-bench", create_if_missing=True)
+    image = get_image("docker_in_gvisor")
+    with modal.enable_output():
+        hydrate_image(image, app)
+        with span("sandbox_create"):
+            sb = modal.Sandbox.create(
+                "/start-dockerd.sh",
+                timeout=60 * 60,
+                app=app,
+                image=image,
+                experimental_options={"enable_docker_in_gvisor": True},
+                **cache.sandbox_options(),
+            )
+
+    results = {}
+    try:
+        ready_in = wait_for_dockerd(sb, timeout=30)
+        print(f"Docker daemon ready in {ready_in:.2f}s")
+        with span("workload"):
+            cache.ensure(sb, [CLIENT_IMAGE])
+            p = sb.exec("sh", "-c", SANDBOX_ADDR_SCRIPT)
+            addr = p.stdout.read().strip()
+            p.wait()
+            if not addr:
+                raise RuntimeError("Could not find the sandbox's address")
+            print(f"Serving on {addr}:{netbench.HTTP_PORT} (HTTP) and :{netbench.DNS_PORT} (DNS)")
+            start_server(sb, addr)
+
+            # One mode at a time, so modes never compete for the sandbox's CPU
+            for mode in modes:
+                print(f"\n--- {mode} ---")
+                with span("probe", mode=mode) as probe_span:
+                    try:
+                        results[mode] = run_client(sb, mode, addr, args)
+                    except Exception as e:
+                        print(f"   FAILED: {e}")
+                        results[mode] = {"error": f"{type(e).__name__}: {e}"}
+                    probe_span.set(ok="error" not in results[mode])
+                for key, label in METRICS:
+                    summary = summarize(results[mode].get(key, []))
+                    if summary["n"]:
+                        print(f"   {label}: p50 {summary['p50']:.2f}, p95 {summary['p95']:.2f}")
+    except KeyboardInterrupt:
+        print("\n\nInterrupted by user")
+    finally:
+        with span("terminate"):
+            sb.terminate()
+
+    print_report(results, [mode for mode in modes if mode in results])
+    cache.print_summary()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"network-modes-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "samples": args.samples,
+                "transfers": args.transfers,
+                "payload_mb": args.payload_mb,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
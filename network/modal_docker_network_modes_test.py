@@ -1,85 +1,28 @@
 #!/usr/bin/env python3
 
+import argparse
+import concurrent.futures
+import contextvars
+import io
 import os
+import sys
+import threading
 
 import modal
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness.dockerd import wait_for_dockerd  # noqa: E402
+from harness.imagecache import ImageCache, add_arguments  # noqa: E402
+from harness.images import get_image  # noqa: E402
+from harness.output import run_logged  # noqa: E402
+from harness.timing import hydrate_image, span, start_run  # noqa: E402
+
 # Use the 2025.06 Modal Image Builder which avoids the need to install Modal client
 # dependencies into the container image.
 
 os.environ["MODAL_IMAGE_BUILDER_VERSION"] = "2025.06"
 
-# Here's a basic Dockerfile that installs docker with buildx and ensures
-# that the docker daemon is started with the correct network configuration
-# upon modal.Sandbox startup.
-
-dockerfile_content = """
-FROM ubuntu:22.04
-
-ENV DEBIAN_FRONTEND="noninteractive"
-RUN apt-get update
-RUN apt-get install -y docker.io
-
-# Install docker-buildx (non-legacy build system) and docker-compose
-RUN apt-get update
-RUN apt-get install ca-certificates curl
-RUN install -m 0755 -d /etc/apt/keyrings
-RUN curl -fsSL https://download.docker.com/linux/ubuntu/gpg -o /etc/apt/keyrings/docker.asc
-RUN chmod a+r /etc/apt/keyrings/docker.asc
-# Add the repository to Apt sources:
-RUN echo \
-  "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/linux/ubuntu \
-  $(. /etc/os-release && echo "${UBUNTU_CODENAME:-$VERSION_CODENAME}") stable" | \
-  tee /etc/apt/sources.list.d/docker.list > /dev/null
-RUN apt-get update
-RUN apt-get install docker-buildx-plugin
-RUN apt-get install docker-compose-plugin
-RUN mkdir /build
-
-# Install additional tools for network testing
-RUN apt-get install -y wget curl iputils-ping dnsutils
-
-# Start docker daemon
-COPY start-dockerd.sh .
-"""
-
-start_dockerd_sh_content = """#!/bin/bash
-set -xe -o pipefail
-
-dev=$(ip route show default | awk '/default/ {print $5}')
-if [ -z "$dev" ]; then
-    echo "Error: No default device found."
-    ip route show
-    exit 1
-else
-    echo "Default device: $dev"
-fi
-addr=$(ip addr show dev "$dev" | grep -w inet | awk '{print $2}' | cut -d/ -f1)
-if [ -z "$addr" ]; then
-    echo "Error: No IP address found for device $dev."
-    ip addr show dev "$dev"
-    exit 1
-else
-    echo "IP address for $dev: $addr"
-fi
-
-echo 1 > /proc/sys/net/ipv4/ip_forward
-iptables-legacy -t nat -A POSTROUTING -o "$dev" -j SNAT --to-source "$addr" -p tcp
-iptables-legacy -t nat -A POSTROUTING -o "$dev" -j SNAT --to-source "$addr" -p udp
-
-exec /usr/bin/dockerd --iptables=false --ip6tables=false -D"""
-
-# Write the Dockerfile content to a local file.
-with open("Dockerfile.docker_in_gvisor", "w") as dockerfile:
-    dockerfile.write(dockerfile_content)
-
-# Write the start-dockerd.sh content to a local file.
-with open("start-dockerd.sh", "w") as start_dockerd_sh:
-    start_dockerd_sh.write(start_dockerd_sh_content)
-os.chmod("start-dockerd.sh", 0o755)
-
-
-dockerfile_image = modal.Image.from_dockerfile("Dockerfile.docker_in_gvisor")
+dockerfile_image = get_image("docker_in_gvisor_network")
 
 
 def test_network_mode(sb, mode):
@@ -132,34 +75,33 @@ networks:
         f.write(compose_content)
     
     print("Starting docker-compose service...")
-    p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-test.yml", "up", "--abort-on-container-exit")
-    
-    output = []
-    for line in p.stdout:
-        print(line, end="")
-        output.append(line)
-    
-    p.wait()
+    marker = "Successfully installed and imported requests"
+    up = run_logged(
+        sb,
+        "compose-bridge-up",
+        "docker", "compose", "-f", "/tmp/docker-compose-test.yml", "-p", "netmodes-bridge", "up", "--abort-on-container-exit",
+        watch=(marker,),
+    )
+    up.print_tail()
     
     # If it failed, check stderr
-    if p.returncode != 0:
+    if not up.ok:
         print("\nSTDERR output:")
-        stderr = p.stderr.read()
-        print(stderr)
+        print("\n".join(up.stderr_tail))
         
         # Get logs from the container
         print("\nGetting container logs...")
-        logs_p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-test.yml", "logs")
+        logs_p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-test.yml", "-p", "netmodes-bridge", "logs")
         logs = logs_p.stdout.read()
         print(logs)
         logs_p.wait()
     
     # Check if pip install succeeded
-    success = any("Successfully installed and imported requests" in line for line in output)
+    success = marker in up.matched
     
     # Clean up
     print("\nCleaning up docker-compose...")
-    p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-test.yml", "down", "-v")
+    p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-test.yml", "-p", "netmodes-bridge", "down", "-v")
     p.wait()
     
     if success:
@@ -186,34 +128,33 @@ def test_docker_compose_host_network(sb):
         f.write(compose_content)
     
     print("Starting docker-compose service with host network...")
-    p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-host-test.yml", "up", "--abort-on-container-exit")
-    
-    output = []
-    for line in p.stdout:
-        print(line, end="")
-        output.append(line)
-    
-    p.wait()
+    marker = "Successfully installed and imported requests with host network"
+    up = run_logged(
+        sb,
+        "compose-host-up",
+        "docker", "compose", "-f", "/tmp/docker-compose-host-test.yml", "-p", "netmodes-host", "up", "--abort-on-container-exit",
+        watch=(marker,),
+    )
+    up.print_tail()
     
     # If it failed, check stderr
-    if p.returncode != 0:
+    if not up.ok:
         print("\nSTDERR output:")
-        stderr = p.stderr.read()
-        print(stderr)
+        print("\n".join(up.stderr_tail))
         
         # Get logs from the container
         print("\nGetting container logs...")
-        logs_p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-host-test.yml", "logs")
+        logs_p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-host-test.yml", "-p", "netmodes-host", "logs")
         logs = logs_p.stdout.read()
         print(logs)
         logs_p.wait()
     
     # Check if pip install succeeded
-    success = any("Successfully installed and imported requests with host network" in line for line in output)
+    success = marker in up.matched
     
     # Clean up
     print("\nCleaning up docker-compose...")
-    p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-host-test.yml", "down", "-v")
+    p = sb.exec("docker", "compose", "-f", "/tmp/docker-compose-host-test.yml", "-p", "netmodes-host", "down", "-v")
     p.wait()
     
     if success:
@@ -250,7 +191,7 @@ networks:
     
     # Run docker-compose locally
     result = subprocess.run(
-        ["docker", "compose", "-f", "/tmp/docker-compose-local-test.yml", "up", "--abort-on-container-exit"],
+        ["docker", "compose", "-f", "/tmp/docker-compose-local-test.yml", "-p", "netmodes-local", "up", "--abort-on-container-exit"],
         capture_output=True,
         text=True
     )
@@ -265,7 +206,7 @@ networks:
     # Clean up
     print("\nCleaning up local docker-compose...")
     subprocess.run(
-        ["docker", "compose", "-f", "/tmp/docker-compose-local-test.yml", "down", "-v"],
+        ["docker", "compose", "-f", "/tmp/docker-compose-local-test.yml", "-p", "netmodes-local", "down", "-v"],
         capture_output=True
     )
     
@@ -281,69 +222,170 @@ networks:
         return False
 
 
-def main():
-    # First test locally for comparison
+class _PerThreadStdout:
+    """Route ``print`` from probe threads into per-probe buffers so their output never interleaves."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+
+    def write(self, text):
+        return self.buffers.get(threading.get_ident(), self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _buffered(stdout, fn):
+    """Wrap ``fn`` to run with its prints captured; it returns ``(result, output)``."""
+
+    def run(*args):
+        buffer = io.StringIO()
+        stdout.buffers[threading.get_ident()] = buffer
+        try:
+            return fn(*args), buffer.getvalue()
+        except Exception as e:
+            print(f"FAILED: {type(e).__name__}: {e}")
+            return False, buffer.getvalue()
+        finally:
+            del stdout.buffers[threading.get_ident()]
+
+    return run
+
+
+def run_probes(sb, serial=False):
+    """Run every sandbox probe and return ``{mode: passed}``, in probe order.
+
+    The probes share nothing but dockerd (containers and compose projects
+    have unique names), so by default they run concurrently and the suite
+    takes about as long as its slowest probe. Each probe's output is printed
+    as one block when it finishes.
+    """
+    probes = {mode: (test_network_mode, sb, mode) for mode in ["bridge", "host", "none"]}
+    probes["docker-compose-bridge"] = (test_docker_compose_egress, sb)
+    probes["docker-compose-host"] = (test_docker_compose_host_network, sb)
+
+    def probe(mode, fn, *args):
+        with span("probe", mode=mode) as probe_span:
+            passed = fn(*args)
+            probe_span.set(passed=passed)
+            return passed
+
+    if serial:
+        return {mode: probe(mode, *call) for mode, call in probes.items()}
+
+    stdout = _PerThreadStdout(sys.stdout)
+    results = {}
+    sys.stdout = stdout
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(probes)) as executor:
+            futures = {
+                executor.submit(contextvars.copy_context().run, _buffered(stdout, probe), mode, *call): mode
+                for mode, call in probes.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                results[futures[future]], output = future.result()
+                stdout.stream.write(output)
+                stdout.stream.flush()
+    finally:
+        sys.stdout = stdout.stream
+    return {mode: results[mode] for mode in probes}
+
+
+def run_local_baseline():
+    with span("local_baseline"):
+        return test_docker_compose_local()
+
+
+def print_local_header():
     print("=" * 60)
     print("TESTING DOCKER-COMPOSE LOCALLY (for comparison)")
     print("=" * 60)
-    local_result = test_docker_compose_local()
-    
-    print("\n" + "=" * 60)
-    print("TESTING IN MODAL SANDBOX")
-    print("=" * 60)
-    
-    print("\nLooking up modal.Sandbox app")
-    app = modal.App.lookup("docker-network-test", create_if_missing=True)
-    print("Creating sandbox")
-
-    with modal.enable_output():
-        sb = modal.Sandbox.create(
-            "/start-dockerd.sh",
-            timeout=60 * 60,
-            app=app,
-            image=dockerfile_image,
-            experimental_options={"enable_docker_in_gvisor": True},
-        )
-
-    # Wait for Docker to be ready
-    import time
-    for i in range(10):
-        p = sb.exec("docker", "ps")
-        p.wait()
-        if p.returncode == 0:
-            break
-        time.sleep(1)
-
-    # Pull alpine image
-    print("Pulling alpine image")
-    p = sb.exec("docker", "pull", "alpine")
-    for l in p.stdout:
-        print(l, end="")
-    p.wait()
-    
-    # Test different network modes
-    print("\nTesting Docker network modes:")
-    print("=============================")
-    
-    results = {}
-    for mode in ["bridge", "host", "none"]:
-        results[mode] = test_network_mode(sb, mode)
-    
-    # Test docker-compose with egress
-    results["docker-compose-bridge"] = test_docker_compose_egress(sb)
-    
-    # Test docker-compose with host network
-    results["docker-compose-host"] = test_docker_compose_host_network(sb)
-    
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Docker network modes inside a docker-in-gvisor sandbox")
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="run the local baseline while the sandbox is created instead of before it",
+    )
+    parser.add_argument("--serial", action="store_true", help="run the sandbox probes one after another")
+    add_arguments(parser)
+    args = parser.parse_args()
+    cache = ImageCache.from_args(args)
+    start_run("modal_docker_network_modes_test")
+
+    local_future = None
+    if args.parallel:
+        # The baseline's output is held back and printed once it finishes
+        stdout = _PerThreadStdout(sys.stdout)
+        sys.stdout = stdout
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        local_future = executor.submit(contextvars.copy_context().run, _buffered(stdout, run_local_baseline))
+        executor.shutdown(wait=False)
+    else:
+        # First test locally for comparison
+        print_local_header()
+        local_result = run_local_baseline()
+
+    try:
+        print("\n" + "=" * 60)
+        print("TESTING IN MODAL SANDBOX")
+        print("=" * 60)
+
+        print("\nLooking up modal.Sandbox app")
+        app = modal.App.lookup("docker-network-test", create_if_missing=True)
+        print("Creating sandbox")
+
+        with modal.enable_output():
+            hydrate_image(dockerfile_image, app)
+            with span("sandbox_create"):
+                sb = modal.Sandbox.create(
+                    "/start-dockerd.sh",
+                    timeout=60 * 60,
+                    app=app,
+                    image=dockerfile_image,
+                    experimental_options={"enable_docker_in_gvisor": True},
+                    **cache.sandbox_options(),
+                )
+
+        # Wait for Docker to be ready
+        ready_in = wait_for_dockerd(sb, timeout=30)
+        print(f"Docker daemon ready in {ready_in:.2f}s")
+
+        with span("workload"):
+            # Pull the images up front so concurrent probes do not each pull them
+            print("Pulling alpine and python:3.11-slim")
+            for result in cache.ensure(sb, ["alpine", "python:3.11-slim"]):
+                print(f"   {result['ref']}: {'cache hit' if result.get('hit') else 'pulled'} in {result['ms'] / 1000:.2f}s")
+
+            print("\nTesting Docker network modes:")
+            print("=============================")
+            results = run_probes(sb, serial=args.serial)
+    finally:
+        if local_future is not None:
+            local_result, output = local_future.result()
+            sys.stdout = stdout.stream
+            print()
+            print_local_header()
+            print(output, end="")
+
     # Summary
     print("\n=== SUMMARY ===")
     print(f"LOCAL docker-compose-bridge: {'PASS' if local_result else 'FAIL'} (baseline)")
     print("--- Modal Sandbox Results ---")
     for mode, passed in results.items():
         print(f"{mode}: {'PASS' if passed else 'FAIL'}")
-    
-    sb.terminate()
+
+    cache.print_summary()
+
+    with span("terminate"):
+        sb.terminate()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,112 +1,151 @@
+import argparse
 import json
 import os
-import shlex
-import textwrap
+import sys
 import time
 
 import modal
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness import manifest, merkle  # noqa: E402
+from harness.agent import SandboxAgent  # noqa: E402
+from harness.batch import run_batch  # noqa: E402
+from harness.dockerd import DockerdNotReady, wait_for_dockerd  # noqa: E402
+from harness.images import IMAGES, get_image  # noqa: E402
+from harness.output import run_logged  # noqa: E402
+from harness.pnpm_store import (  # noqa: E402
+    VolumeStore,
+    install_command,
+    install_entry,
+    prepare,
+    print_store_comparison,
+    record_store_run,
+    sandbox_runner,
+)
+from harness.remote import copy_from_sandbox, copy_to_sandbox, module_script  # noqa: E402
+from harness.stage_cache import ModalImageBackend, StageCache, hash_bytes, hash_files, stage_key  # noqa: E402
+from harness.timing import hydrate_image, span, start_run  # noqa: E402
+
 # Use the 2025.06 Modal Image Builder
 os.environ["MODAL_IMAGE_BUILDER_VERSION"] = "2025.06"
 
-# Build the Docker image with pnpm and Slidev repository
-dockerfile_image = modal.Image.from_dockerfile("./pnpm-testing/Dockerfile.pnpm")
+# Docker image with pnpm and the Slidev repository
+dockerfile_image = get_image("pnpm")
 
+LOCKFILE_PATH = "/workspace/slidev/pnpm-lock.yaml"
 
-def main():
-    print("=" * 60)
-    print("PNPM Snapshotting Bug Reproduction Test")
-    print("=" * 60)
+# Walks node_modules once and derives the counts/samples used for validation.
+# The module is stdlib-only, so its source runs unchanged inside the sandbox.
+with open(manifest.__file__, encoding="utf-8") as _fh:
+    SNAPSHOT_SCRIPT = _fh.read()
 
-    print("\n1. Looking up/creating Modal app...")
-    app = modal.App.lookup("pnpm-snapshot-test", create_if_missing=True)
+# Lockfile hash per image id; an image id names fixed contents, so it is read once
+LOCKFILE_INDEX = os.path.join(os.path.expanduser("~"), ".cache", "modal-snapshot-testing", "lockfiles.json")
 
-    print("2. Creating sandbox with Docker-in-gvisor enabled...")
-    start_time = time.time()
+# Pre-suspend Merkle trees are kept locally so a cached stage can still be diffed
+MERKLE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "modal-snapshot-testing", "merkle")
+SANDBOX_MERKLE_PATH = "/tmp/node_modules.merkle.json"
 
-    with modal.enable_output():
-        sb = modal.Sandbox.create(
-            "/start-dockerd.sh",
-            timeout=60 * 60,  # 1 hour timeout
-            app=app,
-            image=dockerfile_image,
-            experimental_options={"enable_docker_in_gvisor": True},
-        )
+# Binary manifests copied out before suspend and back in after resume
+MANIFEST_DIR = os.path.join(os.path.expanduser("~"), ".cache", "modal-snapshot-testing", "manifests")
+SANDBOX_MANIFEST_PATH = "/tmp/node_modules.manifest.bin"
 
-    print(f"   Sandbox created in {time.time() - start_time:.2f}s")
-
-    # Wait for Docker daemon to be ready
-    print("\n3. Waiting for Docker daemon to initialize...")
-    time.sleep(5)
-
-    # Verify Docker is running
-    print("4. Verifying Docker daemon status...")
-    p = sb.exec("docker", "version")
-    docker_version = p.stdout.read()
-    p.wait()
-    print(f"   Docker status: {'Running' if p.returncode == 0 else 'Failed'}")
-    if p.returncode != 0:
-        print(f"   Error: {p.stderr.read()}")
-        sb.terminate()
-        return
-
-    # Check the Slidev repo structure
-    print("\n5. Checking Slidev repository structure...")
-    p = sb.exec("ls", "-la", "/workspace/slidev")
-    print("   Repository contents:")
-    for line in p.stdout:
-        print(f"   {line}", end="")
-
-    # Count packages before install
-    print("\n6. Analyzing package.json files...")
-    p = sb.exec("find", "/workspace/slidev", "-name", "package.json", "-type", "f")
-    package_files = list(p.stdout)
-    print(f"   Found {len(package_files)} package.json files")
-
-    # Run pnpm install
-    print("\n7. Running pnpm install...")
-    install_start = time.time()
-    p = sb.exec("bash", "-c", "cd /workspace/slidev && pnpm install")
-
-    # Stream output
-    line_count = 0
-    for line in p.stdout:
-        if line_count < 20:  # Show first 20 lines
-            print(f"   {line}", end="")
-        line_count += 1
-
-    p.wait()
-    install_duration = time.time() - install_start
-
-    if p.returncode != 0:
-        print(f"   ERROR: pnpm install failed with code {p.returncode}")
-        print(f"   stderr: {p.stderr.read()}")
-    else:
-        print(f"   pnpm install completed successfully in {install_duration:.2f}s")
-        print(f"   Total output lines: {line_count}")
-
-    # Check node_modules size
-    print("\n8. Checking installed packages...")
-    p = sb.exec(
-        "bash",
-        "-c",
-        "find /workspace/slidev -name node_modules -type d | xargs du -sh 2>/dev/null | tail -5",
+
+def image_lockfile_hash(app, image):
+    """Return the hash of ``image``'s lockfile, reading it at most once per image id.
+
+    The first read uses a plain sandbox with no dockerd, so looking up the
+    stage cache never waits for Docker to start.
+    """
+    try:
+        with open(LOCKFILE_INDEX) as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        index = {}
+    if image.object_id in index:
+        return index[image.object_id]
+
+    with span("sandbox_create", purpose="lockfile"):
+        sb = modal.Sandbox.create("sleep", "infinity", timeout=10 * 60, app=app, image=image)
+    try:
+        with sb.open(LOCKFILE_PATH, "r") as f:
+            lockfile_hash = hash_bytes(f.read())
+    finally:
+        with span("terminate"):
+            sb.terminate()
+
+    index[image.object_id] = lockfile_hash
+    os.makedirs(os.path.dirname(LOCKFILE_INDEX), exist_ok=True)
+    tmp = f"{LOCKFILE_INDEX}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, LOCKFILE_INDEX)
+    return lockfile_hash
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PNPM snapshot/resume reproduction")
+    parser.add_argument(
+        "--agent",
+        action="store_true",
+        help="run validation scripts through a persistent in-sandbox agent instead of one login shell per step",
     )
-    for line in p.stdout:
-        print(f"   {line}", end="")
-
-    # Count total packages installed
-    p = sb.exec(
-        "bash",
-        "-c",
-        "find /workspace/slidev -path '*/node_modules/*' -name package.json | wc -l",
+    parser.add_argument(
+        "--no-stage-cache",
+        action="store_true",
+        help="always run pnpm install instead of resuming from a cached post-install snapshot",
     )
-    package_count = p.stdout.read().strip()
-    print(f"   Total packages installed: {package_count}")
+    parser.add_argument(
+        "--refresh-stage-cache",
+        action="store_true",
+        help="invalidate the cached post-install snapshot for the current inputs and rebuild it",
+    )
+    parser.add_argument(
+        "--pnpm-store-volume",
+        nargs="?",
+        const="pnpm-store",
+        metavar="NAME",
+        help="keep the pnpm store on this Modal Volume (default name: pnpm-store) and time cold vs warm installs",
+    )
+    parser.add_argument(
+        "--reset-pnpm-store",
+        action="store_true",
+        help="empty the store volume before installing, for a cold measurement",
+    )
+    args = parser.parse_args()
+    if args.reset_pnpm_store and not args.pnpm_store_volume:
+        parser.error("--reset-pnpm-store needs --pnpm-store-volume")
+    if args.pnpm_store_volume:
+        # Install timing is the point of this mode, so never resume from a cached install
+        args.no_stage_cache = True
+    return args
+
+
+def main():
+    args = parse_args()
+    start_run("modal_pnpm_snapshot")
 
     # Helper utilities for snapshot generation and validation
+    agents = {}
+
+    def get_agent(sb_handle):
+        if sb_handle.object_id not in agents:
+            agents[sb_handle.object_id] = SandboxAgent.start(sb_handle)
+        return agents[sb_handle.object_id]
+
+    def close_agent(sb_handle):
+        agent = agents.pop(sb_handle.object_id, None)
+        if agent is not None:
+            agent.close()
+            print(f"   Agent stats: {agent.stats}")
+
     def run_script_json(sb_handle, script, step_description, *, interpreter="python3"):
         print(f"\n{step_description}")
+        if args.agent:
+            result = get_agent(sb_handle).run_script(
+                script, interpreter=interpreter, cwd="/workspace/slidev", timeout=600
+            )
+            return report_script_result(result["returncode"], result["stdout"], result["stderr"])
         if interpreter == "python3":
             command = "cd /workspace/slidev && python3 - <<'PY'\n" + script + "\nPY\n"
         elif interpreter == "bash":
@@ -123,7 +162,9 @@ def main():
         stdout_text = proc.stdout.read()
         proc.wait()
         stderr_text = proc.stderr.read()
+        return report_script_result(proc.returncode, stdout_text, stderr_text)
 
+    def report_script_result(returncode, stdout_text, stderr_text):
         if stdout_text.strip():
             for line in stdout_text.strip().splitlines():
                 print(f"   {line}")
@@ -137,261 +178,305 @@ def main():
             except json.JSONDecodeError:
                 summary = {"raw_output": stdout_text.strip()}
 
-        if proc.returncode != 0:
-            print(f"   Command exited with code {proc.returncode}")
-
-        return proc.returncode, summary
-
-    snapshot_script = textwrap.dedent(
-        """
-        import json
-        import os
-        import subprocess
-        import sys
-
-        root = "node_modules"
-        if not os.path.isdir(root):
-            print(json.dumps({"error": "node_modules_missing"}))
-            sys.exit(1)
-
-        def run(cmd: str) -> str:
-            result = subprocess.run(["bash", "-lc", cmd], text=True, capture_output=True)
-            if result.returncode != 0:
-                raise RuntimeError(f"Command failed ({cmd}): {result.stderr.strip()}")
-            return result.stdout
-
-        def capture_count(cmd: str) -> int:
-            output = run(cmd).strip()
-            if not output:
-                return 0
-            return int(output.split()[0])
-
-        def capture_lines(cmd: str, limit: int | None = None) -> list[str]:
-            lines = [line.strip() for line in run(cmd).splitlines() if line.strip()]
-            if limit is not None:
-                return lines[:limit]
-            return lines
-
-        data = {
-            "package_json_count": capture_count(
-                "find node_modules -name package.json -type f | wc -l"
-            ),
-            "top_entries": capture_lines(
-                "find node_modules -maxdepth 1 -mindepth 1 -printf '%f\\n' | LC_ALL=C sort | head -n 25"
-            ),
-            "sample_packages": capture_lines(
-                "find node_modules/.pnpm -maxdepth 3 -name package.json -type f | LC_ALL=C sort | head -n 50"
-            ),
-            "top_entry_count": len([name for name in os.listdir(root)]),
-        }
-
-        pnpm_dir = os.path.join(root, ".pnpm")
-        if os.path.isdir(pnpm_dir):
-            data["pnpm_entries"] = capture_lines(
-                "find node_modules/.pnpm -maxdepth 1 -mindepth 1 -printf '%f\\n' | LC_ALL=C sort | head -n 25"
-            )
-            data["pnpm_entry_count"] = len([name for name in os.listdir(pnpm_dir)])
-        else:
-            data["pnpm_entries"] = []
-            data["pnpm_entry_count"] = 0
+        if returncode != 0:
+            print(f"   Command exited with code {returncode}")
 
-        with open("node_modules_snapshot.json", "w", encoding="utf-8") as fh:
-            json.dump(data, fh)
+        return returncode, summary
 
-        print(
-            json.dumps(
-                {
-                    "package_json_count": data["package_json_count"],
-                    "top_entries_sample": data["top_entries"][:5],
-                    "pnpm_entries_sample": data["pnpm_entries"][:5],
-                    "sample_package_paths": data["sample_packages"][:5],
-                    "top_entry_count": data["top_entry_count"],
-                    "pnpm_entry_count": data["pnpm_entry_count"],
-                }
-            )
-        )
-        """
-    )
+    print("=" * 60)
+    print("PNPM Snapshotting Bug Reproduction Test")
+    print("=" * 60)
 
-    snapshot_rc, snapshot_summary = run_script_json(
-        sb,
-        snapshot_script,
-        "9. Recording node_modules snapshot before suspend...",
-    )
+    print("\n1. Looking up/creating Modal app...")
+    app = modal.App.lookup("pnpm-snapshot-test", create_if_missing=True)
 
-    if snapshot_rc != 0:
-        print("   ERROR: Failed to record node_modules snapshot.")
+    # With --pnpm-store-volume the store lives on a Volume, which snapshot_filesystem does not capture
+    store = VolumeStore(args.pnpm_store_volume) if args.pnpm_store_volume else None
+    store_dir = store.path if store else None
+    store_options = store.sandbox_options() if store else {}
+    store_entry = None
+
+    with modal.enable_output():
+        hydrate_image(dockerfile_image, app)
+
+    # Look the install stage up before starting dockerd, so a hit goes straight to resume
+    stage_cache = None
+    stage_key_value = None
+    cached = None
+    if not args.no_stage_cache:
+        stage_cache = StageCache(ModalImageBackend())
+        stage_key_value = stage_key(
+            "pnpm-install",
+            dockerfile=IMAGES["pnpm"].content_hash,
+            lockfile=image_lockfile_hash(app, dockerfile_image),
+            script=hash_bytes(install_command() + "\n" + SNAPSHOT_SCRIPT),
+            # The cached entry carries a Merkle tree, whose format merkle.py defines
+            merkle=hash_files(merkle.__file__),
+        )
+        if args.refresh_stage_cache:
+            stage_cache.invalidate(stage_key_value)
+        cached = stage_cache.lookup(stage_key_value)
+        print(f"   Stage cache {'HIT' if cached else 'MISS'} for key {stage_key_value}")
+
+    sb = None
+    image = None
+    pre_tree_path = None
+    pre_manifest_path = None
+    merkle_diff = None
+    if cached is not None:
+        image, cached_metadata = cached
+        pre_tree_path = cached_metadata.get("merkle_tree_path")
+        pre_manifest_path = cached_metadata.get("manifest_path")
+        package_count = cached_metadata.get("package_count", "n/a")
+        install_duration = cached_metadata.get("install_duration", 0.0)
+        snapshot_summary = cached_metadata.get("snapshot_summary") or {}
+        print("\n2-12. Using cached post-install snapshot, skipping dockerd and install...")
+    else:
+        with modal.enable_output():
+            print("2. Creating sandbox with Docker-in-gvisor enabled...")
+            with span("sandbox_create") as create_span:
+                sb = modal.Sandbox.create(
+                    "/start-dockerd.sh",
+                    timeout=60 * 60,  # 1 hour timeout
+                    app=app,
+                    image=dockerfile_image,
+                    experimental_options={"enable_docker_in_gvisor": True},
+                    **store_options,
+                )
+
+        print(f"   Sandbox created in {create_span.duration_s:.2f}s")
+
+        # Wait for Docker daemon to be ready
+        print("\n3. Waiting for Docker daemon to initialize...")
+        try:
+            ready_in = wait_for_dockerd(sb)
+            print(f"   Docker daemon ready in {ready_in:.2f}s")
+        except DockerdNotReady as e:
+            print(f"   WARNING: {e}")
+
+        with span("workload"):
+            # Verify Docker is running
+            print("4. Verifying Docker daemon status...")
+            p = sb.exec("docker", "version")
+            docker_version = p.stdout.read()
+            p.wait()
+            print(f"   Docker status: {'Running' if p.returncode == 0 else 'Failed'}")
+            if p.returncode != 0:
+                print(f"   Error: {p.stderr.read()}")
+                sb.terminate()
+                return
+
+            # Check the Slidev repo structure
+            print("\n5. Checking Slidev repository structure...")
+            p = sb.exec("ls", "-la", "/workspace/slidev")
+            print("   Repository contents:")
+            for line in p.stdout:
+                print(f"   {line}", end="")
+
+            # Count packages before install
+            print("\n6. Analyzing package.json files...")
+            p = sb.exec("find", "/workspace/slidev", "-name", "package.json", "-type", "f")
+            package_files = list(p.stdout)
+            print(f"   Found {len(package_files)} package.json files")
+
+            if store_dir:
+                if args.reset_pnpm_store:
+                    print(f"\n6a. Emptying the pnpm store volume {args.pnpm_store_volume!r}...")
+                store_state, store_bytes_before, store_files_before = prepare(
+                    sandbox_runner(sb), store, reset=args.reset_pnpm_store
+                )
+                print(
+                    f"\n6b. pnpm store on volume {args.pnpm_store_volume!r} is {store_state} "
+                    f"({store_files_before} files, {store_bytes_before / 1e6:.0f} MB)"
+                )
+
+            # Run pnpm install
+            print("\n7. Running pnpm install...")
+            with span("pnpm_install", store=store_state if store_dir else "image") as install_span:
+                # Drain both streams into a log; only the tail is printed
+                install = run_logged(sb, "pnpm-install", "bash", "-c", install_command(store_dir))
+            install_duration = install_span.duration_s
+            install_rc = install.returncode
+            install.print_tail()
+
+            if install_rc != 0:
+                print(f"   ERROR: pnpm install failed with code {install_rc}")
+                print("   stderr: " + "\n   ".join(install.stderr_tail))
+            else:
+                print(f"   pnpm install completed successfully in {install_duration:.2f}s")
+                print(f"   Total output lines: {install.lines}")
+
+            # Check node_modules size
+            print("\n8. Checking installed packages...")
+            installed = run_batch(
+                sb,
+                {
+                    "node_modules_sizes": "find /workspace/slidev -name node_modules -type d | xargs du -sh 2>/dev/null | tail -5",
+                    "package_count": "find /workspace/slidev -path '*/node_modules/*' -name package.json | wc -l",
+                },
+            )["commands"]
+            for line in installed["node_modules_sizes"]["stdout"].splitlines():
+                print(f"   {line}")
 
-    # Check python availability to aid debugging when snapshot capture fails
-    print("\n10. Checking python3 availability inside sandbox...")
-    p = sb.exec("python3", "--version")
-    python_version = p.stdout.read().strip()
-    p.wait()
-    if python_version:
-        print(f"   python3 reports: {python_version}")
-    if p.returncode != 0:
-        print(f"   WARNING: python3 --version returned {p.returncode}")
+            # Count total packages installed
+            package_count = installed["package_count"]["stdout"].strip()
+            print(f"   Total packages installed: {package_count}")
+
+            if store_dir and install_rc == 0:
+                store_entry = install_entry(
+                    sandbox_runner(sb), store, store_state, install_duration, store_bytes_before
+                )
+                print(
+                    f"   Store now {store_entry['store_files_after']} files, "
+                    f"{store_entry['store_bytes_after'] / 1e6:.0f} MB (not captured by the snapshot); "
+                    f"node_modules {store_entry['node_modules_bytes'] / 1e6:.0f} MB"
+                )
+
+            with span("manifest_build"):
+                snapshot_rc, snapshot_summary = run_script_json(
+                    sb,
+                    SNAPSHOT_SCRIPT,
+                    "9. Recording node_modules snapshot before suspend...",
+                )
+
+            if snapshot_rc != 0:
+                print("   ERROR: Failed to record node_modules snapshot.")
+            elif snapshot_summary and snapshot_summary.get("manifest_path"):
+                os.makedirs(MANIFEST_DIR, exist_ok=True)
+                pre_manifest_path = os.path.join(MANIFEST_DIR, f"{sb.object_id}.manifest.bin")
+                manifest_size = copy_from_sandbox(
+                    sb, "/workspace/slidev/" + snapshot_summary["manifest_path"], pre_manifest_path
+                )
+                print(f"   Copied {manifest_size} byte manifest to {pre_manifest_path}")
+
+            with span("merkle_build"):
+                merkle_rc, merkle_summary = run_script_json(
+                    sb,
+                    module_script(merkle, "build", "node_modules", "--output", SANDBOX_MERKLE_PATH),
+                    "9b. Hashing node_modules into a Merkle tree before suspend...",
+                )
+            if merkle_rc == 0 and merkle_summary and "root_hash" in merkle_summary:
+                os.makedirs(MERKLE_DIR, exist_ok=True)
+                pre_tree_path = os.path.join(MERKLE_DIR, merkle_summary["root_hash"] + ".json")
+                copy_from_sandbox(sb, SANDBOX_MERKLE_PATH, pre_tree_path)
+                print(f"   Saved pre-suspend tree to {pre_tree_path}")
+            else:
+                print("   WARNING: Could not build the pre-suspend Merkle tree.")
+
+            # Check python availability to aid debugging when snapshot capture fails
+            print("\n10. Checking python3 availability inside sandbox...")
+            p = sb.exec("python3", "--version")
+            python_version = p.stdout.read().strip()
+            p.wait()
+            if python_version:
+                print(f"   python3 reports: {python_version}")
+            if p.returncode != 0:
+                print(f"   WARNING: python3 --version returned {p.returncode}")
+
+    # Don't leave the agent's exec running while the filesystem is captured
+    if sb is not None:
+        close_agent(sb)
 
     # Attempt to create a snapshot
-    print("\n11. Attempting to create filesystem snapshot (simulated suspend)...")
-    snapshot_start = time.time()
+    snapshot_start = time.monotonic()
 
     resume_sb = None
     try:
-        image = sb.snapshot_filesystem()
-        snapshot_duration = time.time() - snapshot_start
-        print(f"   SUCCESS: Snapshot created in {snapshot_duration:.2f}s")
-        print(f"   Snapshot image: {image}")
-
-        print("\n12. Terminating original sandbox before resume...")
-        sb.terminate()
-        print("    Original sandbox terminated")
-
-        print("\n13. Creating resumed sandbox from snapshot image...")
-        resume_start = time.time()
-        with modal.enable_output():
-            resume_sb = modal.Sandbox.create(
-                "bash",
-                "-lc",
-                "sleep infinity",
-                timeout=60 * 60,
-                app=app,
-                image=image,
-                experimental_options={"enable_docker_in_gvisor": True},
-            )
-        print(f"   Resumed sandbox ready in {time.time() - resume_start:.2f}s")
-
-        top_samples = snapshot_summary.get("top_entries_sample") or []
-        pnpm_samples = snapshot_summary.get("pnpm_entries_sample") or []
-        package_samples = snapshot_summary.get("sample_package_paths") or []
-
-        quoted_top = " ".join(shlex.quote(entry) for entry in top_samples)
-        quoted_pnpm = " ".join(shlex.quote(entry) for entry in pnpm_samples)
-        quoted_packages = " ".join(shlex.quote(path) for path in package_samples)
-
-        validation_script = textwrap.dedent(
-            f"""
-            cd /workspace/slidev
-            missing=0
-
-            if [ ! -d node_modules ]; then
-                echo 'missing_dir:node_modules'
-                exit 1
-            fi
-
-            top_count=$(ls node_modules | wc -l)
-            echo "top_count=${{top_count}}"
-
-            if [ -d node_modules/.pnpm ]; then
-                pnpm_count=$(ls node_modules/.pnpm | wc -l)
-                echo "pnpm_count=${{pnpm_count}}"
-            else
-                echo 'pnpm_missing_dir:true'
-                pnpm_count=0
-                missing=1
-            fi
-
-            for entry in {quoted_top}; do
-                if [ "$entry" != "" ] && [ ! -e "node_modules/$entry" ]; then
-                    echo "missing_top:$entry"
-                    missing=1
-                fi
-            done
-
-            if [ $pnpm_count -gt 0 ]; then
-                for entry in {quoted_pnpm}; do
-                    if [ "$entry" != "" ] && [ ! -e "node_modules/.pnpm/$entry" ]; then
-                        echo "missing_pnpm:$entry"
-                        missing=1
-                    fi
-                done
-            fi
-
-            for entry in {quoted_packages}; do
-                if [ "$entry" != "" ] && [ ! -e "$entry" ]; then
-                    echo "missing_package:$entry"
-                    missing=1
-                fi
-            done
-
-            exit $missing
-            """
-        )
-
-        validation_rc, validation_summary = run_script_json(
-            resume_sb,
-            validation_script,
-            "14. Validating node_modules snapshot after resume...",
-            interpreter="bash",
-        )
-
-        if validation_summary and "raw_output" in validation_summary:
-            raw_lines = [line.strip() for line in validation_summary["raw_output"].splitlines() if line.strip()]
-            parsed_summary: dict[str, object] = {
-                "expected_package_json_count": snapshot_summary.get("package_json_count"),
-                "tracked_top_entries": len(top_samples),
-                "tracked_pnpm_entries": len(pnpm_samples),
-                "tracked_sample_packages": len(package_samples),
-                "missing_top_entries": [],
-                "missing_pnpm_entries": [],
-                "missing_sample_packages": [],
-                "present_top_entries": len(top_samples),
-                "present_pnpm_entries": len(pnpm_samples),
-                "present_sample_packages": len(package_samples),
-                "expected_top_entry_count": snapshot_summary.get("top_entry_count"),
-                "expected_pnpm_entry_count": snapshot_summary.get("pnpm_entry_count"),
-                "current_top_entry_count": 0,
-                "current_pnpm_entry_count": 0,
-            }
-
-            for line in raw_lines:
-                if line.startswith("top_count="):
-                    parsed_summary["current_top_entry_count"] = int(line.split("=", 1)[1])
-                elif line.startswith("pnpm_count="):
-                    parsed_summary["current_pnpm_entry_count"] = int(line.split("=", 1)[1])
-                elif line.startswith("missing_top:"):
-                    entry = line.split(":", 1)[1]
-                    parsed_summary["missing_top_entries"].append(entry)
-                    parsed_summary["present_top_entries"] = int(parsed_summary["present_top_entries"]) - 1
-                elif line.startswith("missing_pnpm:"):
-                    entry = line.split(":", 1)[1]
-                    parsed_summary["missing_pnpm_entries"].append(entry)
-                    parsed_summary["present_pnpm_entries"] = int(parsed_summary["present_pnpm_entries"]) - 1
-                elif line.startswith("missing_package:"):
-                    entry = line.split(":", 1)[1]
-                    parsed_summary["missing_sample_packages"].append(entry)
-                    parsed_summary["present_sample_packages"] = int(parsed_summary["present_sample_packages"]) - 1
-                elif line.startswith("missing_dir:"):
-                    entry = line.split(":", 1)[1]
-                    parsed_summary.setdefault("missing_top_entries", []).append(entry)
-                elif line.startswith("pnpm_missing_dir:"):
-                    parsed_summary.setdefault("missing_pnpm_entries", []).append(".pnpm")
-
-            validation_summary = parsed_summary
-
-        if validation_rc != 0:
-            print("   ERROR: Node_modules integrity mismatch detected after resume.")
-
-        print("\n14b. Attempting pnpm install --offline inside resumed sandbox...")
-        offline_cmd = "cd /workspace/slidev && pnpm install --offline"
-        offline_proc = resume_sb.exec("bash", "-lc", offline_cmd)
-        offline_stdout = [line.strip() for line in offline_proc.stdout]
-        offline_proc.wait()
-        offline_stderr = offline_proc.stderr.read().strip()
-
-        for line in offline_stdout[:20]:
-            print(f"   {line}")
-        if offline_stderr:
-            print(f"   stderr: {offline_stderr}")
-        if offline_proc.returncode != 0:
-            print(
-                "   pnpm install --offline FAILED (this indicates missing modules after resume)."
-            )
-            validation_rc = validation_rc if validation_rc != 0 else offline_proc.returncode
+        if cached is None:
+            print("\n11. Attempting to create filesystem snapshot (simulated suspend)...")
+            with span("snapshot_filesystem") as snapshot_span:
+                image = sb.snapshot_filesystem()
+            snapshot_duration = snapshot_span.duration_s
+            print(f"   SUCCESS: Snapshot created in {snapshot_duration:.2f}s")
+            print(f"   Snapshot image: {image}")
+
+            if stage_cache is not None and install_rc == 0 and snapshot_rc == 0:
+                stage_cache.store(
+                    stage_key_value,
+                    image,
+                    {
+                        "package_count": package_count,
+                        "install_duration": install_duration,
+                        "snapshot_duration": snapshot_duration,
+                        "snapshot_summary": snapshot_summary,
+                        "merkle_tree_path": pre_tree_path,
+                        "manifest_path": pre_manifest_path,
+                    },
+                )
+                print(f"   Stored snapshot in stage cache under {stage_key_value}")
+
+            print("\n12. Terminating original sandbox before resume...")
+            with span("terminate"):
+                sb.terminate()
+            print("    Original sandbox terminated")
         else:
-            print("   pnpm install --offline succeeded.")
+            snapshot_duration = cached_metadata.get("snapshot_duration", 0.0)
+            print(f"\n11. Reusing cached snapshot image: {image}")
+
+        with span("resume"):
+            print("\n13. Creating resumed sandbox from snapshot image...")
+            with modal.enable_output(), span("sandbox_create", from_snapshot=True) as resume_create_span:
+                resume_sb = modal.Sandbox.create(
+                    "bash",
+                    "-lc",
+                    "sleep infinity",
+                    timeout=60 * 60,
+                    app=app,
+                    image=image,
+                    experimental_options={"enable_docker_in_gvisor": True},
+                    **store_options,
+                )
+            print(f"   Resumed sandbox ready in {resume_create_span.duration_s:.2f}s")
+
+            if pre_manifest_path and os.path.exists(pre_manifest_path):
+                # Ship the full binary manifest in; passing entries as argv only scales to a few dozen
+                with span("manifest_verify"):
+                    copy_to_sandbox(pre_manifest_path, resume_sb, SANDBOX_MANIFEST_PATH)
+                    validation_rc, validation_summary = run_script_json(
+                        resume_sb,
+                        module_script(manifest, "verify", SANDBOX_MANIFEST_PATH, "node_modules"),
+                        "14. Validating every node_modules manifest entry after resume...",
+                    )
+                if validation_summary and "raw_output" not in validation_summary:
+                    validation_summary["expected_package_json_count"] = snapshot_summary.get("package_json_count")
+            else:
+                print("\n14. Skipping manifest validation (no pre-suspend manifest available).")
+                validation_rc, validation_summary = 1, None
+
+            if validation_rc != 0:
+                print("   ERROR: Node_modules integrity mismatch detected after resume.")
+
+            if pre_tree_path and os.path.exists(pre_tree_path):
+                with span("merkle_check"):
+                    copy_to_sandbox(pre_tree_path, resume_sb, SANDBOX_MERKLE_PATH)
+                    merkle_rc, merkle_diff = run_script_json(
+                        resume_sb,
+                        module_script(merkle, "check", SANDBOX_MERKLE_PATH, "node_modules"),
+                        "14a. Diffing node_modules against the pre-suspend Merkle tree...",
+                    )
+                if merkle_rc != 0:
+                    print("   ERROR: Merkle tree differs from the pre-suspend tree.")
+                    validation_rc = validation_rc if validation_rc != 0 else merkle_rc
+            else:
+                print("\n14a. Skipping Merkle diff (no pre-suspend tree available).")
+
+            print("\n14b. Attempting pnpm install --offline inside resumed sandbox...")
+            offline_cmd = install_command(store_dir, offline=True)
+            with span("pnpm_offline"):
+                offline = run_logged(resume_sb, "pnpm-offline", "bash", "-lc", offline_cmd)
+
+            offline.print_tail()
+            if offline.stderr_tail:
+                print("   stderr: " + "\n   ".join(offline.stderr_tail))
+            if offline.returncode != 0:
+                print(
+                    "   pnpm install --offline FAILED (this indicates missing modules after resume)."
+                )
+                validation_rc = validation_rc if validation_rc != 0 else offline.returncode
+            else:
+                print("   pnpm install --offline succeeded.")
     except Exception as e:
-        snapshot_duration = time.time() - snapshot_start
+        snapshot_duration = time.monotonic() - snapshot_start
         print(f"   FAILED: Snapshot or resume failed after {snapshot_duration:.2f}s")
         print(f"   Error: {str(e)}")
         print(f"   Error type: {type(e).__name__}")
@@ -399,14 +484,17 @@ def main():
         validation_rc = -1
     finally:
         if resume_sb is not None:
+            close_agent(resume_sb)
             print("\n15. Terminating resumed sandbox...")
-            resume_sb.terminate()
+            with span("terminate"):
+                resume_sb.terminate()
             print("    Resumed sandbox terminated")
 
     # Clean up
-    if 'image' not in locals():
+    if image is None:
         print("\nCleanup: Terminating sandbox...")
-        sb.terminate()
+        with span("terminate"):
+            sb.terminate()
         print("    Sandbox terminated")
 
     # Summary
@@ -417,14 +505,23 @@ def main():
     print("Package manager: pnpm")
     print(f"Packages installed: {package_count}")
     print(f"Install duration: {install_duration:.2f}s")
-    print(f"Snapshot attempt: {'SUCCESS' if 'image' in locals() else 'FAILED'}")
-    if 'image' in locals():
+    if store_entry is not None:
+        print_store_comparison(record_store_run(store_entry), store.name)
+    print(f"Snapshot attempt: {'SUCCESS' if image is not None else 'FAILED'}")
+    if cached is not None:
+        print("Stage cache: HIT (install and snapshot numbers are from the cached run)")
+    if image is not None:
         print(f"Snapshot duration: {snapshot_duration:.2f}s")
     if snapshot_summary:
         print(
             "Package.json count before suspend: "
             f"{snapshot_summary.get('package_json_count', 'n/a')}"
         )
+        print(
+            "Manifest entries before suspend: "
+            f"{snapshot_summary.get('entry_count', 'n/a')} "
+            f"(walked in {snapshot_summary.get('walk_seconds', 'n/a')}s)"
+        )
         top_sample = snapshot_summary.get("top_entries_sample") or []
         if top_sample:
             print(
@@ -469,6 +566,19 @@ def main():
             print("Missing sampled package.json files:")
             for entry in validation_summary["missing_sample_packages"][:5]:
                 print(f"  - {entry}")
+    if merkle_diff and "identical" in merkle_diff:
+        if merkle_diff["identical"]:
+            print("Merkle diff after resume: identical")
+        else:
+            print(
+                "Merkle diff after resume: "
+                f"{merkle_diff['missing_count']} missing ({merkle_diff['missing_files']} files), "
+                f"{merkle_diff['changed_count']} changed, {merkle_diff['added_count']} added "
+                f"({merkle_diff['visited_dirs']} directories visited)"
+            )
+            for label in ("missing", "changed", "added"):
+                for node in merkle_diff[label][:10]:
+                    print(f"  {label}: node_modules/{node['path']} ({node['kind']}, {node['files']} files)")
     if 'validation_rc' in locals():
         print(f"Node_modules validation: {'PASS' if validation_rc == 0 else 'FAIL'}")
     print("=" * 60)
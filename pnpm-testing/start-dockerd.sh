@@ -22,4 +22,13 @@ echo 1 > /proc/sys/net/ipv4/ip_forward
 iptables-legacy -t nat -A POSTROUTING -o "$dev" -j SNAT --to-source "$addr" -p tcp
 iptables-legacy -t nat -A POSTROUTING -o "$dev" -j SNAT --to-source "$addr" -p udp
 
-exec /usr/bin/dockerd --iptables=false --ip6tables=false -D
\ No newline at end of file
+# Optional pull-through registry mirror, e.g. a registry:2 proxy cache
+mirror_args=()
+if [ -n "${DOCKER_REGISTRY_MIRROR:-}" ]; then
+    mirror_args+=(--registry-mirror "$DOCKER_REGISTRY_MIRROR")
+    case "$DOCKER_REGISTRY_MIRROR" in
+        http://*) mirror_args+=(--insecure-registry "${DOCKER_REGISTRY_MIRROR#http://}") ;;
+    esac
+fi
+
+exec /usr/bin/dockerd --iptables=false --ip6tables=false -D "${mirror_args[@]}"
\ No newline at end of file
@@ -1,97 +1,34 @@
+import argparse
+import asyncio
 import os
 import sys
 import time
 
 import modal
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness.dockerd import wait_for_dockerd, wait_for_dockerd_async  # noqa: E402
+from harness.imagecache import ImageCache, add_arguments  # noqa: E402
+from harness.images import get_image  # noqa: E402
+from harness.pool import SandboxPool, SandboxSpec  # noqa: E402
+from harness.stats import SPRT, rate_summary  # noqa: E402
+from harness.timing import hydrate_image, hydrate_image_async, span, start_run  # noqa: E402
+
 # Use the 2025.06 Modal Image Builder which avoids the need to install Modal client
 # dependencies into the container image.
 
 os.environ["MODAL_IMAGE_BUILDER_VERSION"] = "2025.06"
 
-# Here's a basic Dockerfile that installs docker with buildx and ensures
-# that the docker daemon is started with the correct network configuration
-# upon modal.Sandbox startup.
-
-dockerfile_content = """
-FROM ubuntu:22.04
-
-ENV DEBIAN_FRONTEND="noninteractive"
-RUN apt-get update
-RUN apt-get install -y docker.io
-
-# Install docker-buildx (non-legacy build system) and docker-compose
-RUN apt-get update
-RUN apt-get install ca-certificates curl
-RUN install -m 0755 -d /etc/apt/keyrings
-RUN curl -fsSL https://download.docker.com/linux/ubuntu/gpg -o /etc/apt/keyrings/docker.asc
-RUN chmod a+r /etc/apt/keyrings/docker.asc
-# Add the repository to Apt sources:
-RUN echo \
-  "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/linux/ubuntu \
-  $(. /etc/os-release && echo "${UBUNTU_CODENAME:-$VERSION_CODENAME}") stable" | \
-  tee /etc/apt/sources.list.d/docker.list > /dev/null
-RUN apt-get update
-RUN apt-get install docker-buildx-plugin
-RUN apt-get install docker-compose-plugin
-RUN mkdir /build
-
-
-# Start docker daemon
-COPY start-dockerd.sh .
-"""
-
-start_dockerd_sh_content = """#!/bin/bash
-set -xe -o pipefail
-
-dev=$(ip route show default | awk '/default/ {print $5}')
-if [ -z "$dev" ]; then
-    echo "Error: No default device found."
-    ip route show
-    exit 1
-else
-    echo "Default device: $dev"
-fi
-addr=$(ip addr show dev "$dev" | grep -w inet | awk '{print $2}' | cut -d/ -f1)
-if [ -z "$addr" ]; then
-    echo "Error: No IP address found for device $dev."
-    ip addr show dev "$dev"
-    exit 1
-else
-    echo "IP address for $dev: $addr"
-fi
-
-echo 1 > /proc/sys/net/ipv4/ip_forward
-iptables-legacy -t nat -A POSTROUTING -o "$dev" -j SNAT --to-source "$addr" -p tcp
-iptables-legacy -t nat -A POSTROUTING -o "$dev" -j SNAT --to-source "$addr" -p udp
-
-exec /usr/bin/dockerd --iptables=false --ip6tables=false -D"""
-
-# Write the Dockerfile content to a local file.
-with open("Dockerfile.docker_in_gvisor", "w") as dockerfile:
-    dockerfile.write(dockerfile_content)
-
-# Write the start-dockerd.sh content to a local file.
-with open("start-dockerd.sh", "w") as start_dockerd_sh:
-    start_dockerd_sh.write(start_dockerd_sh_content)
-os.chmod("start-dockerd.sh", 0o755)
-
-
-dockerfile_image = modal.Image.from_dockerfile("Dockerfile.docker_in_gvisor")
-
-
-def setup_and_run_docker_image(sb):
+dockerfile_image = get_image("docker_in_gvisor")
+
+
+def setup_and_run_docker_image(sb, cache):
     """Pull and run a pre-built Docker image."""
     # Use a pre-built image instead of building one
     print("Pulling pre-built Docker image (hello-world)")
-    p = sb.exec("docker", "pull", "hello-world")
-    for l in p.stdout:
-        print(l, end="")
-    p.wait()
+    for result in cache.ensure(sb, ["hello-world"]):
+        print(f"   {result['ref']}: {'cache hit' if result.get('hit') else 'pulled'} in {result['ms'] / 1000:.2f}s")
     print("--------------------------------")
-    if p.returncode != 0:
-        print(p.stderr.read())
-        raise Exception("Docker pull failed")
 
     # Run the Docker image once to verify it works
     print("Running Docker image")
@@ -109,7 +46,8 @@ def attempt_snapshot(sb, iteration):
     print("Creating snapshot")
 
     try:
-        image = sb.snapshot_filesystem()
+        with span("snapshot_filesystem"):
+            image = sb.snapshot_filesystem()
         print("Snapshot created")
         print(image)
         return True, None
@@ -121,73 +59,347 @@ def attempt_snapshot(sb, iteration):
         return False, str(e)
 
 
+async def setup_and_run_docker_image_async(sb, prefix, cache):
+    """Async variant of setup_and_run_docker_image for concurrent iterations."""
+    print(f"{prefix} Pulling pre-built Docker image (hello-world)")
+    await cache.ensure_async(sb, ["hello-world"], name=f"{prefix} docker-pull")
+
+    print(f"{prefix} Running Docker image")
+    p = await sb.exec.aio("docker", "run", "--rm", "hello-world")
+    await p.stdout.read.aio()
+    await p.wait.aio()
+    if p.returncode != 0:
+        stderr = await p.stderr.read.aio()
+        raise Exception(f"Docker run failed: {stderr}")
+
+
+async def attempt_snapshot_async(sb, prefix):
+    """Async variant of attempt_snapshot."""
+    print(f"{prefix} Creating snapshot")
+    try:
+        with span("snapshot_filesystem"):
+            image = await sb.snapshot_filesystem.aio()
+        print(f"{prefix} Snapshot created: {image}")
+        return True, None
+    except modal.exception.ExecutionError as e:
+        print(f"{prefix} Snapshot failed: {e}")
+        return False, str(e)
+    except Exception as e:
+        print(f"{prefix} Unexpected error: {e}")
+        return False, str(e)
+
+
+async def run_iteration_async(app, iteration, semaphore, cache, sprt=None):
+    """Run one create / pull / snapshot / terminate round, bounded by semaphore.
+
+    Returns None without creating a sandbox if ``sprt`` has already decided.
+    """
+    async with semaphore:
+        if sprt is not None and sprt.decision is not None:
+            return None
+        prefix = f"[iteration {iteration}]"
+        sb = None
+        with span("iteration", iteration=iteration) as iteration_span:
+            try:
+                print(f"{prefix} Creating new sandbox")
+                with span("sandbox_create"):
+                    sb = await modal.Sandbox.create.aio(
+                        "/start-dockerd.sh",
+                        timeout=60 * 60,
+                        app=app,
+                        image=dockerfile_image,
+                        experimental_options={"enable_docker_in_gvisor": True},
+                        **cache.sandbox_options(),
+                    )
+
+                ready_in = await wait_for_dockerd_async(sb)
+                print(f"{prefix} Docker daemon ready in {ready_in:.2f}s")
+
+                with span("workload"):
+                    await setup_and_run_docker_image_async(sb, prefix, cache)
+
+                success, error_msg = await attempt_snapshot_async(sb, prefix)
+            except Exception as e:
+                # A setup failure in one iteration must not cancel its siblings.
+                print(f"{prefix} Setup failed: {e}")
+                success, error_msg = False, f"setup failed: {e}"
+            finally:
+                if sb is not None:
+                    with span("terminate"):
+                        try:
+                            await sb.terminate.aio()
+                            print(f"{prefix} Sandbox terminated")
+                        except Exception as e:
+                            print(f"{prefix} Error terminating sandbox: {e}")
+            iteration_span.set(success=success)
+
+        if sprt is not None:
+            record_outcome(sprt, success)
+            report_progress(sprt, prefix)
+        return success, error_msg, iteration_timing(iteration, iteration_span, success)
+
+
+async def run_iterations_async(iterations, concurrency, cache, sprt=None, results=None):
+    """Run all iterations concurrently with at most `concurrency` live sandboxes.
+
+    With ``sprt``, iterations still queued once it decides are skipped; those
+    already running finish and are counted. Each finished iteration is
+    appended to ``results`` as it completes, so an interrupted run keeps them.
+    """
+    results = [] if results is None else results
+    print("Looking up modal.Sandbox app")
+    app = await modal.App.lookup.aio("docker-demo", create_if_missing=True)
+    await hydrate_image_async(dockerfile_image, app)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(iteration):
+        result = await run_iteration_async(app, iteration, semaphore, cache, sprt)
+        if result is not None:
+            results.append(result)
+
+    await asyncio.gather(*(run_one(i) for i in range(1, iterations + 1)))
+    return results
+
+
+def make_sprt(args):
+    return SPRT.around(args.target_rate, args.delta, alpha=1 - args.confidence, beta=1 - args.confidence)
+
+
+def record_outcome(sprt, success):
+    """Feed one iteration to the test; the rate under test is the failure rate."""
+    if sprt is not None:
+        sprt.update(not success)
+
+
+def report_progress(sprt, prefix=""):
+    confidence = 1 - sprt.alpha
+    low, high = rate_summary(sprt.k, sprt.n, confidence)["wilson"]
+    state = f"decided: failure rate {sprt.decision} target" if sprt.decision else "continuing"
+    print(f"{prefix} failures {sprt.k}/{sprt.n}, {confidence:.0%} Wilson [{low:.0%}, {high:.0%}], LLR {sprt.llr:+.2f} ({state})".lstrip())
+
+
+def iteration_timing(iteration, iteration_span, success):
+    """Flatten an iteration span into the row printed by print_timings."""
+    timing = {"iteration": iteration, "total": iteration_span.duration_s, "success": success}
+    timing.update(iteration_span.phase_durations())
+    return timing
+
+
+def print_timings(timings):
+    """Print per-iteration phase timings as a table."""
+    if not timings:
+        return
+    phases = ["sandbox_create", "dockerd_ready", "workload", "snapshot_filesystem", "terminate", "total"]
+    columns = ["create", "dockerd", "workload", "snapshot", "terminate", "total"]
+    print("\nPer-iteration timings (seconds):")
+    header = f"{'iter':>5} {'result':>7} " + " ".join(f"{column:>10}" for column in columns)
+    print(header)
+    for timing in timings:
+        cells = []
+        for phase in phases:
+            value = timing.get(phase)
+            cells.append(f"{value:>10.2f}" if value is not None else f"{'-':>10}")
+        result = "ok" if timing["success"] else "FAIL"
+        print(f"{timing['iteration']:>5} {result:>7} " + " ".join(cells))
+
+
 def main():
     # Parse command line arguments
-    iterations = 10  # Default
-    if len(sys.argv) > 1:
-        try:
-            iterations = int(sys.argv[1])
-        except ValueError:
-            print(f"Invalid number of iterations: {sys.argv[1]}")
-            sys.exit(1)
-
-    print(f"Running {iterations} iterations of snapshot testing")
+    parser = argparse.ArgumentParser(description="Repeated docker-in-gvisor snapshot testing")
+    parser.add_argument(
+        "iterations", nargs="?", type=int, default=10, help="number of iterations, the maximum with --adaptive (default: 10)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="run iterations with the async Modal API, at most N sandboxes at a time",
+    )
+    parser.add_argument(
+        "--warm",
+        type=int,
+        default=0,
+        help="keep N dockerd-ready sandboxes warm in the background (sequential mode)",
+    )
+    parser.add_argument(
+        "--attach",
+        metavar="NAME",
+        help="run every iteration on the long-lived sandbox NAME, reusing it across invocations (sequential mode)",
+    )
+    parser.add_argument("--detach", metavar="NAME", help="terminate and forget the long-lived sandbox NAME, then exit")
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="stop as soon as a sequential probability ratio test decides the failure rate against --target-rate",
+    )
+    parser.add_argument("--target-rate", type=float, default=0.5, help="failure rate to test against (default: 0.5)")
+    parser.add_argument(
+        "--delta",
+        type=float,
+        default=0.3,
+        help="half-width of the indifference region around the target (default: 0.3)",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="interval confidence; 1 - confidence is also each SPRT error rate (default: 0.95)",
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.detach:
+        SandboxPool(None, size=0).detach(args.detach)
+        print(f"Detached {args.detach}")
+        return
+    iterations = args.iterations
+    start_run("modal_docker_example_snapshot_iterations")
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.concurrency is not None and (args.warm or args.attach):
+        parser.error("--warm and --attach only apply to sequential mode")
+    if args.warm and args.attach:
+        parser.error("--warm and --attach are mutually exclusive")
+    if not 0 < args.target_rate < 1 or not 0 < args.delta < 1 or not 0.5 < args.confidence < 1:
+        parser.error("--target-rate and --delta must be in (0, 1) and --confidence in (0.5, 1)")
+    cache = ImageCache.from_args(args)
+    sprt = make_sprt(args)
+
+    print(f"Running {'up to ' if args.adaptive else ''}{iterations} iterations of snapshot testing")
+    if args.adaptive:
+        print(f"Stopping when SPRT decides failure rate <= {sprt.p0:.0%} or >= {sprt.p1:.0%}")
+    if args.concurrency is not None:
+        print(f"Async mode, concurrency {args.concurrency}")
     print("=" * 50)
 
     # Statistics tracking
     successes = 0
     failures = 0
     failure_messages = []
+    timings = []
+    run_start = time.perf_counter()
+
+    if args.concurrency is not None:
+        results = []
+        try:
+            asyncio.run(
+                run_iterations_async(iterations, args.concurrency, cache, sprt if args.adaptive else None, results)
+            )
+        except KeyboardInterrupt:
+            # Iterations that finished before the interrupt are already in results
+            print("\n\nInterrupted by user")
+        for success, error_msg, timing in sorted(results, key=lambda result: result[2]["iteration"]):
+            if not args.adaptive:
+                record_outcome(sprt, success)
+            if success:
+                successes += 1
+            else:
+                failures += 1
+                failure_messages.append(f"Iteration {timing['iteration']}: {error_msg}")
+            timings.append(timing)
+        print_summary(successes, failures, failure_messages, timings, time.perf_counter() - run_start, sprt, iterations)
+        cache.print_summary()
+        return
 
     print("Looking up modal.Sandbox app")
     app = modal.App.lookup("docker-demo", create_if_missing=True)
+    with modal.enable_output():
+        hydrate_image(dockerfile_image, app)
+
+    pool = None
+    spec = SandboxSpec(
+        "docker_in_gvisor",
+        dockerfile_image,
+        experimental_options={"enable_docker_in_gvisor": True},
+        **cache.sandbox_options(),
+    )
+    if args.warm:
+        pool = SandboxPool(app, size=args.warm)
+        pool.fill(spec)
+    elif args.attach:
+        pool = SandboxPool(app, size=0)
 
     try:
         # Run multiple iterations of create sandbox / snapshot filesystem
         for i in range(1, iterations + 1):
-            # For iterations after the first, create a new sandbox
-            print(f"\nCreating new sandbox for iteration {i}")
-            with modal.enable_output():
-                sb = modal.Sandbox.create(
-                    "/start-dockerd.sh",
-                    timeout=60 * 60,
-                    app=app,
-                    image=dockerfile_image,
-                    experimental_options={"enable_docker_in_gvisor": True},
-                )
-
-            # Wait a moment for Docker daemon to fully initialize
-            print("Waiting for Docker daemon to initialize")
-            time.sleep(10)
-
-            # Pull and run the Docker image again (it should be fast since it's small)
-            setup_and_run_docker_image(sb)
-
-            # Attempt snapshot
-            success, error_msg = attempt_snapshot(sb, i)
-
-            if success:
-                successes += 1
-            else:
-                failures += 1
-                failure_messages.append(f"Iteration {i}: {error_msg}")
-
-            # Terminate sandbox after each iteration
-            try:
-                sb.terminate()
-                print("Sandbox terminated")
-            except Exception as e:
-                print(f"Error terminating sandbox: {e}")
+            with span("iteration", iteration=i) as iteration_span:
+                if args.attach:
+                    print(f"\nUsing long-lived sandbox {args.attach} for iteration {i}")
+                    # Re-attaches by id; a sandbox that has exited is replaced
+                    with span("sandbox_create", attached=True):
+                        sb = pool.attach(args.attach, spec)
+                elif pool is not None:
+                    print(f"\nAcquiring warm sandbox for iteration {i}")
+                    # Only replace the sandbox if a later iteration will use it
+                    with span("sandbox_create", pooled=True):
+                        sb = pool.acquire(spec, replenish=iterations - i >= pool.size)
+                else:
+                    # For iterations after the first, create a new sandbox
+                    print(f"\nCreating new sandbox for iteration {i}")
+                    with modal.enable_output(), span("sandbox_create"):
+                        sb = modal.Sandbox.create(
+                            "/start-dockerd.sh",
+                            timeout=60 * 60,
+                            app=app,
+                            image=dockerfile_image,
+                            experimental_options={"enable_docker_in_gvisor": True},
+                            **cache.sandbox_options(),
+                        )
+
+                    # Wait for the Docker daemon to answer on its socket
+                    print("Waiting for Docker daemon to initialize")
+                    ready_in = wait_for_dockerd(sb)
+                    print(f"Docker daemon ready in {ready_in:.2f}s")
+
+                # Pull and run the Docker image again (it should be fast since it's small)
+                with span("workload"):
+                    setup_and_run_docker_image(sb, cache)
+
+                # Attempt snapshot
+                success, error_msg = attempt_snapshot(sb, i)
+
+                if success:
+                    successes += 1
+                else:
+                    failures += 1
+                    failure_messages.append(f"Iteration {i}: {error_msg}")
+                record_outcome(sprt, success)
+                report_progress(sprt)
+
+                # Terminate sandbox after each iteration; an attached one outlives the run
+                if not args.attach:
+                    with span("terminate"):
+                        try:
+                            sb.terminate()
+                            print("Sandbox terminated")
+                        except Exception as e:
+                            print(f"Error terminating sandbox: {e}")
+                iteration_span.set(success=success)
+            timings.append(iteration_timing(i, iteration_span, success))
+            if args.adaptive and sprt.decision is not None:
+                print(f"\nStopping early after {i} of {iterations} iterations")
+                break
 
             # Small delay between iterations
-            if i < iterations:
+            if i < iterations and pool is None:
                 time.sleep(2)
 
     except KeyboardInterrupt:
         print("\n\nInterrupted by user")
     except Exception:
         raise
+    finally:
+        if pool is not None:
+            pool.close()
+            print(pool.summary())
+        if args.attach:
+            print(f"Sandbox {args.attach} is still running; --detach {args.attach} terminates it")
 
+    print_summary(successes, failures, failure_messages, timings, time.perf_counter() - run_start, sprt, iterations)
+    cache.print_summary()
+
+
+def print_summary(successes, failures, failure_messages, timings, wall_clock, sprt=None, planned=None):
     # Print statistics
     total = successes + failures
     if total == 0:
@@ -202,12 +414,26 @@ def main():
     print(f"Total iterations: {total}")
     print(f"Successes: {successes} ({successes/total*100:.1f}%)")
     print(f"Failures: {failures} ({failures/total*100:.1f}%)")
+    confidence = 1 - sprt.alpha if sprt is not None else 0.95
+    summary = rate_summary(failures, total, confidence)
+    wilson, exact = summary["wilson"], summary["clopper_pearson"]
+    print(f"Failure rate {confidence:.0%} CI: Wilson [{wilson[0]:.1%}, {wilson[1]:.1%}], Clopper-Pearson [{exact[0]:.1%}, {exact[1]:.1%}]")
+    if sprt is not None:
+        if sprt.decision is None:
+            print(f"SPRT: undecided between <= {sprt.p0:.0%} and >= {sprt.p1:.0%} failure rate (LLR {sprt.llr:+.2f})")
+        else:
+            bound = f">= {sprt.p1:.0%}" if sprt.decision == "above" else f"<= {sprt.p0:.0%}"
+            print(f"SPRT: failure rate {bound} (decided after {sprt.decided_at} iterations, {total} of {planned} run)")
+
+    print(f"Wall clock: {wall_clock:.1f}s")
 
     if failure_messages:
         print("\nFailure details:")
         for msg in failure_messages:
             print(f"  - {msg}")
 
+    print_timings(timings)
+
 
 if __name__ == "__main__":
     main()
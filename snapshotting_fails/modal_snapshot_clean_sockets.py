@@ -1,123 +1,66 @@
 import os
+import sys
 
 import modal
 
-os.environ["MODAL_IMAGE_BUILDER_VERSION"] = "2025.06"
-
-dockerfile_content = """
-FROM ubuntu:22.04
-
-ENV DEBIAN_FRONTEND="noninteractive"
-RUN apt-get update
-RUN apt-get install -y docker.io
-
-# Install docker-buildx (non-legacy build system) and docker-compose
-RUN apt-get update
-RUN apt-get install ca-certificates curl
-RUN install -m 0755 -d /etc/apt/keyrings
-RUN curl -fsSL https://download.docker.com/linux/ubuntu/gpg -o /etc/apt/keyrings/docker.asc
-RUN chmod a+r /etc/apt/keyrings/docker.asc
-# Add the repository to Apt sources:
-RUN echo \
-  "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/linux/ubuntu \
-  $(. /etc/os-release && echo "${UBUNTU_CODENAME:-$VERSION_CODENAME}") stable" | \
-  tee /etc/apt/sources.list.d/docker.list > /dev/null
-RUN apt-get update
-RUN apt-get install docker-buildx-plugin
-RUN apt-get install docker-compose-plugin
-RUN mkdir /build
-
-
-# Start docker daemon
-COPY start-dockerd.sh .
-"""
-
-start_dockerd_sh_content = """#!/bin/bash
-set -xe -o pipefail
-
-dev=$(ip route show default | awk '/default/ {print $5}')
-if [ -z "$dev" ]; then
-    echo "Error: No default device found."
-    ip route show
-    exit 1
-else
-    echo "Default device: $dev"
-fi
-addr=$(ip addr show dev "$dev" | grep -w inet | awk '{print $2}' | cut -d/ -f1)
-if [ -z "$addr" ]; then
-    echo "Error: No IP address found for device $dev."
-    ip addr show dev "$dev"
-    exit 1
-else
-    echo "IP address for $dev: $addr"
-fi
-
-echo 1 > /proc/sys/net/ipv4/ip_forward
-iptables-legacy -t nat -A POSTROUTING -o "$dev" -j SNAT --to-source "$addr" -p tcp
-iptables-legacy -t nat -A POSTROUTING -o "$dev" -j SNAT --to-source "$addr" -p udp
-
-exec /usr/bin/dockerd --iptables=false --ip6tables=false -D"""
-
-# Write the Dockerfile content to a local file.
-with open("Dockerfile.docker_in_gvisor", "w") as dockerfile:
-    dockerfile.write(dockerfile_content)
-
-# Write the start-dockerd.sh content to a local file.
-with open("start-dockerd.sh", "w") as start_dockerd_sh:
-    start_dockerd_sh.write(start_dockerd_sh_content)
-os.chmod("start-dockerd.sh", 0o755)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness.images import get_image  # noqa: E402
+from harness.sockets import inventory_sockets, print_sockets, remove_sockets, select_sockets  # noqa: E402
+from harness.timing import hydrate_image, span, start_run  # noqa: E402
 
+os.environ["MODAL_IMAGE_BUILDER_VERSION"] = "2025.06"
 
-dockerfile_image = modal.Image.from_dockerfile("Dockerfile.docker_in_gvisor")
+dockerfile_image = get_image("docker_in_gvisor")
 
 
 def main():
+    start_run("modal_snapshot_clean_sockets")
     print("Looking up modal.Sandbox app")
     app = modal.App.lookup("docker-clean-sockets", create_if_missing=True)
     print("Creating sandbox")
 
     with modal.enable_output():
-        sb = modal.Sandbox.create(
-            "/start-dockerd.sh",
-            timeout=60 * 60,
-            app=app,
-            image=dockerfile_image,
-            experimental_options={"enable_docker_in_gvisor": True},
-        )
+        hydrate_image(dockerfile_image, app)
+        with span("sandbox_create"):
+            sb = modal.Sandbox.create(
+                "/start-dockerd.sh",
+                timeout=60 * 60,
+                app=app,
+                image=dockerfile_image,
+                experimental_options={"enable_docker_in_gvisor": True},
+            )
 
     print("Sandbox created and running")
     
-    # Find and delete all .sock files except those containing "modal"
-    print("Finding and deleting socket files...")
+    with span("workload"):
+        # Find and delete all .sock files except those containing "modal"
+        print("Finding and deleting socket files...")
     
-    # Use a shell command to find and delete in one go
-    # This finds all .sock files that don't contain "modal" in the path and deletes them
-    cmd = sb.exec(
-        "bash", "-c",
-        "find / -name '*.sock' -type s 2>/dev/null | grep -v modal | xargs -r rm -f"
-    )
-    cmd.wait()
+        # Read /proc/net/unix and the runtime dirs once instead of walking the whole filesystem
+        inventory = inventory_sockets(sb)
+        print(f"Found {len(inventory['sockets'])} sockets in {inventory['elapsed_s']:.2f}s")
+        targets = select_sockets(inventory["sockets"], exclude=("modal",), name_glob="*.sock")
+        remove_sockets(sb, targets)
+        print(f"Deleted {len(targets)} socket files")
     
-    # Show remaining socket files
-    print("Checking remaining socket files...")
-    p = sb.exec("bash", "-c", "find / -name '*.sock' -type s 2>/dev/null || true")
-    remaining = p.stdout.read().strip()
-    p.wait()
+        # Show remaining socket files
+        print("Checking remaining socket files...")
+        remaining = select_sockets(inventory_sockets(sb)["sockets"], name_glob="*.sock", present_only=True)
     
-    if remaining:
-        print(f"Remaining socket files (should only contain 'modal'):")
-        for line in remaining.split('\n')[:10]:
-            if line:
-                print(f"  - {line}")
-    else:
-        print("No socket files remaining")
+        if remaining:
+            print(f"Remaining socket files (should only contain 'modal'):")
+            print_sockets(remaining, limit=10)
+        else:
+            print("No socket files remaining")
     
     print("Creating snapshot...")
-    image = sb.snapshot_filesystem()
+    with span("snapshot_filesystem"):
+        image = sb.snapshot_filesystem()
     print("Snapshot created successfully!")
     print(f"Snapshot image: {image}")
     
-    sb.terminate()
+    with span("terminate"):
+        sb.terminate()
     print("Sandbox terminated")
 
 
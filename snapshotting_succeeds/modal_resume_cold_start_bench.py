@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import modal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness.images import get_image  # noqa: E402
+from harness.stats import summarize  # noqa: E402
+from harness.timing import hydrate_image, span, start_run  # noqa: E402
+
+os.environ["MODAL_IMAGE_BUILDER_VERSION"] = "2025.06"
+
+RESULTS_DIR = os.path.expanduser("~/.cache/modal-snapshot-testing/bench")
+LARGE_FILE = "/bench/large.bin"
+
+# (image source, enable_docker_in_gvisor) per variant, in report order
+VARIANTS = {
+    "snapshot+dig": ("snapshot", True),
+    "snapshot": ("snapshot", False),
+    "dockerfile+dig": ("dockerfile", True),
+    "dockerfile": ("dockerfile", False),
+}
+METRICS = (
+    ("create_s", "Sandbox.create return"),
+    ("first_exec_s", "first successful exec (from create)"),
+    ("first_read_s", "first read of the large file"),
+    ("ready_s", "create through first read"),
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare sandbox cold start from a snapshot image against the Dockerfile-built image"
+    )
+    parser.add_argument("--trials", type=int, default=20, help="sandboxes per variant (default: 20)")
+    parser.add_argument(
+        "--variant",
+        action="append",
+        choices=list(VARIANTS),
+        help="variant to run (repeatable, default: all)",
+    )
+    parser.add_argument("--size-mb", type=int, default=256, help="size of the large file (default: 256)")
+    parser.add_argument(
+        "--snapshot-image",
+        help="reuse an existing snapshot image id instead of taking a fresh one (it must contain the large file)",
+    )
+    parser.add_argument("--exec-timeout", type=float, default=120.0, help="give up on the first exec after this many seconds")
+    parser.add_argument("--output", help="write results as JSON (default: under ~/.cache/modal-snapshot-testing/bench)")
+    args = parser.parse_args()
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+    return args
+
+
+def large_file_command(size_mb):
+    return f"mkdir -p {os.path.dirname(LARGE_FILE)} && head -c {size_mb}M /dev/urandom > {LARGE_FILE} && sync"
+
+
+def prepare_images(app, size_mb, snapshot_image_id=None):
+    """Return the snapshot and Dockerfile images, both holding the same large file.
+
+    The snapshot comes from a sandbox on the Dockerfile image that never
+    started dockerd, which is the configuration where snapshots succeed.
+    """
+    base_image = get_image("docker_in_gvisor")
+    dockerfile_image = base_image.run_commands(large_file_command(size_mb))
+    with modal.enable_output():
+        hydrate_image(dockerfile_image, app)
+
+    if snapshot_image_id:
+        return {"snapshot": modal.Image.from_id(snapshot_image_id), "dockerfile": dockerfile_image}
+
+    print("Taking the source snapshot")
+    with modal.enable_output():
+        hydrate_image(base_image, app)
+        with span("sandbox_create"):
+            sb = modal.Sandbox.create("sleep", "infinity", timeout=60 * 60, app=app, image=base_image)
+    try:
+        with span("workload"):
+            p = sb.exec("sh", "-c", large_file_command(size_mb))
+            p.wait()
+            if p.returncode != 0:
+                raise RuntimeError(f"Writing the large file failed: {p.stderr.read()}")
+        with span("snapshot_filesystem"):
+            snapshot_image = sb.snapshot_filesystem()
+    finally:
+        with span("terminate"):
+            sb.terminate()
+    print(f"Snapshot image: {snapshot_image.object_id}")
+    return {"snapshot": snapshot_image, "dockerfile": dockerfile_image}
+
+
+def wait_for_exec(sb, timeout):
+    """Retry a no-op exec until one succeeds; return the number of attempts."""
+    deadline = time.monotonic() + timeout
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            p = sb.exec("true")
+            p.wait()
+            if p.returncode == 0:
+                return attempts
+        except Exception:
+            if time.monotonic() >= deadline:
+                raise
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"No successful exec within {timeout}s ({attempts} attempts)")
+        time.sleep(0.05)
+
+
+def run_trial(app, image, docker_in_gvisor, exec_timeout):
+    """Cold-start one sandbox and return its latencies in seconds."""
+    options = {"experimental_options": {"enable_docker_in_gvisor": True}} if docker_in_gvisor else {}
+    sb = None
+    try:
+        with span("sandbox_create") as create_span:
+            sb = modal.Sandbox.create("sleep", "infinity", timeout=10 * 60, app=app, image=image, **options)
+        with span("first_exec") as exec_span:
+            attempts = wait_for_exec(sb, exec_timeout)
+        with span("first_read") as read_span:
+            p = sb.exec("sh", "-c", f"cat {LARGE_FILE} > /dev/null")
+            p.wait()
+            if p.returncode != 0:
+                raise RuntimeError(f"Reading {LARGE_FILE} failed: {p.stderr.read()}")
+        return {
+            "create_s": create_span.duration_s,
+            "first_exec_s": create_span.duration_s + exec_span.duration_s,
+            "first_read_s": read_span.duration_s,
+            "ready_s": create_span.duration_s + exec_span.duration_s + read_span.duration_s,
+            "exec_attempts": attempts,
+        }
+    finally:
+        if sb is not None:
+            with span("terminate"):
+                try:
+                    sb.terminate()
+                except Exception as e:
+                    print(f"   Error terminating sandbox: {e}")
+
+
+def print_report(results, variants):
+    for key, label in METRICS:
+        print(f"\n{label} (seconds):")
+        print(f"  {'variant':<16} {'n':>4} {'fail':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'mean':>8}")
+        for variant in variants:
+            trials = results[variant]
+            ok = [trial for trial in trials if "error" not in trial]
+            summary = summarize([trial[key] for trial in ok])
+            if not summary["n"]:
+                print(f"  {variant:<16} {0:>4} {len(trials):>5}")
+                continue
+            print(
+                f"  {variant:<16} {summary['n']:>4} {len(trials) - len(ok):>5} {summary['p50']:>8.2f} "
+                f"{summary['p95']:>8.2f} {summary['p99']:>8.2f} {summary['mean']:>8.2f}"
+            )
+
+    print("\nSnapshot vs rebuild (p50 of create through first read):")
+    for suffix in ("+dig", ""):
+        snapshot = summarize([t["ready_s"] for t in results.get("snapshot" + suffix, []) if "error" not in t])
+        dockerfile = summarize([t["ready_s"] for t in results.get("dockerfile" + suffix, []) if "error" not in t])
+        if not snapshot["n"] or not dockerfile["n"]:
+            continue
+        delta = dockerfile["p50"] - snapshot["p50"]
+        verdict = "snapshot faster" if delta > 0 else "Dockerfile image faster"
+        setting = "docker-in-gvisor on" if suffix else "docker-in-gvisor off"
+        print(f"  {setting}: {verdict} by {abs(delta):.2f}s ({snapshot['p50']:.2f}s vs {dockerfile['p50']:.2f}s)")
+
+
+def main():
+    args = parse_args()
+    variants = args.variant or list(VARIANTS)
+    start_run("modal_resume_cold_start_bench")
+
+    print("Looking up modal.Sandbox app")
+    app = modal.App.lookup("resume-cold-start-bench", create_if_missing=True)
+    images = prepare_images(app, args.size_mb, args.snapshot_image)
+
+    results = {variant: [] for variant in variants}
+    try:
+        # Interleave variants so drift in Modal's load affects all of them equally
+        for trial in range(1, args.trials + 1):
+            for variant in variants:
+                source, docker_in_gvisor = VARIANTS[variant]
+                print(f"[trial {trial}/{args.trials}] {variant}")
+                with span("resume", variant=variant, trial=trial):
+                    try:
+                        result = run_trial(app, images[source], docker_in_gvisor, args.exec_timeout)
+                        print(
+                            f"   create {result['create_s']:.2f}s, first exec {result['first_exec_s']:.2f}s, "
+                            f"read {result['first_read_s']:.2f}s"
+                        )
+                    except Exception as e:
+                        print(f"   FAILED: {e}")
+                        result = {"error": f"{type(e).__name__}: {e}"}
+                results[variant].append(result)
+    except KeyboardInterrupt:
+        print("\n\nInterrupted by user")
+
+    print_report(results, variants)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"resume-cold-start-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "size_mb": args.size_mb,
+                "snapshot_image": images["snapshot"].object_id,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
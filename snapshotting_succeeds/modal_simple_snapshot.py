@@ -1,32 +1,44 @@
+import os
+import sys
+
 import modal
 
-base_image = modal.Image.from_registry("ubuntu:22.04", add_python="3.11")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness.images import get_image  # noqa: E402
+from harness.timing import hydrate_image, span, start_run  # noqa: E402
+
+base_image = get_image("ubuntu_python")
 
 
 def main():
+    start_run("modal_simple_snapshot")
     print("Looking up modal.Sandbox app")
     app = modal.App.lookup("simple-snapshot-demo", create_if_missing=True)
     print("Creating sandbox")
 
     with modal.enable_output():
+        hydrate_image(base_image, app)
         # Create a sandbox that runs sleep infinity to keep it alive
-        sb = modal.Sandbox.create(
-            "sleep",
-            "infinity",
-            timeout=60 * 60,  # 1 hour timeout
-            app=app,
-            image=base_image,
-        )
+        with span("sandbox_create"):
+            sb = modal.Sandbox.create(
+                "sleep",
+                "infinity",
+                timeout=60 * 60,  # 1 hour timeout
+                app=app,
+                image=base_image,
+            )
 
     print("Sandbox created and running")
     
     print("Creating snapshot...")
-    image = sb.snapshot_filesystem()
+    with span("snapshot_filesystem"):
+        image = sb.snapshot_filesystem()
     print("Snapshot created successfully!")
     print(f"Snapshot image: {image}")
     
     # Terminate the sandbox
-    sb.terminate()
+    with span("terminate"):
+        sb.terminate()
     # print("Sandbox terminated")
     
 if __name__ == "__main__":
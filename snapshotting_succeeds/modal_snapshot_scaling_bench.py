@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import modal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness import synthtree  # noqa: E402
+from harness.images import get_image  # noqa: E402
+from harness.remote import module_script  # noqa: E402
+from harness.timing import hydrate_image, span, start_run  # noqa: E402
+
+# Same plain image as modal_simple_snapshot.py, so only the generated tree differs between points
+base_image = get_image("ubuntu_python")
+
+TREE_ROOT = "/bench/tree"
+RESULTS_DIR = os.path.expanduser("~/.cache/modal-snapshot-testing/bench")
+
+# Every sweep varies one parameter around this tree
+BASELINE = {"files": 1000, "size": 4096, "depth": 2, "symlinks": 0.0, "hardlinks": 0.0}
+
+SWEEPS = {
+    "files": [0, 1000, 10000, 50000, 100000],
+    "size": [1024, 65536, 1 << 20],
+    "depth": [1, 4, 16, 64],
+    "symlinks": [0.0, 0.25, 0.5, 0.9],
+    "hardlinks": [0.0, 0.25, 0.5, 0.9],
+}
+
+# Quantity each sweep's marginal cost is fitted against: (tree summary key, scale, unit)
+FIT_AXES = {
+    "files": ("entries", 1000, "ms per 1k entries"),
+    "size": ("bytes", 1 << 30, "ms per GiB"),
+    "depth": ("dirs", 1000, "ms per 1k dirs"),
+    "symlinks": ("symlinks", 1000, "ms per 1k symlinks"),
+    "hardlinks": ("hardlinks", 1000, "ms per 1k hardlinks"),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure how snapshot_filesystem latency scales with tree shape")
+    parser.add_argument(
+        "--sweep",
+        action="append",
+        choices=sorted(SWEEPS),
+        help="sweep to run (repeatable, default: all)",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="sandboxes per point (default: 1)")
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="multiply every file count by this factor, e.g. 0.1 for a quick pass",
+    )
+    parser.add_argument("--content", choices=("random", "zero"), default="random")
+    parser.add_argument("--output", help="write results as JSON (default: under ~/.cache/modal-snapshot-testing/bench)")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+
+def sweep_points(sweeps, scale):
+    """Yield (sweep, value, params) for every point, baseline params overridden by the sweep value."""
+    for sweep in sweeps:
+        for value in SWEEPS[sweep]:
+            params = dict(BASELINE)
+            params[sweep] = value
+            params["files"] = int(params["files"] * scale)
+            yield sweep, params[sweep], params
+
+
+def run_point(app, params, content):
+    """Create a sandbox, generate the tree, snapshot it; return one result dict."""
+    result = {"params": params}
+    sb = None
+    try:
+        with span("sandbox_create") as create_span:
+            sb = modal.Sandbox.create("sleep", "infinity", timeout=60 * 60, app=app, image=base_image)
+        result["create_s"] = create_span.duration_s
+
+        argv = [
+            TREE_ROOT,
+            "--files", str(params["files"]),
+            "--size", str(params["size"]),
+            "--depth", str(params["depth"]),
+            "--symlinks", str(params["symlinks"]),
+            "--hardlinks", str(params["hardlinks"]),
+            "--content", content,
+        ]
+        with span("workload"):
+            p = sb.exec("python3", "-c", module_script(synthtree, *argv), timeout=60 * 30)
+            stdout = p.stdout.read()
+            p.wait()
+        if p.returncode != 0:
+            raise RuntimeError(f"tree generation failed ({p.returncode}): {p.stderr.read()[-500:]}")
+        tree = json.loads(stdout.strip().splitlines()[-1])
+        tree["entries"] = tree["files"] + tree["symlinks"] + tree["hardlinks"]
+        result["tree"] = tree
+
+        with span("snapshot_filesystem", **params) as snapshot_span:
+            image = sb.snapshot_filesystem()
+        result["snapshot_s"] = snapshot_span.duration_s
+        result["image_id"] = image.object_id
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if sb is not None:
+            with span("terminate"):
+                try:
+                    sb.terminate()
+                except Exception as e:
+                    print(f"   Error terminating sandbox: {e}")
+    return result
+
+
+def fit_slope(points):
+    """Least-squares slope of y over x; None with fewer than two distinct x."""
+    if len({x for x, _ in points}) < 2:
+        return None
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    return numerator / denominator
+
+
+def format_value(sweep, value):
+    if sweep == "size":
+        for unit, factor in (("MiB", 1 << 20), ("KiB", 1 << 10)):
+            if value >= factor:
+                return f"{value / factor:g}{unit}"
+        return f"{value}B"
+    return f"{value:g}"
+
+
+def print_table(rows):
+    print("\nSnapshot scaling results:")
+    print(
+        f"{'sweep':>10} {'value':>8} {'entries':>8} {'dirs':>7} {'MiB':>9} "
+        f"{'gen_s':>7} {'snap_s':>8} {'min':>8} {'max':>8}  image"
+    )
+    for row in rows:
+        tree = row.get("tree") or {}
+        if row.get("snapshot_s") is None:
+            print(f"{row['sweep']:>10} {format_value(row['sweep'], row['value']):>8}  FAILED: {row['errors'][0]}")
+            continue
+        print(
+            f"{row['sweep']:>10} {format_value(row['sweep'], row['value']):>8} {tree.get('entries', 0):>8} "
+            f"{tree.get('dirs', 0):>7} {tree.get('bytes', 0) / (1 << 20):>9.1f} {tree.get('seconds', 0):>7.2f} "
+            f"{row['snapshot_s']:>8.2f} {row['snapshot_min_s']:>8.2f} {row['snapshot_max_s']:>8.2f}  {row['image_id']}"
+        )
+
+
+def print_curves(rows, width=40):
+    """Print one horizontal bar chart per sweep, scaled to that sweep's slowest point."""
+    for sweep in SWEEPS:
+        points = [row for row in rows if row["sweep"] == sweep and row.get("snapshot_s") is not None]
+        if not points:
+            continue
+        peak = max(row["snapshot_s"] for row in points) or 1.0
+        print(f"\nsnapshot_filesystem seconds vs {sweep}:")
+        for row in points:
+            bar = "#" * max(1, round(width * row["snapshot_s"] / peak))
+            print(f"  {format_value(sweep, row['value']):>8} |{bar:<{width}} {row['snapshot_s']:.2f}s")
+
+        key, scale, unit = FIT_AXES[sweep]
+        slope = fit_slope([(row["tree"][key] / scale, row["snapshot_s"]) for row in points])
+        if slope is not None:
+            print(f"  marginal cost: {slope * 1000:+.1f} {unit}")
+
+
+def main():
+    args = parse_args()
+    sweeps = args.sweep or list(SWEEPS)
+    start_run("modal_snapshot_scaling_bench")
+
+    print("Looking up modal.Sandbox app")
+    app = modal.App.lookup("snapshot-scaling-bench", create_if_missing=True)
+    with modal.enable_output():
+        hydrate_image(base_image, app)
+
+    points = list(sweep_points(sweeps, args.scale))
+    print(f"Running {len(points)} points x {args.repeat} repeats")
+
+    rows = []
+    try:
+        for index, (sweep, value, params) in enumerate(points, 1):
+            samples = []
+            errors = []
+            for repeat in range(args.repeat):
+                print(f"\n[{index}/{len(points)}] {sweep}={format_value(sweep, value)} (repeat {repeat + 1}) {params}")
+                with span("point", sweep=sweep, value=value, repeat=repeat):
+                    result = run_point(app, params, args.content)
+                if "error" in result:
+                    print(f"   FAILED: {result['error']}")
+                    errors.append(result["error"])
+                    continue
+                print(
+                    f"   {result['tree']['entries']} entries generated in {result['tree']['seconds']:.2f}s, "
+                    f"snapshot in {result['snapshot_s']:.2f}s -> {result['image_id']}"
+                )
+                samples.append(result)
+
+            row = {"sweep": sweep, "value": value, "params": params, "errors": errors, "samples": samples}
+            if samples:
+                durations = [sample["snapshot_s"] for sample in samples]
+                row.update(
+                    tree=samples[0]["tree"],
+                    snapshot_s=statistics.median(durations),
+                    snapshot_min_s=min(durations),
+                    snapshot_max_s=max(durations),
+                    image_id=samples[-1]["image_id"],
+                )
+            rows.append(row)
+    except KeyboardInterrupt:
+        print("\n\nInterrupted by user")
+
+    print_table(rows)
+    print_curves(rows)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"snapshot-scaling-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"baseline": BASELINE, "scale": args.scale, "repeat": args.repeat, "rows": rows}, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
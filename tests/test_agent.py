@@ -0,0 +1,71 @@
+import hashlib
+import shutil
+import sys
+
+import pytest
+
+from harness.agent import AgentError, SandboxAgent
+
+
+@pytest.fixture
+def agent(tmp_path):
+    agent = SandboxAgent.start_local(script_dir=str(tmp_path / "scripts"))
+    yield agent
+    agent.close()
+
+
+def test_put_then_run(agent, tmp_path):
+    script = "import os, sys\nprint(os.getcwd())\nprint('err', file=sys.stderr)\n"
+    digest = agent.upload(script)
+    assert digest == hashlib.sha256(script.encode("utf-8")).hexdigest()
+    assert (tmp_path / "scripts" / digest).read_text() == script
+
+    response = agent.request("run", hash=digest, interpreter=sys.executable, cwd=str(tmp_path), timeout=30)
+    assert response["ok"]
+    assert response["returncode"] == 0
+    assert response["stdout"] == f"{tmp_path}\n"
+    assert response["stderr"] == "err\n"
+    assert response["duration_s"] >= 0
+
+
+def test_second_run_hits_the_script_cache(agent):
+    script = "print('hello')\n"
+    first = agent.run_script(script, interpreter=sys.executable)
+    second = agent.run_script(script, interpreter=sys.executable)
+    assert first["stdout"] == second["stdout"] == "hello\n"
+    assert agent.stats == {"requests": 3, "uploads": 1, "cache_hits": 1}
+
+
+def test_run_of_an_unknown_hash_fails(agent):
+    response = agent.request("run", hash="0" * 64)
+    assert response == {"id": 1, "ok": False, "error": "unknown_script"}
+
+
+def test_run_script_reuploads_after_the_script_dir_is_reset(agent, tmp_path):
+    script = "print('again')\n"
+    agent.run_script(script, interpreter=sys.executable)
+    shutil.rmtree(tmp_path / "scripts")
+    response = agent.run_script(script, interpreter=sys.executable)
+    assert response["stdout"] == "again\n"
+    assert agent.stats["uploads"] == 2
+
+
+def test_non_zero_exit_is_reported_not_raised(agent):
+    response = agent.run_script("import sys\nprint('partial')\nsys.exit(3)\n", interpreter=sys.executable)
+    assert response["ok"]
+    assert response["returncode"] == 3
+    assert response["stdout"] == "partial\n"
+
+
+def test_bad_requests_keep_the_agent_serving(agent):
+    assert agent.request("put", hash="wrong", script="x")["error"] == "hash_mismatch"
+    assert agent.request("frobnicate")["error"] == "unknown_op:frobnicate"
+    assert agent.request("ping")["ok"]
+
+
+def test_exit_message_stops_the_agent(tmp_path):
+    agent = SandboxAgent.start_local(script_dir=str(tmp_path / "scripts"))
+    assert agent.request("exit") == {"id": 1, "ok": True}
+    assert agent._process.wait() == 0
+    with pytest.raises(AgentError, match="exited unexpectedly"):
+        agent.request("ping")
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from harness.bisect import REPO_ROOT, _check_ends, bisect, next_points, orient, read_digests
+
+IMAGES = os.path.join(REPO_ROOT, "docker-compose", "IMAGES")
+
+
+def write_digests(tmp_path, labels):
+    path = tmp_path / "IMAGES"
+    path.write_text(
+        "".join(f"- {label}: repo/image@sha256:{index:064x}\n" for index, label in enumerate(labels)),
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+def test_markers_put_the_good_end_first():
+    candidates = orient(read_digests(IMAGES))
+    assert [expected for _, _, expected in candidates] == [True, True, False, False, False, False]
+    assert candidates[0][0] == "✅ Docker pin"
+
+
+def test_markers_override_newest_first(tmp_path):
+    path = write_digests(tmp_path, ["✅ old", "middle", "🛑 new"])
+    assert [label for label, _, _ in orient(read_digests(path), newest_first=True)] == ["✅ old", "middle", "🛑 new"]
+
+
+def test_unmarked_lists_follow_newest_first(tmp_path):
+    path = write_digests(tmp_path, ["a", "b", "c"])
+    assert [label for label, _, _ in orient(read_digests(path))] == ["a", "b", "c"]
+    assert [label for label, _, _ in orient(read_digests(path), newest_first=True)] == ["c", "b", "a"]
+
+
+def test_interleaved_markers_are_rejected(tmp_path):
+    path = write_digests(tmp_path, ["✅ a", "🛑 b", "✅ c"])
+    with pytest.raises(ValueError):
+        orient(read_digests(path))
+
+
+def test_ends_that_disagree_with_markers_stop_the_search():
+    candidates = orient(read_digests(IMAGES))
+    # The ✅ end probes bad: the markers are stale or the probe is wrong
+    with pytest.raises(RuntimeError, match=r"\[0\] ✅ Docker pin probed bad"):
+        bisect(candidates, lambda image_ref: False, parallel=2, check_ends=True)
+
+
+def test_failed_end_probe_is_not_trusted():
+    candidates = [("good", "a", True), ("bad", "b", False)]
+    with pytest.raises(RuntimeError, match="failed to probe"):
+        _check_ends(candidates, {0: (None, "error"), 1: (False, "probe")})
+
+
+def test_images_first_bad_is_the_first_red_marker():
+    candidates = orient(read_digests(IMAGES))
+    verdicts = {image_ref: expected for _, image_ref, expected in candidates}
+    first_bad, found, _ = bisect(candidates, verdicts.__getitem__, parallel=2, check_ends=True)
+    assert candidates[first_bad][0] == "🛑 Neither package"
+    assert found[0][0] is True and found[len(candidates) - 1][0] is False
+
+
+def test_next_points_cover_every_outcome():
+    # Probing 5 between 0 and 10 leaves (0, 5] or (5, 10] open
+    assert next_points(0, 10, [5], 1) == [2, 7]
+    assert next_points(0, 3, [1, 2], 2) == []
+
+
+def test_prewarm_gets_the_next_rounds_candidates():
+    candidates = [(str(i), f"img{i}", None) for i in range(11)]
+    warmed, probed = [], []
+
+    def probe(image_ref):
+        probed.append(image_ref)
+        return int(image_ref[3:]) < 7
+
+    first_bad, _, _ = bisect(candidates, probe, parallel=1, prewarm=warmed.append)
+    assert first_bad == 7
+    assert warmed[0] == ["img2", "img7"]
+    # Every probe after the first was warmed a round ahead
+    assert all(any(image_ref in batch for batch in warmed) for image_ref in probed[1:])
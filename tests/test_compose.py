@@ -0,0 +1,91 @@
+import json
+import subprocess
+
+import pytest
+
+from harness.compose import health_script, parse_events
+
+# `ps --format json` of compose before 2.21 (one array) and after (one object per line)
+ARRAY = "array"
+LINES = "lines"
+
+
+def container(service, state, health, compact=True):
+    return json.dumps(
+        {
+            "Name": f"demo-{service}-1",
+            "Service": service,
+            "State": state,
+            "Health": health,
+            "Publishers": [{"URL": "0.0.0.0", "TargetPort": 6379}, {"URL": "::", "TargetPort": 6379}],
+        },
+        separators=(",", ":") if compact else None,
+    )
+
+
+def fake_compose(tmp_path, polls, layout):
+    """Write a compose stand-in whose ``ps`` prints ``polls`` in turn, then the last one forever."""
+    for i, containers in enumerate(polls):
+        if layout == ARRAY:
+            body = "[" + ",".join(containers) + "]"
+        else:
+            body = "\n".join(containers)
+        (tmp_path / f"ps{i}.json").write_text(body + "\n")
+    script = tmp_path / "compose"
+    script.write_text(
+        f"""#!/bin/sh
+case "$*" in
+    *" up -d") exit 0 ;;
+esac
+n=$(cat {tmp_path}/count 2>/dev/null || echo 0)
+echo $((n + 1)) > {tmp_path}/count
+[ "$n" -lt {len(polls) - 1} ] || n={len(polls) - 1}
+cat {tmp_path}/ps$n.json
+"""
+    )
+    script.chmod(0o755)
+    return str(script)
+
+
+def run(tmp_path, polls, layout, timeout=5.0):
+    compose = fake_compose(tmp_path, polls, layout)
+    stdout = subprocess.run(
+        ["sh", "-c", health_script("/compose.yml", "demo", timeout=timeout, interval=0.01, compose=compose)],
+        capture_output=True, text=True,
+    ).stdout
+    return parse_events(stdout.splitlines())
+
+
+@pytest.mark.parametrize("layout", [ARRAY, LINES])
+def test_waits_until_every_service_is_healthy(tmp_path, layout):
+    result = run(
+        tmp_path,
+        [
+            [container("redis", "running", "starting"), container("web", "created", "")],
+            [container("redis", "running", "healthy"), container("web", "running", "")],
+        ],
+        layout,
+    )
+    assert result["ok"]
+    assert result["reason"] == "healthy"
+    assert [status for status, _ in result["services"]["redis"]["states"]] == ["starting", "healthy"]
+    assert [status for status, _ in result["services"]["web"]["states"]] == ["created", "running"]
+    assert result["services"]["redis"]["ready_s"] is not None
+
+
+def test_json_with_spaces_after_colons(tmp_path):
+    result = run(tmp_path, [[container("redis", "running", "healthy", compact=False)]], LINES)
+    assert result["ok"]
+    assert list(result["services"]) == ["redis"]
+
+
+def test_unhealthy_service_fails(tmp_path):
+    result = run(tmp_path, [[container("redis", "running", "unhealthy")]], ARRAY)
+    assert not result["ok"]
+    assert result["reason"] == "service"
+
+
+def test_times_out_while_starting(tmp_path):
+    result = run(tmp_path, [[container("redis", "running", "starting")]], LINES, timeout=0.2)
+    assert not result["ok"]
+    assert result["reason"] == "timeout"
@@ -0,0 +1,49 @@
+import sys
+import types
+
+import pytest
+
+from harness import images
+
+
+class FakeImage:
+    def __init__(self, source):
+        self.source = source
+
+    def run_commands(self, *commands):
+        return FakeImage((self.source, commands))
+
+
+@pytest.fixture
+def fake_modal(monkeypatch):
+    image = types.SimpleNamespace(
+        from_id=lambda image_id: FakeImage(("id", image_id)),
+        from_dockerfile=lambda path, context_dir: FakeImage(("dockerfile", path)),
+        from_registry=lambda ref, add_python: FakeImage(("registry", ref)),
+    )
+    monkeypatch.setitem(sys.modules, "modal", types.SimpleNamespace(Image=image))
+    monkeypatch.setattr(images, "_cache", {})
+
+
+def prebuilt(monkeypatch, *names):
+    index = {images.IMAGES[name].content_hash: {"name": name, "image_id": f"im-{name}"} for name in names}
+    monkeypatch.setattr(images, "load_index", lambda: index)
+
+
+def test_derived_image_reuses_a_prebuilt_base(monkeypatch, fake_modal):
+    prebuilt(monkeypatch, "docker_in_gvisor")
+    image = images.get_image("docker_in_gvisor_network")
+    base, commands = image.source
+    assert base == ("id", "im-docker_in_gvisor")
+    assert commands == images.IMAGES["docker_in_gvisor_network"].commands
+
+
+def test_prebuilt_derived_image_wins_over_its_base(monkeypatch, fake_modal):
+    prebuilt(monkeypatch, "docker_in_gvisor", "docker_in_gvisor_network")
+    assert images.get_image("docker_in_gvisor_network").source == ("id", "im-docker_in_gvisor_network")
+
+
+def test_without_prebuilt_the_base_is_defined_too(monkeypatch, fake_modal):
+    prebuilt(monkeypatch, "docker_in_gvisor")
+    base, _ = images.get_image("docker_in_gvisor_network", prebuilt=False).source
+    assert base == ("dockerfile", images.IMAGES["docker_in_gvisor"].dockerfile)
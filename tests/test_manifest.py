@@ -0,0 +1,147 @@
+import io
+import json
+import os
+
+import pytest
+
+from harness import manifest
+from harness.manifest import iter_binary, iter_manifest, verify, walk, write_binary
+
+needs_zstd = pytest.mark.skipif(manifest.zstandard is None, reason="zstandard is not installed")
+COMPRESSIONS = ["zlib", pytest.param("zstd", marks=needs_zstd)]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "node_modules"
+    files = {
+        ".pnpm/lodash@4.17.21/node_modules/lodash/package.json": '{"name": "lodash"}',
+        ".pnpm/lodash@4.17.21/node_modules/lodash/lodash.js": "x" * 5000,
+        ".pnpm/lodash@4.17.21/node_modules/lodash/fp/array.js": "",
+        ".pnpm/lodash@4.17.22/node_modules/lodash/package.json": '{"name": "lodash"}',
+        ".pnpm/ünïcödé@1.0.0/node_modules/ünïcödé/package.json": "{}",
+        ".pnpm/日本語@2.0.0/node_modules/日本語/index.js": "",
+        "empty.txt": "",
+    }
+    for relative, content in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+    os.symlink(".pnpm/lodash@4.17.21/node_modules/lodash", root / "lodash")
+    os.symlink(".pnpm/日本語@2.0.0/node_modules/日本語", root / "日本語")
+    os.symlink("does-not-exist", root / "dangling")
+    return str(root)
+
+
+def round_trip(rows, **kwargs):
+    buffer = io.BytesIO()
+    write_binary(rows, buffer, **kwargs)
+    buffer.seek(0)
+    return buffer.getvalue(), list(iter_binary(buffer, chunk_size=7))
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+@pytest.mark.parametrize("block_size", [1, 3, manifest.BLOCK_SIZE])
+def test_binary_round_trip(tree, compression, block_size):
+    rows, errors = walk(tree)
+    assert not errors
+    kinds = {row[1] for row in rows}
+    assert kinds == {"f", "d", "l"}
+    assert any(row[1] == "f" and row[2] == 0 for row in rows)
+    _, read = round_trip(rows, compression=compression, block_size=block_size)
+    assert read == rows
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_large_varints_and_odd_paths(compression):
+    rows = [
+        ["a", "f", 0, 0, 0, 0, None],
+        ["a/b", "f", 2**40, 0o7777, 2**63 - 1, 2**20, None],
+        ["a/b\udcff", "l", 3, 0o777, 1, 1, "t\udcfe"],
+        ["a/bc", "l", 0, 0o777, 2, 1, ""],
+    ]
+    _, read = round_trip(rows, compression=compression, block_size=2)
+    assert read == rows
+
+
+def test_codec_byte_and_default(tree):
+    rows, _ = walk(tree)
+    data, _ = round_trip(rows, compression="zlib")
+    assert data[:5] == manifest.BINARY_MAGIC + bytes([manifest.CODEC_ZLIB])
+    data, _ = round_trip(rows)
+    expected = manifest.CODEC_ZSTD if manifest.zstandard is not None else manifest.CODEC_ZLIB
+    assert data[4] == expected
+
+
+def test_iter_binary_streams_one_block_at_a_time(tree):
+    rows, _ = walk(tree)
+    buffer = io.BytesIO()
+    write_binary(rows, buffer, compression="zlib", block_size=2)
+    size = buffer.tell()
+    buffer.seek(0)
+    iterator = iter_binary(buffer, chunk_size=16)
+    assert next(iterator) == rows[0]
+    assert buffer.tell() < size
+
+
+def test_iter_manifest_reads_both_formats(tree, tmp_path):
+    rows, errors = walk(tree)
+    binary, text = tmp_path / "m.bin", tmp_path / "m.json"
+    with open(binary, "wb") as fh:
+        write_binary(rows, fh)
+    with open(text, "w", encoding="utf-8") as fh:
+        manifest.dump(rows, fh, tree, errors)
+    assert list(iter_manifest(str(binary))) == rows
+    assert list(iter_manifest(str(text))) == rows
+
+
+def test_verify_reports_missing_and_changed_entries(tree):
+    rows, _ = walk(tree)
+    clean = verify(rows, tree)
+    assert clean["checked_entries"] == len(rows)
+    assert clean["missing_count"] == clean["mismatch_count"] == 0
+    assert clean["present_sample_packages"] == clean["tracked_sample_packages"] == 3
+
+    os.remove(os.path.join(tree, ".pnpm/lodash@4.17.22/node_modules/lodash/package.json"))
+    with open(os.path.join(tree, "empty.txt"), "w") as fh:
+        fh.write("no longer empty")
+    os.remove(os.path.join(tree, "lodash"))
+    os.symlink("elsewhere", os.path.join(tree, "lodash"))
+
+    result = verify(rows, tree)
+    assert result["missing"] == [os.path.join(tree, ".pnpm/lodash@4.17.22/node_modules/lodash/package.json")]
+    assert result["missing_sample_packages"] == result["missing"]
+    assert sorted(result["mismatched"], key=lambda item: item["path"]) == [
+        {"path": os.path.join(tree, "empty.txt"), "expected_size": 0, "found_size": 15},
+        {
+            "path": os.path.join(tree, "lodash"),
+            "expected_target": ".pnpm/lodash@4.17.21/node_modules/lodash",
+            "found_target": "elsewhere",
+        },
+    ]
+
+
+def corrupt(data, how):
+    if how == "truncated":
+        return data[: len(data) // 2]
+    if how == "flipped":
+        middle = len(data) // 2
+        return data[:middle] + bytes([data[middle] ^ 0xFF]) + data[middle + 1 :]
+    if how == "codec":
+        return data[:4] + b"\x09" + data[5:]
+    return b"XXXX" + data[4:]
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+@pytest.mark.parametrize("how", ["truncated", "flipped", "codec", "magic"])
+def test_corrupted_manifest_fails_verify(tree, tmp_path, capsys, compression, how):
+    rows, _ = walk(tree)
+    data, _ = round_trip(rows, compression=compression)
+    with pytest.raises(ValueError):
+        list(iter_binary(io.BytesIO(corrupt(data, how))))
+
+    path = tmp_path / "corrupt.manifest.bin"
+    path.write_bytes(corrupt(data, how))
+    # Without the magic the file is read as JSON, which fails the same way
+    assert manifest.main(["verify", str(path), tree]) == 1
+    assert json.loads(capsys.readouterr().out)["error"] == "manifest_unreadable"
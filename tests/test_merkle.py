@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+
+import pytest
+
+from harness import merkle
+from harness.merkle import build, diff
+
+
+def make_tree(root, files, links=()):
+    for relative, content in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    for relative, target in links:
+        os.symlink(target, root / relative)
+    return str(root)
+
+
+@pytest.fixture
+def before(tmp_path):
+    return make_tree(
+        tmp_path / "before",
+        {
+            "package.json": "{}",
+            "node_modules/a/index.js": "a",
+            "node_modules/a/lib/util.js": "util",
+            "node_modules/b/index.js": "b",
+            "node_modules/b/deep/x/y.js": "y",
+            "node_modules/c/index.js": "c",
+        },
+        links=[("node_modules/.bin", "a/index.js")],
+    )
+
+
+def test_identical_trees_are_not_walked(before):
+    result = diff(build(before), build(before))
+    assert result == {"identical": True, "missing": [], "added": [], "changed": [], "visited_dirs": 0}
+
+
+def test_diff_reports_exact_changes(before):
+    old = build(before)
+    os.remove(os.path.join(before, "node_modules/a/lib/util.js"))
+    with open(os.path.join(before, "node_modules/a/index.js"), "w") as fh:
+        fh.write("a2")
+    with open(os.path.join(before, "node_modules/c/new.js"), "w") as fh:
+        fh.write("new!")
+    os.remove(os.path.join(before, "node_modules/b/deep/x/y.js"))
+    os.removedirs(os.path.join(before, "node_modules/b/deep/x"))
+    os.remove(os.path.join(before, "node_modules/.bin"))
+    os.symlink("c/index.js", os.path.join(before, "node_modules/.bin"))
+
+    result = diff(old, build(before))
+    assert not result["identical"]
+    for bucket in ("missing", "added", "changed"):
+        result[bucket].sort(key=lambda change: change["path"])
+    assert result["missing"] == [
+        {"path": "node_modules/a/lib/util.js", "kind": "f", "size": 4, "files": 1},
+        {"path": "node_modules/b/deep", "kind": "d", "size": 1, "files": 1},
+    ]
+    assert result["added"] == [{"path": "node_modules/c/new.js", "kind": "f", "size": 4, "files": 1}]
+    assert result["changed"] == [
+        {"path": "node_modules/.bin", "kind": "l", "size": len("c/index.js"), "files": 1},
+        {"path": "node_modules/a/index.js", "kind": "f", "size": 2, "files": 1},
+    ]
+    # root, node_modules, a, a/lib, b, c: the unchanged package.json subtree is never entered
+    assert result["visited_dirs"] == 6
+
+
+def test_only_differing_subtrees_are_visited(before):
+    old = build(before)
+    with open(os.path.join(before, "node_modules/b/deep/x/y.js"), "w") as fh:
+        fh.write("y2")
+    result = diff(old, build(before))
+    assert [change["path"] for change in result["changed"]] == ["node_modules/b/deep/x/y.js"]
+    assert result["visited_dirs"] == 5
+
+
+def test_subtree_totals(before):
+    tree = build(before)
+    assert tree["files"] == 7
+    node_modules = {node[0]: node for node in tree["dirs"]["node_modules"]}
+    assert node_modules["b"][1] == "d"
+    assert node_modules["b"][3:] == [2, 2]
+
+
+def test_hash_ignores_location_but_not_content(tmp_path):
+    one = build(make_tree(tmp_path / "one", {"x/a": "1", "b": "2"}))
+    two = build(make_tree(tmp_path / "two", {"x/a": "1", "b": "2"}))
+    three = build(make_tree(tmp_path / "three", {"x/a": "1", "b": "3"}))
+    assert one["hash"] == two["hash"] != three["hash"]
+    assert one["dirs"]["x"] == two["dirs"]["x"] == three["dirs"]["x"]
+
+
+def test_deeper_than_the_recursion_limit(tmp_path):
+    depth = sys.getrecursionlimit() + 100
+    # Short names keep the path under PATH_MAX; build each level relative to the last
+    root = tmp_path / "deep"
+    root.mkdir()
+    fd = os.open(root, os.O_RDONLY)
+    try:
+        for _ in range(depth):
+            os.mkdir("d", dir_fd=fd)
+            child = os.open("d", os.O_RDONLY, dir_fd=fd)
+            os.close(fd)
+            fd = child
+        with open(os.open("leaf", os.O_WRONLY | os.O_CREAT, dir_fd=fd), "w") as fh:
+            fh.write("leaf")
+    finally:
+        os.close(fd)
+    try:
+        tree = build(str(root))
+    finally:
+        # shutil.rmtree recurses too (before Python 3.12), so remove the chain bottom up
+        os.remove(os.path.join(root, *["d"] * depth, "leaf"))
+        for level in range(depth, 0, -1):
+            os.rmdir(os.path.join(root, *["d"] * level))
+    assert tree["files"] == 1
+    assert len(tree["dirs"]) == depth + 1
+
+
+def test_check_command_exits_non_zero_on_changes(before, tmp_path, capsys):
+    saved = str(tmp_path / "pre.merkle.json")
+    assert merkle.main(["build", before, "--output", saved]) == 0
+    capsys.readouterr()
+    assert merkle.main(["check", saved, before]) == 0
+    os.remove(os.path.join(before, "package.json"))
+    assert merkle.main(["check", saved, before]) == 1
+    summary = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert summary["missing_count"] == 1 and summary["missing"][0]["path"] == "package.json"
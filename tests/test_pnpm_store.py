@@ -0,0 +1,89 @@
+import json
+
+from harness.pnpm_store import (
+    LocalDirStore,
+    install_command,
+    install_entry,
+    local_runner,
+    prepare,
+    print_store_comparison,
+    record_store_run,
+)
+
+
+def fake_install(store, workdir, packages):
+    """Stand in for ``pnpm install``: fill the store and copy packages into node_modules."""
+    for name in packages:
+        (store / name).write_bytes(b"x" * 1000)
+        package_dir = workdir / "node_modules" / name
+        package_dir.mkdir(parents=True, exist_ok=True)
+        (package_dir / "index.js").write_bytes(b"x" * 1000)
+
+
+def test_install_command():
+    assert install_command() == "cd /workspace/slidev && pnpm install"
+    assert install_command(offline=True) == "cd /workspace/slidev && pnpm install --offline"
+    assert install_command("/pnpm-store", workdir="/tmp/my app") == (
+        "cd '/tmp/my app' && pnpm install --store-dir /pnpm-store --package-import-method copy"
+    )
+
+
+def test_cold_then_warm_install(tmp_path, capsys):
+    store = LocalDirStore(tmp_path / "store")
+    workdir = tmp_path / "app"
+    workdir.mkdir()
+    history_path = str(tmp_path / "history.json")
+
+    state, store_bytes, _ = prepare(local_runner, store)
+    assert state == "cold"
+    fake_install(tmp_path / "store", workdir, ["a", "b"])
+    cold = install_entry(local_runner, store, state, 12.0, store_bytes, workdir=str(workdir))
+    assert cold["volume"] == store.name
+    assert cold["store_files_after"] == 2
+    assert cold["node_modules_bytes"] >= 2000
+    record_store_run(cold, history_path)
+
+    # node_modules is rebuilt from the persistent store on the next run
+    (workdir / "node_modules" / "a" / "index.js").unlink()
+    state, store_bytes, store_files = prepare(local_runner, store)
+    assert (state, store_files) == ("warm", 2)
+    warm = install_entry(local_runner, store, state, 2.5, store_bytes, workdir=str(workdir))
+    history = record_store_run(warm, history_path)
+
+    print_store_comparison(history, store.name)
+    out = capsys.readouterr().out
+    assert "2 recorded installs" in out
+    assert "cold: install 12.00s" in out
+    assert "warm: install 2.50s" in out
+    assert "warm store saves 9.50s per install" in out
+
+
+def test_reset_makes_the_next_install_cold(tmp_path):
+    store = LocalDirStore(tmp_path / "store")
+    (tmp_path / "store" / "pkg").write_bytes(b"x")
+    assert prepare(local_runner, store)[0] == "warm"
+    assert prepare(local_runner, store, reset=True)[0] == "cold"
+    assert list((tmp_path / "store").iterdir()) == []
+
+
+def test_record_store_run_keeps_the_last_100(tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text("not json")
+    for index in range(105):
+        history = record_store_run({"volume": "v", "state": "warm", "index": index}, str(path))
+    assert len(history) == 101
+    saved = json.loads(path.read_text())
+    assert len(saved) == 100
+    assert saved[0]["index"] == 5
+
+
+def test_comparison_only_counts_the_named_store(capsys):
+    history = [
+        {"volume": "other", "state": "cold", "install_s": 1.0, "store_bytes_after": 0, "node_modules_bytes": 0},
+        {"volume": "mine", "state": "cold", "install_s": 3.0, "store_bytes_after": 2e6, "node_modules_bytes": 1e6},
+    ]
+    print_store_comparison(history, "mine")
+    out = capsys.readouterr().out
+    assert "1 recorded installs" in out
+    assert "warm: no run recorded yet" in out
+    assert "saves" not in out
@@ -0,0 +1,152 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from harness import pool as pool_module
+from harness.pool import SandboxPool, SandboxSpec
+
+
+class FakeSandbox:
+    _ids = iter(range(1, 1000))
+
+    def __init__(self):
+        self.object_id = f"sb-{next(self._ids)}"
+        self.returncode = None
+        self.terminated = False
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.terminated = True
+        self.returncode = 137
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """Patch sandbox creation; the list holds every sandbox created, in order."""
+    sandboxes = []
+    lock = threading.Lock()
+
+    def create_ready_sandbox(app, spec):
+        sb = FakeSandbox()
+        with lock:
+            sandboxes.append(sb)
+        return sb, 10.0
+
+    monkeypatch.setattr(pool_module, "create_ready_sandbox", create_ready_sandbox)
+    return sandboxes
+
+
+@pytest.fixture
+def spec():
+    return SandboxSpec("docker_in_gvisor", image=None, experimental_options={"enable_docker_in_gvisor": True})
+
+
+def make_pool(tmp_path, size=2):
+    return SandboxPool(app=None, size=size, state_path=str(tmp_path / "pool.json"))
+
+
+def test_miss_then_hits_after_fill(tmp_path, created, spec):
+    pool = make_pool(tmp_path)
+    first = pool.acquire(spec, replenish=False)
+    assert pool.stats["misses"] == 1 and pool.stats["hits"] == 0
+    pool.fill(spec)
+    pool._executor.shutdown(wait=True)
+    second, third = pool.acquire(spec, replenish=False), pool.acquire(spec, replenish=False)
+    assert len({first, second, third}) == 3
+    assert pool.stats == {"hits": 2, "misses": 1, "time_saved_s": 20.0, "warm_failures": 0, "exited": 0}
+    assert "2 hits, 1 misses (67% hit rate), 20.0s of startup saved" in pool.summary()
+
+
+def test_fill_does_not_overshoot_size(tmp_path, created, spec):
+    pool = make_pool(tmp_path, size=2)
+    for _ in range(5):
+        pool.fill(spec)
+    pool._executor.shutdown(wait=True)
+    assert len(created) == 2
+    assert len(pool._ready[spec.key]) == 2
+
+
+def test_specs_with_the_same_inputs_share_a_pool(tmp_path, created, spec):
+    pool = make_pool(tmp_path, size=1)
+    pool.fill(spec)
+    pool._executor.shutdown(wait=True)
+    same = SandboxSpec("docker_in_gvisor", image=object(), experimental_options={"enable_docker_in_gvisor": True})
+    assert same.key == spec.key
+    assert pool.acquire(same, replenish=False) is created[0]
+    assert SandboxSpec("other", image=None).key != spec.key
+
+
+def test_exited_idle_sandboxes_are_skipped(tmp_path, created, spec):
+    pool = make_pool(tmp_path)
+    pool.fill(spec)
+    pool._executor.shutdown(wait=True)
+    created[0].returncode = 0
+    assert pool.acquire(spec, replenish=False) is created[1]
+    assert created[0].terminated
+    assert pool.stats["exited"] == 1 and pool.stats["hits"] == 1
+
+    # With nothing live left, acquire creates a new one as a miss
+    pool._ready[spec.key].append((FakeSandbox(), 10.0))
+    pool._ready[spec.key][0][0].returncode = 1
+    fresh = pool.acquire(spec, replenish=False)
+    assert fresh is created[-1]
+    assert pool.stats["exited"] == 2 and pool.stats["misses"] == 1
+
+
+def test_close_terminates_idle_sandboxes(tmp_path, created, spec):
+    pool = make_pool(tmp_path)
+    pool.fill(spec)
+    pool.close()
+    assert len(created) == 2 and all(sb.terminated for sb in created)
+    pool.fill(spec)
+    assert len(created) == 2
+
+
+@pytest.fixture
+def fake_modal(monkeypatch):
+    """A ``modal`` module whose ``Sandbox.from_id`` looks sandboxes up in ``live``."""
+    live = {}
+
+    class Sandbox:
+        @staticmethod
+        def from_id(sandbox_id):
+            if sandbox_id not in live:
+                raise LookupError(sandbox_id)
+            return live[sandbox_id]
+
+    monkeypatch.setitem(sys.modules, "modal", types.SimpleNamespace(Sandbox=Sandbox))
+    return live
+
+
+def test_attach_round_trips_through_the_state_file(tmp_path, created, spec, fake_modal):
+    sb = make_pool(tmp_path).attach("dev", spec)
+    fake_modal[sb.object_id] = sb
+
+    # A later invocation reads the same state file and re-attaches
+    later = make_pool(tmp_path)
+    assert later.attach("dev", spec) is sb
+    assert later.stats["hits"] == 1 and later.stats["time_saved_s"] == 10.0
+    assert len(created) == 1
+
+    later.detach("dev")
+    assert sb.terminated
+    assert make_pool(tmp_path)._load_state() == {}
+
+
+def test_attach_replaces_an_exited_or_mismatched_sandbox(tmp_path, created, spec, fake_modal):
+    pool = make_pool(tmp_path)
+    sb = pool.attach("dev", spec)
+    fake_modal[sb.object_id] = sb
+    sb.returncode = 0
+    replacement = pool.attach("dev", spec)
+    assert replacement is not sb
+    fake_modal[replacement.object_id] = replacement
+    assert pool._load_state()["dev"]["sandbox_id"] == replacement.object_id
+
+    other = SandboxSpec("other", image=None)
+    assert pool.attach("dev", other) is not replacement
+    assert pool.stats["misses"] == 3
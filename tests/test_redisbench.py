@@ -0,0 +1,83 @@
+from harness.redisbench import APPENDONLY, CLIENTS, parse_csv, print_report, run_suite
+
+CSV = """\
+WARNING: something on stderr-ish stdout
+"test","rps","avg_latency_ms","min_latency_ms","p50_latency_ms","p95_latency_ms","p99_latency_ms","max_latency_ms"
+"SET","50000.00","0.950","0.100","0.900","1.500","2.000","5.000"
+"GET","62500.00","0.800","0.100","0.750","1.200","1.700","4.000"
+"""
+
+
+class FakeRedis:
+    """A ``redis_cli`` stand-in recording calls; ``replies`` overrides the answer per command."""
+
+    def __init__(self, replies=None):
+        self.calls = []
+        self.replies = replies or {}
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        reply = self.replies.get(args[0], (True, "OK\n", ""))
+        return reply(args) if callable(reply) else reply
+
+
+def bench_ok(name, argv):
+    return True, CSV, ""
+
+
+def cases(payloads):
+    return len(APPENDONLY) * len(CLIENTS) * len(payloads) * 2
+
+
+def test_parse_csv_skips_noise_and_converts_metrics():
+    rows = parse_csv(CSV)
+    assert [row["test"] for row in rows] == ["SET", "GET"]
+    assert rows[0]["rps"] == 50000.0
+    assert rows[1]["p99_latency_ms"] == 1.7
+
+
+def test_run_suite_flushes_before_every_case(capsys):
+    redis = FakeRedis()
+    rows = run_suite(bench_ok, redis, "net", payloads=(64,), label="sandbox")
+    assert len(rows) == cases((64,)) * 2
+    assert all(row["target"] == "sandbox" and "rps" in row for row in rows)
+    assert redis.calls.count(("FLUSHALL",)) == cases((64,))
+    assert [call for call in redis.calls if call[0] == "CONFIG"] == [
+        ("CONFIG", "SET", "appendonly", value) for value in APPENDONLY
+    ]
+    print_report(rows, baseline="sandbox")
+    assert "FAILED" not in capsys.readouterr().out
+
+
+def test_failed_flushall_skips_the_case():
+    benchmarked = []
+
+    def bench(name, argv):
+        benchmarked.append(name)
+        return bench_ok(name, argv)
+
+    redis = FakeRedis({"FLUSHALL": (True, "(error) LOADING Redis is loading the dataset in memory\n", "")})
+    rows = run_suite(bench, redis, "net", payloads=(64,))
+    assert not benchmarked
+    assert len(rows) == cases((64,))
+    assert all(row["error"] == ["FLUSHALL: (error) LOADING Redis is loading the dataset in memory"] for row in rows)
+
+
+def test_failed_config_set_skips_that_pass_only():
+    def config(args):
+        if args[-1] == "yes":
+            return False, "", "ERR CONFIG SET failed\n"
+        return True, "OK\n", ""
+
+    redis = FakeRedis({"CONFIG": config})
+    rows = run_suite(bench_ok, redis, "net", payloads=(64,))
+    failed = [row for row in rows if "error" in row]
+    assert {row["appendonly"] for row in failed} == {"yes"}
+    assert failed[0]["error"] == ["CONFIG SET appendonly: ERR CONFIG SET failed"]
+    assert {row["appendonly"] for row in rows if "rps" in row} == {"no"}
+    assert ("FLUSHALL",) in redis.calls
+
+
+def test_failed_benchmark_records_its_last_stderr_line():
+    rows = run_suite(lambda name, argv: (False, "", "pulling\nconnection refused\n"), FakeRedis(), "net", payloads=(64,))
+    assert all(row["error"] == ["connection refused"] for row in rows)
@@ -0,0 +1,59 @@
+import json
+
+from harness.report import find_runs, load_runs
+
+
+def run_records(run_id, script, started_at, spans, wall):
+    start = {"run_id": run_id, "event": "run_start", "script": script, "started_at": started_at, "argv": []}
+    records = [
+        {"run_id": run_id, "span_id": span_id, "parent_id": parent_id, "name": name, "duration_s": duration,
+         "status": status}
+        for span_id, parent_id, name, duration, status in spans
+    ]
+    end = {"run_id": run_id, "event": "run_end", "duration_s": wall, "spans": len(spans)}
+    return [start, *records, end]
+
+
+def write_interleaved(path, *runs):
+    """Append the runs' records round-robin, as concurrent scripts sharing ``MODAL_TIMING_PATH`` would."""
+    lines = []
+    for i in range(max(len(records) for records in runs)):
+        lines += [json.dumps(records[i]) for records in runs if i < len(records)]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_one_file_holds_several_runs(tmp_path):
+    path = tmp_path / "shared.jsonl"
+    # Both runs number their spans from 1; span 2 nests under a different parent in each
+    first = run_records(
+        "run-a", "modal_snapshot_iterations", 100.0,
+        [(2, 1, "sandbox_create", 3.0, "ok"), (1, None, "resume", 5.0, "ok")],
+        wall=6.0,
+    )
+    second = run_records(
+        "run-b", "modal_pnpm_snapshot", 200.0,
+        [(2, 1, "resume", 1.0, "ok"), (1, None, "sandbox_create", 4.0, "error")],
+        wall=9.0,
+    )
+    write_interleaved(path, first, second)
+
+    runs = {run["run_id"]: run for run in load_runs(str(path))}
+    assert list(runs) == ["run-a", "run-b"]
+    assert runs["run-a"]["script"] == "modal_snapshot_iterations"
+    assert runs["run-a"]["wall_s"] == 6.0 and runs["run-b"]["wall_s"] == 9.0
+    assert runs["run-a"]["phases"] == {"sandbox_create": (1, 3.0), "resume": (1, 5.0)}
+    assert runs["run-b"]["phases"] == {"resume": (1, 1.0), "sandbox_create": (1, 4.0)}
+    assert runs["run-a"]["errors"] == 0 and runs["run-b"]["errors"] == 1
+
+
+def test_find_runs_filters_and_orders_across_files(tmp_path):
+    shared, single = tmp_path / "shared.jsonl", tmp_path / "single.jsonl"
+    write_interleaved(
+        shared,
+        run_records("run-b", "a", 200.0, [(1, None, "workload", 1.0, "ok")], wall=1.0),
+        run_records("run-c", "b", 300.0, [], wall=1.0),
+    )
+    write_interleaved(single, run_records("run-a", "a", 100.0, [], wall=1.0))
+    paths = [str(shared), str(single)]
+    assert [run["run_id"] for run in find_runs(paths, last=0)] == ["run-a", "run-b", "run-c"]
+    assert [run["run_id"] for run in find_runs(paths, script="a", last=1)] == ["run-b"]
@@ -0,0 +1,63 @@
+import os
+import shutil
+import socket
+import subprocess
+
+import pytest
+
+from harness.sockets import inventory_script, parse_inventory, select_sockets
+
+
+def test_parse_inventory_joins_proc_and_fs_records():
+    stdout = "S\t101\t/run/a.sock\nS\t102\t@abstract\nP\t101\t7\nP\t101\t3\nF\t101\t/run/a.sock\nF\t9\t/tmp/stale.sock\nT\t12\n"
+    records, elapsed_ms = parse_inventory(stdout)
+    assert elapsed_ms == 12
+    assert records == [
+        {"path": "/run/a.sock", "inode": 101, "pids": [3, 7], "source": "proc+fs"},
+        {"path": "/tmp/stale.sock", "inode": 9, "pids": [], "source": "fs"},
+        {"path": "@abstract", "inode": 102, "pids": [], "source": "proc"},
+    ]
+    assert [r["path"] for r in select_sockets(records, exclude=("stale",))] == ["/run/a.sock"]
+
+
+@pytest.mark.parametrize("shell", ["sh", "bash"])
+def test_inventory_script_runs_under(shell, tmp_path):
+    if shutil.which(shell) is None:
+        pytest.skip(f"{shell} is not installed")
+    path = str(tmp_path / "listener.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    try:
+        stdout = subprocess.run(
+            [shell, "-c", inventory_script(dirs=(str(tmp_path),))], capture_output=True, text=True, check=True
+        ).stdout
+    finally:
+        server.close()
+    records, elapsed_ms = parse_inventory(stdout)
+    assert elapsed_ms is not None
+    record = next(r for r in records if r["path"] == path)
+    assert record["source"] == "proc+fs"
+    assert os.getpid() in record["pids"]
+
+
+def test_deleted_file_of_a_bound_socket_is_not_present(tmp_path):
+    kept, deleted = str(tmp_path / "kept.sock"), str(tmp_path / "deleted.sock")
+    servers = []
+    for path in (kept, deleted):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen()
+        servers.append(server)
+    os.unlink(deleted)
+    try:
+        stdout = subprocess.run(
+            ["sh", "-c", inventory_script(dirs=(str(tmp_path),))], capture_output=True, text=True, check=True
+        ).stdout
+    finally:
+        for server in servers:
+            server.close()
+    records, _ = parse_inventory(stdout)
+    mine = [r for r in records if r["path"].startswith(str(tmp_path))]
+    assert {r["path"]: r["source"] for r in mine} == {kept: "proc+fs", deleted: "proc"}
+    assert [r["path"] for r in select_sockets(mine, present_only=True)] == [kept]
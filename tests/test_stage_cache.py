@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from harness.stage_cache import LocalDirBackend, StageCache, hash_bytes, stage_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return StageCache(LocalDirBackend(str(tmp_path / "artifacts")), index_path=str(tmp_path / "index.json"))
+
+
+def make_stage(tmp_path, name, content="installed"):
+    stage = tmp_path / name
+    stage.mkdir()
+    (stage / "node_modules.txt").write_text(content)
+    return str(stage)
+
+
+def test_stage_key_covers_every_input():
+    base = stage_key("pnpm-install", dockerfile="d", lockfile="l", script="s", merkle="m")
+    assert base == stage_key("pnpm-install", merkle="m", script="s", lockfile="l", dockerfile="d")
+    assert base != stage_key("pnpm-install", dockerfile="d", lockfile="l", script="s", merkle="m2")
+    assert base != stage_key("pnpm-install", dockerfile="d", lockfile=hash_bytes("other"), script="s", merkle="m")
+
+
+def test_miss_then_hit(cache, tmp_path):
+    assert cache.lookup("k") is None
+    cache.store("k", make_stage(tmp_path, "stage"), {"package_count": 7})
+    artifact, metadata = cache.lookup("k")
+    with open(f"{artifact}/node_modules.txt") as f:
+        assert f.read() == "installed"
+    assert metadata == {"package_count": 7}
+    assert cache.entries()["k"]["hits"] == 1
+
+
+def test_expired_entries_are_dropped(cache, tmp_path):
+    cache.max_age_s = 60
+    ref = cache.store("k", make_stage(tmp_path, "stage"))
+    index = cache.entries()
+    index["k"]["created_at"] = time.time() - 120
+    cache._save(index)
+    assert cache.lookup("k") is None
+    assert "k" not in cache.entries()
+    assert not cache.backend.exists(ref)
+
+
+def test_missing_artifact_is_a_miss(cache, tmp_path):
+    ref = cache.store("k", make_stage(tmp_path, "stage"))
+    cache.backend.delete(ref)
+    assert cache.lookup("k") is None
+    assert "k" not in cache.entries()
+
+
+def test_least_recently_used_entries_are_evicted(cache, tmp_path):
+    cache.max_entries = 2
+    refs = {key: cache.store(key, make_stage(tmp_path, key)) for key in ("a", "b")}
+    index = cache.entries()
+    index["a"]["last_used_at"] += 10
+    cache._save(index)
+    cache.store("c", make_stage(tmp_path, "c"))
+    assert set(cache.entries()) == {"a", "c"}
+    assert not cache.backend.exists(refs["b"])
+
+
+def test_restore_replaces_the_old_artifact(cache, tmp_path):
+    old = cache.store("k", make_stage(tmp_path, "old", "v1"))
+    cache.store("k", make_stage(tmp_path, "new", "v2"))
+    assert not cache.backend.exists(old)
+    artifact, _ = cache.lookup("k")
+    with open(f"{artifact}/node_modules.txt") as f:
+        assert f.read() == "v2"
+
+
+def test_invalidate_and_clear(cache, tmp_path):
+    for key in ("a", "b", "c"):
+        cache.store(key, make_stage(tmp_path, key))
+    assert cache.invalidate("a") is True
+    assert cache.invalidate("a") is False
+    assert cache.clear() == 2
+    assert cache.entries() == {}